@@ -1,70 +1,186 @@
 import os
 import json
 import csv
+import hashlib
+import re
+import threading
+import uuid
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from flask import Flask, render_template, request, redirect, url_for, flash, Response
+from flask import Flask, render_template, request, redirect, url_for, flash, Response, session
 import requests
+from requests.adapters import HTTPAdapter
 from werkzeug.utils import secure_filename
 
 REST_API_URL = os.getenv("REST_API_URL", "http://rest-api:8001")
 REQUEST_TIMEOUT = int(os.getenv("REQUEST_TIMEOUT", "600"))
+# Job submission/polling calls return immediately, so they get a short timeout.
+JOB_POLL_TIMEOUT = int(os.getenv("JOB_POLL_TIMEOUT", "10"))
+# The index page's listings (documents, XML files, collections) are quick lookups too.
+LISTING_TIMEOUT = int(os.getenv("LISTING_TIMEOUT", "10"))
+# Seconds the XML file and collection listings are reused; this app's own uploads,
+# conversions, groupings and imports clear them.
+LISTING_CACHE_TTL = float(os.getenv("LISTING_CACHE_TTL", "5"))
+# Keep-alive connections to the REST API, shared by all request threads.
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "16"))
+MAX_TRACKED_JOBS = 10
+DOCUMENTS_PAGE_SIZE = int(os.getenv("DOCUMENTS_PAGE_SIZE", "50"))
+# Fields shown next to each document id on the index page.
+PREVIEW_FIELDS = 4
+# Document payloads kept with their ETag so repeat views only revalidate.
+ETAG_CACHE_SIZE = int(os.getenv("ETAG_CACHE_SIZE", "256"))
 # Use shared data dir (container volume) by default; can be overridden with env `DATA_DIR`
 DATA_DIR = Path(os.getenv("DATA_DIR", "/data/shared"))
 DATA_DIR.mkdir(parents=True, exist_ok=True)
+# Chunked uploads in progress; the rpc-server reads them from here when converting while uploading.
+UPLOADS_DIR = DATA_DIR / ".uploads"
+UPLOADS_DIR.mkdir(parents=True, exist_ok=True)
+# Chunk size the upload page sends, and the largest chunk accepted.
+UPLOAD_CHUNK_BYTES = int(os.getenv("UPLOAD_CHUNK_BYTES", str(8 * 1024 * 1024)))
+UPLOAD_MAX_CHUNK_BYTES = int(os.getenv("UPLOAD_MAX_CHUNK_BYTES", str(64 * 1024 * 1024)))
+# Seconds an upload is kept after its last change; unfinished ones are then dropped.
+UPLOAD_EXPIRY = int(os.getenv("UPLOAD_EXPIRY", str(24 * 3600)))
 
 app = Flask(__name__)
 app.secret_key = os.getenv("FLASK_SECRET_KEY", "dev-secret")
 
+http = requests.Session()
+http.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=HTTP_POOL_SIZE))
+http.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=HTTP_POOL_SIZE))
+# Runs the index page's backend calls side by side.
+_fanout = ThreadPoolExecutor(max_workers=HTTP_POOL_SIZE, thread_name_prefix="fanout")
 
-def _fetch_documents(collection: str):
+_etag_cache: "OrderedDict[str, tuple]" = OrderedDict()
+_etag_lock = threading.Lock()
+
+_listings = {}
+_listings_generation = 0
+_listings_lock = threading.Lock()
+
+_UPLOAD_ID = re.compile(r"[0-9a-f]{32}")
+# Stored CSVs the converter reads, including gzip/zstd compressed ones.
+CSV_SUFFIXES = (".csv", ".csv.gz", ".csv.zst")
+_upload_locks = {}
+# upload id -> (bytes hashed, running sha256), so completion rarely has to re-read the file.
+_upload_hashes = {}
+_uploads_lock = threading.Lock()
+
+
+def _get_json_conditional(path: str, params: dict, timeout: int = REQUEST_TIMEOUT):
+    """GET a REST resource, sending If-None-Match for a payload we already hold.
+
+    Raises requests.RequestException like a plain requests.get + raise_for_status.
+    """
+    key = path + "?" + "&".join(f"{k}={v}" for k, v in sorted(params.items()))
+    with _etag_lock:
+        cached = _etag_cache.get(key)
+    headers = {"If-None-Match": cached[0]} if cached else {}
+    resp = http.get(f"{REST_API_URL}{path}", params=params, headers=headers, timeout=timeout)
+    if resp.status_code == 304 and cached:
+        with _etag_lock:
+            if key in _etag_cache:
+                _etag_cache.move_to_end(key)
+        return cached[1]
+    resp.raise_for_status()
+    payload = resp.json()
+    tag = resp.headers.get("ETag")
+    if tag and ETAG_CACHE_SIZE > 0:
+        with _etag_lock:
+            _etag_cache[key] = (tag, payload)
+            _etag_cache.move_to_end(key)
+            while len(_etag_cache) > ETAG_CACHE_SIZE:
+                _etag_cache.popitem(last=False)
+    return payload
+
+
+def _cached_listing(name: str, fetch):
+    """fetch() -> (value, error), reused for LISTING_CACHE_TTL seconds; errors are not cached."""
+    with _listings_lock:
+        cached = _listings.get(name)
+        generation = _listings_generation
+    if cached and cached[0] > time.monotonic():
+        return cached[1]
+    value, error = fetch()
+    if error is None and LISTING_CACHE_TTL > 0:
+        with _listings_lock:
+            # A listing fetched while the app was changing files or collections may already be stale.
+            if generation == _listings_generation:
+                _listings[name] = (time.monotonic() + LISTING_CACHE_TTL, (value, error))
+    return value, error
+
+def _invalidate_listings():
+    global _listings_generation
+    with _listings_lock:
+        _listings.clear()
+        _listings_generation += 1
+
+def _fetch_documents(collection: str, after: str = None):
+    """Fetch one page of document ids; returns (page, error) where page has documents/next_after/total."""
+    params = {"collection": collection, "limit": DOCUMENTS_PAGE_SIZE, "with_total": "true"}
+    if after:
+        params["after"] = after
     try:
-        resp = requests.get(
+        resp = http.get(
             f"{REST_API_URL}/documents",
-            params={"collection": collection},
-            timeout=REQUEST_TIMEOUT,
+            params=params,
+            timeout=LISTING_TIMEOUT,
         )
         resp.raise_for_status()
-        return resp.json().get("documents", []), None
+        return resp.json(), None
     except requests.RequestException as exc:
-        return [], str(exc)
+        return {"documents": [], "next_after": None, "total": None}, str(exc)
+
+def _fetch_previews(collection: str, doc_ids: list) -> dict:
+    """Short "field: value" summaries for a page of ids, fetched in a single batch call."""
+    if not doc_ids:
+        return {}
+    try:
+        batch = _get_json_conditional(
+            "/documents/batch", {"collection": collection, "ids": ",".join(doc_ids)}, timeout=LISTING_TIMEOUT
+        )
+    except requests.RequestException:
+        return {}
+    previews = {}
+    for doc in batch.get("documents", []):
+        fields = [(k, v) for k, v in doc.items() if k not in ("_id", "_import_id")][:PREVIEW_FIELDS]
+        previews[doc["_id"]] = " · ".join(f"{k}: {v}" for k, v in fields)
+    return previews
+
+def _fetch_page(collection: str, after: str = None):
+    """A page of document ids and their previews; returns (page, error, previews)."""
+    page, error = _fetch_documents(collection, after)
+    return page, error, _fetch_previews(collection, page.get("documents", []))
 
 def _fetch_xml_files():
     try:
-        resp = requests.get(f"{REST_API_URL}/xml-files", timeout=REQUEST_TIMEOUT)
+        resp = http.get(f"{REST_API_URL}/xml-files", timeout=LISTING_TIMEOUT)
         resp.raise_for_status()
         return resp.json().get("files", []), None
     except requests.RequestException as exc:
         return [], str(exc)
 
-def _validate_xml(filename: str, xsd_filename: str):
+def _submit_job(operation: str, label: str, data: dict):
+    """Start a background job on the REST API and remember it for the index page."""
     try:
-        resp = requests.post(
-            f"{REST_API_URL}/validate-xml",
-            data={"filename": filename, "xsd_filename": xsd_filename},
-            timeout=REQUEST_TIMEOUT,
+        resp = http.post(
+            f"{REST_API_URL}/jobs",
+            data={"operation": operation, **data},
+            timeout=JOB_POLL_TIMEOUT,
         )
         resp.raise_for_status()
-        return resp.json(), None
+        job_id = resp.json().get("job_id")
     except requests.RequestException as exc:
         return None, str(exc)
 
-
-def _group_xml(filename: str, attr_tag: str, filter_value: str, row_tag: str):
-    try:
-        resp = requests.post(
-            f"{REST_API_URL}/group-xml",
-            data={
-                "filename": filename,
-                "attr_tag": attr_tag,
-                "filter_value": filter_value,
-                "row_tag": row_tag,
-            },
-            timeout=REQUEST_TIMEOUT,
-        )
-        resp.raise_for_status()
-        return resp.json(), None
-    except requests.RequestException as exc:
-        return None, str(exc)
+    if operation != "validate_xml":
+        # Drop the listings now; job_status drops them again once the job is done.
+        _invalidate_listings()
+    tracked = session.get("jobs", [])
+    tracked.insert(0, {"id": job_id, "label": label, "operation": operation})
+    session["jobs"] = tracked[:MAX_TRACKED_JOBS]
+    return job_id, None
 
 
 def _is_valid_csv(file_storage) -> tuple:
@@ -87,6 +203,11 @@ def _is_valid_csv(file_storage) -> tuple:
     except Exception:
         return False, "Unable to read uploaded file"
 
+    return _check_csv_sample(sample_bytes)
+
+
+def _check_csv_sample(sample_bytes: bytes) -> tuple:
+    """Check the first bytes of a CSV; returns (True, "") or (False, reason)."""
     if not sample_bytes:
         return False, "Uploaded file is empty"
 
@@ -134,18 +255,254 @@ def upload_file():
     try:
         # FileStorage.save accepts a path-like or string; convert to str for compatibility
         uploaded.save(str(target_path))
+        _invalidate_listings()
         flash(f'Uploaded CSV saved as: {safe_name}')
     except Exception as exc:
         flash(f'Failed to save file: {exc}', 'error')
+        return redirect(url_for('index'))
+
+    if request.form.get('convert'):
+        job_id, error = _submit_job("convert_csv_to_file", f"Convert {safe_name}", {"filename": safe_name})
+        if error:
+            flash(f"Conversion failed: {error}", "error")
 
     return redirect(url_for('index'))
 
 
+def _json_response(payload, status=200):
+    return Response(json.dumps(payload), mimetype="application/json", status=status)
+
+
+def _read_upload(upload_id: str):
+    if not _UPLOAD_ID.fullmatch(upload_id):
+        return None
+    try:
+        return json.loads((UPLOADS_DIR / f"{upload_id}.json").read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        return None
+
+
+def _write_upload(upload_id: str, state: dict) -> None:
+    """Replace the upload's state file atomically; the rpc-server reads it while converting."""
+    state["updated"] = time.time()
+    path = UPLOADS_DIR / f"{upload_id}.json"
+    tmp_path = path.with_name(f"{upload_id}.json.tmp")
+    tmp_path.write_text(json.dumps(state), encoding="utf-8")
+    os.replace(tmp_path, path)
+
+
+def _forget_upload(upload_id: str) -> None:
+    (UPLOADS_DIR / f"{upload_id}.part").unlink(missing_ok=True)
+    (UPLOADS_DIR / f"{upload_id}.json").unlink(missing_ok=True)
+    with _uploads_lock:
+        _upload_locks.pop(upload_id, None)
+        _upload_hashes.pop(upload_id, None)
+
+
+def _upload_lock(upload_id: str):
+    """Serialises changes to one upload; None if there is no such upload."""
+    if _read_upload(upload_id) is None:
+        return None
+    with _uploads_lock:
+        return _upload_locks.setdefault(upload_id, threading.Lock())
+
+
+def _purge_uploads() -> None:
+    cutoff = time.time() - UPLOAD_EXPIRY
+    for path in UPLOADS_DIR.glob("*.json"):
+        try:
+            state = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            continue
+        if state.get("updated", 0) < cutoff:
+            _forget_upload(path.stem)
+
+
+def _upload_digest(upload_id: str, size: int) -> str:
+    """sha256 of the first size bytes of the upload."""
+    cached = _upload_hashes.get(upload_id)
+    if cached and cached[0] == size:
+        return cached[1].hexdigest()
+    digest = hashlib.sha256()
+    with (UPLOADS_DIR / f"{upload_id}.part").open("rb") as part:
+        for block in iter(lambda: part.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _upload_summary(upload_id: str, state: dict) -> dict:
+    return {
+        "upload_id": upload_id,
+        "filename": state["filename"],
+        "offset": state["offset"],
+        "size": state["size"],
+        "complete": state["complete"],
+        "job_id": state.get("job_id"),
+        "chunk_size": UPLOAD_CHUNK_BYTES,
+    }
+
+
+@app.route("/uploads", methods=["POST"])
+def create_upload():
+    """Start a chunked, resumable CSV upload into the shared data directory.
+
+    Form fields: filename, size (total bytes, checked on completion; optional) and
+    convert=1 to convert the CSV to XML while it uploads (root_name/row_name apply).
+    Chunks then go to PUT /uploads/<id>?offset=N and the upload ends with
+    POST /uploads/<id>/complete.
+    """
+    filename = secure_filename((request.form.get("filename") or "").strip())
+    if not filename.lower().endswith(".csv"):
+        return _json_response({"error": "Filename must have a .csv extension"}, 400)
+    try:
+        size = int(request.form["size"]) if request.form.get("size") else None
+    except ValueError:
+        return _json_response({"error": "size must be a number of bytes"}, 400)
+
+    _purge_uploads()
+    upload_id = uuid.uuid4().hex
+    (UPLOADS_DIR / f"{upload_id}.part").touch()
+    state = {"filename": filename, "size": size, "offset": 0, "complete": False, "job_id": None}
+    _write_upload(upload_id, state)
+
+    if request.form.get("convert"):
+        data = {
+            "filename": upload_id,
+            "root_name": request.form.get("root_name") or "root",
+            "row_name": request.form.get("row_name") or "row",
+        }
+        job_id, error = _submit_job("convert_upload", f"Convert {filename} while uploading", data)
+        if error:
+            _forget_upload(upload_id)
+            return _json_response({"error": f"Unable to start conversion: {error}"}, 502)
+        state["job_id"] = job_id
+        _write_upload(upload_id, state)
+
+    return _json_response(_upload_summary(upload_id, state), 201)
+
+
+@app.route("/uploads/<upload_id>", methods=["GET"])
+def upload_status(upload_id):
+    """Where to resume an upload: its offset is the next byte expected."""
+    state = _read_upload(upload_id)
+    if state is None:
+        return _json_response({"error": "Upload not found"}, 404)
+    return _json_response(_upload_summary(upload_id, state))
+
+
+@app.route("/uploads/<upload_id>", methods=["PUT"])
+def upload_chunk(upload_id):
+    """Store the request body as the chunk starting at ?offset=N.
+
+    An X-Chunk-SHA256 header (hex) is checked before anything is written; a mismatch
+    gets 422. An offset other than the next byte expected gets 409 with the offset to
+    resume from, so re-sending a chunk that was already stored is harmless.
+    """
+    try:
+        offset = int(request.args["offset"])
+    except (KeyError, ValueError):
+        return _json_response({"error": "offset is required"}, 400)
+    if request.content_length is None:
+        return _json_response({"error": "Content-Length is required"}, 411)
+    if request.content_length > UPLOAD_MAX_CHUNK_BYTES:
+        return _json_response({"error": f"Chunks are limited to {UPLOAD_MAX_CHUNK_BYTES} bytes"}, 413)
+    data = request.get_data(cache=False)
+    checksum = request.headers.get("X-Chunk-SHA256")
+    if checksum and hashlib.sha256(data).hexdigest() != checksum.strip().lower():
+        return _json_response({"error": "Chunk checksum mismatch", "offset": offset}, 422)
+
+    lock = _upload_lock(upload_id)
+    if lock is None:
+        return _json_response({"error": "Upload not found"}, 404)
+    with lock:
+        state = _read_upload(upload_id)
+        if state is None:
+            return _json_response({"error": "Upload not found"}, 404)
+        if state["complete"]:
+            return _json_response({"error": "Upload is already complete", "offset": state["offset"]}, 409)
+        if offset != state["offset"]:
+            return _json_response({"error": "Unexpected offset", "offset": state["offset"]}, 409)
+        if state["size"] is not None and offset + len(data) > state["size"]:
+            return _json_response({"error": "Chunk goes past the declared size", "offset": offset}, 400)
+        if offset == 0:
+            valid, reason = _check_csv_sample(data[:4096])
+            if not valid:
+                return _json_response({"error": reason, "offset": offset}, 400)
+
+        with (UPLOADS_DIR / f"{upload_id}.part").open("r+b") as part:
+            # Overwrites whatever an interrupted earlier attempt left past the offset.
+            part.seek(offset)
+            part.write(data)
+            part.truncate()
+        cached = _upload_hashes.get(upload_id)
+        if offset == 0 or (cached and cached[0] == offset):
+            digest = hashlib.sha256() if offset == 0 else cached[1]
+            digest.update(data)
+            _upload_hashes[upload_id] = (offset + len(data), digest)
+        else:
+            _upload_hashes.pop(upload_id, None)
+        state["offset"] = offset + len(data)
+        _write_upload(upload_id, state)
+
+    return _json_response({"offset": state["offset"]})
+
+
+@app.route("/uploads/<upload_id>/complete", methods=["POST"])
+def complete_upload(upload_id):
+    """Move a fully received upload into the shared data directory.
+
+    Optional form field sha256 is compared with the whole file. A conversion started
+    with convert=1 finishes reading the remaining bytes and then completes.
+    """
+    lock = _upload_lock(upload_id)
+    if lock is None:
+        return _json_response({"error": "Upload not found"}, 404)
+    with lock:
+        state = _read_upload(upload_id)
+        if state is None:
+            return _json_response({"error": "Upload not found"}, 404)
+        if not state["complete"]:
+            if state["size"] is not None and state["offset"] != state["size"]:
+                return _json_response({"error": "Upload is incomplete", "offset": state["offset"]}, 409)
+            if state["offset"] == 0:
+                return _json_response({"error": "Uploaded file is empty", "offset": 0}, 400)
+            checksum = (request.form.get("sha256") or "").strip().lower()
+            if checksum and _upload_digest(upload_id, state["offset"]) != checksum:
+                return _json_response({"error": "File checksum mismatch"}, 400)
+
+            # Mark complete before the move: a reader that no longer finds the .part
+            # then knows where the file went.
+            state.update(complete=True, size=state["offset"])
+            _write_upload(upload_id, state)
+            os.replace(UPLOADS_DIR / f"{upload_id}.part", DATA_DIR / state["filename"])
+            _upload_hashes.pop(upload_id, None)
+            _invalidate_listings()
+
+    return _json_response({"status": "ok", "message": f"Uploaded CSV saved as: {state['filename']}",
+                           **_upload_summary(upload_id, state)})
+
+
+@app.route("/uploads/<upload_id>", methods=["DELETE"])
+def delete_upload(upload_id):
+    """Abandon an upload; a conversion reading it fails instead of waiting for more chunks."""
+    lock = _upload_lock(upload_id)
+    if lock is None:
+        return _json_response({"error": "Upload not found"}, 404)
+    with lock:
+        state = _read_upload(upload_id)
+        if state is None:
+            return _json_response({"error": "Upload not found"}, 404)
+        if state["complete"]:
+            return _json_response({"error": "Upload is already complete"}, 409)
+        _forget_upload(upload_id)
+    return _json_response({"status": "deleted", "upload_id": upload_id})
+
+
 def getMongoCollections():
     try:
-        resp = requests.get(
+        resp = http.get(
             f"{REST_API_URL}/collections",
-            timeout=REQUEST_TIMEOUT,
+            timeout=LISTING_TIMEOUT,
         )
         resp.raise_for_status()
         return resp.json(), None
@@ -156,14 +513,24 @@ def getMongoCollections():
 @app.route("/", methods=["GET"])
 def index():
     collection = request.args.get("collection") or "Collection"
-    documents, error = _fetch_documents(collection)
-    xml_files, xml_error = _fetch_xml_files()
-    collections, collections_error = getMongoCollections()
+    after = request.args.get("after") or None
+    # The three listings are independent, so the page waits for the slowest one, not their sum.
+    page_future = _fanout.submit(_fetch_page, collection, after)
+    xml_future = _fanout.submit(_cached_listing, "xml_files", _fetch_xml_files)
+    collections_future = _fanout.submit(_cached_listing, "collections", getMongoCollections)
+    page, error, previews = page_future.result()
+    xml_files, xml_error = xml_future.result()
+    collections, collections_error = collections_future.result()
     if collections is None:
         collections = []
     return render_template(
         "index.html",
-        documents=documents,
+        jobs=session.get("jobs", []),
+        documents=page.get("documents", []),
+        previews=previews,
+        next_after=page.get("next_after"),
+        total_documents=page.get("total"),
+        after=after,
         error=error,
         xml_files=xml_files,
         xml_error=xml_error,
@@ -173,11 +540,62 @@ def index():
     )
 
 
+def _job_finished(job_id: str) -> None:
+    """Drop the listings the first time a tracked job is seen done, failed or cancelled.
+
+    The index page polls every tracked job on each load, finished ones included, so
+    only the transition out of running may invalidate (a failed or cancelled job can
+    still have written files or rows). validate_xml changes nothing listed.
+    """
+    tracked = session.get("jobs", [])
+    for job in tracked:
+        if job["id"] == job_id and not job.get("finished"):
+            job["finished"] = True
+            session["jobs"] = tracked
+            if job.get("operation") != "validate_xml":
+                _invalidate_listings()
+            return
+
+
+@app.route("/jobs/<job_id>", methods=["GET"])
+def job_status(job_id):
+    """Proxy job status for the polling script on the index page."""
+    try:
+        resp = http.get(f"{REST_API_URL}/jobs/{job_id}", timeout=JOB_POLL_TIMEOUT)
+    except requests.RequestException as exc:
+        return Response(json.dumps({"error": str(exc)}), mimetype="application/json", status=502)
+    if resp.ok and resp.json().get("status") in ("done", "failed", "cancelled"):
+        _job_finished(job_id)
+    if resp.status_code == 404:
+        session["jobs"] = [job for job in session.get("jobs", []) if job["id"] != job_id]
+    return Response(resp.content, mimetype="application/json", status=resp.status_code)
+
+
+@app.route("/jobs/<job_id>/cancel", methods=["POST"])
+def cancel_job(job_id):
+    try:
+        resp = http.delete(f"{REST_API_URL}/jobs/{job_id}", timeout=JOB_POLL_TIMEOUT)
+    except requests.RequestException as exc:
+        return Response(json.dumps({"error": str(exc)}), mimetype="application/json", status=502)
+    return Response(resp.content, mimetype="application/json", status=resp.status_code)
+
+
+@app.route("/document/<doc_id>", methods=["GET"])
+def document(doc_id):
+    collection = request.args.get("collection") or "Collection"
+    try:
+        doc = _get_json_conditional(f"/documents/{doc_id}", {"collection": collection})
+    except requests.RequestException as exc:
+        flash(f"Unable to load document {doc_id}: {exc}", "error")
+        return redirect(url_for("index", collection=collection))
+    return render_template("document.html", doc_id=doc_id, doc=doc, collection=collection)
+
+
 @app.route("/see_csv_file_data", methods=["GET"])
 def see_csv_file_data():
     """Return a JSON object with CSV filenames found in DATA_DIR."""
     try:
-        files = [p.name for p in DATA_DIR.iterdir() if p.is_file() and p.name.lower().endswith('.csv')]
+        files = [p.name for p in DATA_DIR.iterdir() if p.is_file() and p.name.lower().endswith(CSV_SUFFIXES)]
         return Response(json.dumps({"files": files}), mimetype="application/json")
     except Exception as exc:
         return Response(json.dumps({"files": [], "error": str(exc)}), mimetype="application/json", status=500)
@@ -199,17 +617,11 @@ def upload():
         "row_name": row_name,
     }
 
-    try:
-        resp = requests.post(
-            f"{REST_API_URL}/convert-stored-csv",
-            data=data,
-            timeout=REQUEST_TIMEOUT,
-        )
-        resp.raise_for_status()
-        payload = resp.json()
-        flash(f"Converted {filename} to XML file: {payload.get('xml_file')}")
-    except requests.RequestException as exc:
-        flash(f"Conversion failed: {exc}", "error")
+    job_id, error = _submit_job("convert_csv_to_file", f"Convert {filename}", data)
+    if error:
+        flash(f"Conversion failed: {error}", "error")
+    else:
+        flash(f"Started converting {filename} to XML (job {job_id}).")
 
     return redirect(url_for("index"))
 
@@ -223,18 +635,15 @@ def import_xml():
         return redirect(url_for("index", collection=collection))
 
     data = {"filename": filename, "collection": collection}
-    try:
-        resp = requests.post(
-            f"{REST_API_URL}/import-xml",
-            data=data,
-            timeout=REQUEST_TIMEOUT,
-        )
-        resp.raise_for_status()
-        payload = resp.json()
-        inserted = payload.get("Total Inserted Documents")
-        flash(f"Imported {filename}. Inserted Documents: {inserted}")
-    except requests.RequestException as exc:
-        flash(f"Import failed: {exc}", "error")
+    operation = "insert_xml_file"
+    if request.form.get("validate"):
+        # Validate against the sibling XSD while importing; a failure rolls the import back.
+        operation = "import_xml_validated"
+    job_id, error = _submit_job(operation, f"Import {filename} into {collection}", data)
+    if error:
+        flash(f"Import failed: {error}", "error")
+    else:
+        flash(f"Started importing {filename} (job {job_id}).")
 
     return redirect(url_for("index", collection=collection))
 
@@ -245,18 +654,15 @@ def validate_xml():
     if not filename:
         flash("Provide an XML filename.", "error")
         return redirect(url_for("index"))
-    xsd_filename = filename.replace(".xml", ".xsd")
+    # data.xml.gz / data.xml.zst share data.xsd with the plain XML.
+    xsd_filename = re.sub(r"\.(gz|zst)$", "", filename, flags=re.IGNORECASE).replace(".xml", ".xsd")
 
-    result, error = _validate_xml(filename, xsd_filename)
+    data = {"filename": filename, "xsd_filename": xsd_filename}
+    job_id, error = _submit_job("validate_xml", f"Validate {filename}", data)
     if error:
         flash(f"Validation failed: {error}", "error")
     else:
-        status = result.get("status")
-        message = result.get("message")
-        if status == "ok":
-            flash(f"Validation succeeded: {message}")
-        else:
-            flash(f"Validation failed: {message}", "error")
+        flash(f"Started validating {filename} (job {job_id}).")
 
     return redirect(url_for("index"))
 
@@ -271,14 +677,13 @@ def group_xml():
         flash("Provide XML filename and attribute name to filter/group.", "error")
         return redirect(url_for("index"))
 
-    result, error = _group_xml(filename, attr_tag, filter_value, row_tag)
+    target = filter_value or "all"
+    data = {"filename": filename, "attr_tag": attr_tag, "filter_value": filter_value, "row_tag": row_tag}
+    job_id, error = _submit_job("group_xml_file", f"Group {filename} ({attr_tag}={target})", data)
     if error:
         flash(f"Group/Filter failed: {error}", "error")
     else:
-        xml_out = result.get("xml_file")
-        xsd_out = result.get("xsd_file")
-        target = filter_value or "all"
-        flash(f"Created grouped XML ({attr_tag}={target}): {xml_out} (+ {xsd_out})")
+        flash(f"Started grouping {filename} by {attr_tag}={target} (job {job_id}).")
 
     return redirect(url_for("index"))
 
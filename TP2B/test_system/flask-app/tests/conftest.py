@@ -0,0 +1,8 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# app.py creates DATA_DIR and its upload folder at import time; point it at a scratch dir first.
+os.environ.setdefault("DATA_DIR", tempfile.mkdtemp(prefix="flask-tests-"))
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,43 @@
+import json
+
+import app as flask_app
+
+
+def test_complete_upload_returns_its_message_without_flashing():
+    client = flask_app.app.test_client()
+    body = b"City,Temp\nPorto,20\n"
+    created = client.post("/uploads", data={"filename": "temps.csv", "size": str(len(body))}).get_json()
+    upload_id = created["upload_id"]
+    assert client.put(f"/uploads/{upload_id}?offset=0", data=body).status_code == 200
+
+    done = client.post(f"/uploads/{upload_id}/complete")
+    assert done.status_code == 200
+    assert done.get_json()["message"] == "Uploaded CSV saved as: temps.csv"
+    with client.session_transaction() as session:
+        assert "_flashes" not in session
+
+
+class _Response:
+    ok = True
+    status_code = 200
+
+    def __init__(self, payload):
+        self.content = json.dumps(payload).encode()
+        self._payload = payload
+
+    def json(self):
+        return self._payload
+
+
+def test_failed_and_cancelled_jobs_refresh_the_listings(monkeypatch):
+    invalidated = []
+    monkeypatch.setattr(flask_app, "_invalidate_listings", lambda: invalidated.append(True))
+    client = flask_app.app.test_client()
+    for status in ("failed", "cancelled"):
+        job_id = f"job-{status}"
+        with client.session_transaction() as session:
+            session["jobs"] = [{"id": job_id, "operation": "import_csv"}]
+        monkeypatch.setattr(flask_app.http, "get", lambda url, timeout: _Response({"status": status}))
+        client.get(f"/jobs/{job_id}")
+        client.get(f"/jobs/{job_id}")
+    assert len(invalidated) == 2
@@ -0,0 +1,51 @@
+import io
+import os
+import zlib
+from typing import AsyncIterator, List, Optional
+
+# Copied from rpc-server/ into the image; run locally with PYTHONPATH=../rpc-server.
+from rows import RowWriter, export_projection
+
+# Documents fetched per cursor round trip, and bytes collected before a chunk is sent.
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "5000"))
+EXPORT_CHUNK_BYTES = int(os.getenv("EXPORT_CHUNK_BYTES", str(256 * 1024)))
+
+
+def export_chunks(coll, fmt: str = "csv", fields: Optional[List[str]] = None, root_name: str = "root",
+                  row_name: str = "row", include_ids: bool = False, compress: bool = False) -> AsyncIterator[bytes]:
+    """Stream an (async) collection as CSV or as the <root><row> XML csv_file_to_xml writes, in _id order.
+
+    Rows are formatted by the rpc-server's rows.RowWriter, so this matches its
+    export_collection. Memory stays bounded by one cursor batch plus one chunk.
+    compress yields a gzip stream instead. An unknown format or invalid XML name raises
+    ValueError here, before the response starts.
+    """
+    buffer = io.StringIO()
+    writer = RowWriter(buffer, fmt, fields, root_name, row_name, include_ids)
+    cursor = coll.find({}, export_projection(fields, include_ids), batch_size=EXPORT_BATCH_SIZE).sort("_id", 1)
+    return _chunks(cursor, writer, buffer, compress)
+
+
+async def _chunks(cursor, writer: RowWriter, buffer: io.StringIO, compress: bool) -> AsyncIterator[bytes]:
+    gzip = zlib.compressobj(wbits=31) if compress else None
+
+    def flush() -> bytes:
+        data = buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+        return gzip.compress(data) if gzip else data
+
+    writer.begin()
+    async for doc in cursor:
+        writer.write(doc)
+        if buffer.tell() >= EXPORT_CHUNK_BYTES:
+            chunk = flush()
+            if chunk:
+                yield chunk
+
+    writer.end()
+    chunk = flush()
+    if gzip:
+        chunk += gzip.flush()
+    if chunk:
+        yield chunk
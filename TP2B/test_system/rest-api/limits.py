@@ -0,0 +1,82 @@
+import asyncio
+import os
+from typing import AsyncIterator
+
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+
+# Requests of each route class allowed in flight at once. The rest wait up to
+# REST_QUEUE_TIMEOUT seconds for a slot and then get 503.
+REST_READ_CONCURRENCY = int(os.getenv("REST_READ_CONCURRENCY", "64"))
+REST_HEAVY_CONCURRENCY = int(os.getenv("REST_HEAVY_CONCURRENCY", "4"))
+REST_EXPORT_CONCURRENCY = int(os.getenv("REST_EXPORT_CONCURRENCY", "4"))
+REST_QUEUE_TIMEOUT = float(os.getenv("REST_QUEUE_TIMEOUT", "30"))
+
+
+class RouteLimit:
+    """Caps the requests of one route class in flight, so heavy routes cannot crowd out cheap reads.
+
+    Routes take a slot with dependencies=[Depends(limit.slot)]. Streaming routes return
+    await limit.stream(chunks, ...), which holds the slot until the response is done.
+    """
+
+    def __init__(self, name: str, limit: int, queue_timeout: float = REST_QUEUE_TIMEOUT):
+        self.name = name
+        self.limit = limit
+        self.queue_timeout = queue_timeout
+        self._slots = asyncio.Semaphore(limit)
+
+    async def acquire(self) -> None:
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            raise HTTPException(503, f"Too many {self.name} requests in flight; retry later.",
+                                headers={"Retry-After": "5"})
+
+    def release(self) -> None:
+        self._slots.release()
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.release()
+
+    async def stream(self, chunks: AsyncIterator[bytes], **kwargs) -> StreamingResponse:
+        """Take a slot (or 503) and return a StreamingResponse over chunks that gives it back."""
+        response = _SlotResponse(self, chunks, **kwargs)
+        await self.acquire()
+        return response
+
+    async def slot(self):
+        """FastAPI dependency holding a slot for the whole request."""
+        await self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+
+class _SlotResponse(StreamingResponse):
+    """Releases its route slot once sent, also when the client disconnects before or
+    during the stream (the body generator may then never run its own finally)."""
+
+    def __init__(self, limit: RouteLimit, content: AsyncIterator[bytes], **kwargs):
+        super().__init__(content, **kwargs)
+        self._limit = limit
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self._limit.release()
+            await self.body_iterator.aclose()
+
+
+# Lookups, pages and single documents.
+reads = RouteLimit("read", REST_READ_CONCURRENCY)
+# Conversions, groupings, imports, validations and index builds.
+heavy = RouteLimit("heavy", REST_HEAVY_CONCURRENCY)
+# Collections streamed out by GET /export.
+exports = RouteLimit("export", REST_EXPORT_CONCURRENCY)
@@ -1,110 +1,540 @@
 import os
-from fastapi import FastAPI, Form, HTTPException
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import List
+from fastapi import Depends, FastAPI, Form, HTTPException, Query, Request
+from fastapi.responses import JSONResponse, Response
+import doc_cache
+import export
+import limits
 import rpc_client
-from pymongo import MongoClient
-app = FastAPI()
+from pymongo import AsyncMongoClient
 
 MONGO_URI = os.getenv("MONGO_URI", "mongodb://mongo:27017")
 DB_NAME = os.getenv("MONGO_DB_NAME", "testdb")
 
-@app.post("/convert-stored-csv")
-def convert_stored_csv(
+client = AsyncMongoClient(MONGO_URI, serverSelectionTimeoutMS=5000)
+db = client[DB_NAME]
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    await rpc_client.rpc.aclose()
+    await client.close()
+
+app = FastAPI(lifespan=lifespan)
+
+@app.post("/convert-stored-csv", dependencies=[Depends(limits.heavy.slot)])
+async def convert_stored_csv(
     filename: str = Form(...),
     root_name: str = Form("root"),
     row_name: str = Form("row"),
+    workers: int = Form(None),
+    compress: str = Form(None),
 ):
-    """Convert a CSV already in the shared data dir and save the XML alongside it."""
+    """Convert a CSV (plain, .gz or .zst) already in the shared data dir and save the XML alongside it.
+
+    compress ("gzip" or "zstd") writes the XML compressed.
+    """
     if not filename:
         raise HTTPException(400, "Filename is required.")
 
     try:
-        result = rpc_client.convert_csv_to_file(filename, root_name=root_name, row_name=row_name)
+        result = await rpc_client.convert_csv_to_file(
+            filename, root_name=root_name, row_name=row_name, workers=workers, compress=compress
+        )
     except Exception as exc:
         raise HTTPException(400, f"Unable to convert stored CSV '{filename}': {exc}")
 
     return {"status": "ok", "source": filename, **result}
 
-@app.post("/group-xml")
-def group_xml(
+@app.post("/group-xml", dependencies=[Depends(limits.heavy.slot)])
+async def group_xml(
     filename: str = Form(...),
     attr_tag: str = Form(...),
     filter_value: str = Form(None),
     row_tag: str = Form("row"),
     root_name: str = Form("root"),
     output_filename: str = Form(None),
+    use_index: bool = Form(True),
+    compress: str = Form(None),
 ):
     """Create a grouped/filtered XML + XSD from an existing XML in the shared data dir."""
     if not filename or not attr_tag:
         raise HTTPException(400, "filename and attr_tag are required.")
 
     try:
-        result = rpc_client.group_xml_file(
+        result = await rpc_client.group_xml_file(
             filename,
             attr_tag=attr_tag,
             filter_value=filter_value,
             row_tag=row_tag,
             root_name=root_name,
             output_filename=output_filename,
+            use_index=use_index,
+            compress=compress,
         )
     except Exception as exc:
         raise HTTPException(400, f"Unable to group XML '{filename}': {exc}")
 
     return {"status": "ok", "source": filename, **result}
 
-@app.get("/xml-files")
-def list_xml_files():
-    return {"files": rpc_client.list_xml_files()}
+@app.post("/partition-xml", dependencies=[Depends(limits.heavy.slot)])
+async def partition_xml(
+    filename: str = Form(...),
+    attr_tag: str = Form(...),
+    row_tag: str = Form("row"),
+    root_name: str = Form("root"),
+    output_dir: str = Form(None),
+    max_open_files: int = Form(None),
+    compress: str = Form(None),
+):
+    """Split an XML into one grouped XML + XSD per attr_tag value with a single read of the source."""
+    try:
+        result = await rpc_client.partition_xml_file(
+            filename,
+            attr_tag,
+            row_tag=row_tag,
+            root_name=root_name,
+            output_dir=output_dir,
+            max_open_files=max_open_files,
+            compress=compress,
+        )
+    except Exception as exc:
+        raise HTTPException(400, f"Unable to partition XML '{filename}': {exc}")
+
+    return {"status": "ok", **result}
 
-@app.post("/import-xml")
-def import_xml(
+@app.post("/aggregate", dependencies=[Depends(limits.heavy.slot)])
+async def aggregate_xml(
+    filename: str = Form(...),
+    group_by: List[str] = Form(None),
+    columns: List[str] = Form(None),
+    output_format: str = Form("json"),
+    output_filename: str = Form(None),
+    row_tag: str = Form("row"),
+    root_name: str = Form("root"),
+    compress: str = Form(None),
+):
+    """Per-group count/sum/min/max/mean of numeric columns of an XML or CSV in the shared data dir.
+
+    Repeat group_by/columns for several keys or columns; columns default to the XSD's numeric fields.
+    """
+    try:
+        result = await rpc_client.aggregate_xml(
+            filename,
+            group_by or [],
+            columns=columns,
+            output_format=output_format,
+            output_filename=output_filename,
+            row_tag=row_tag,
+            root_name=root_name,
+            compress=compress,
+        )
+    except Exception as exc:
+        raise HTTPException(400, f"Unable to aggregate '{filename}': {exc}")
+
+    return {"status": "ok", **result}
+
+@app.post("/xml-index", dependencies=[Depends(limits.heavy.slot)])
+async def build_xml_index(
+    filename: str = Form(...),
+    columns: List[str] = Form(...),
+    row_tag: str = Form("row"),
+):
+    """Build the sidecar index that lets filter_value groupings seek straight to matching rows."""
+    try:
+        result = await rpc_client.build_xml_index(filename, columns, row_tag=row_tag)
+    except Exception as exc:
+        raise HTTPException(400, f"Unable to index XML '{filename}': {exc}")
+
+    return {"status": "ok", "source": filename, **result}
+
+@app.get("/xml-files", dependencies=[Depends(limits.reads.slot)])
+async def list_xml_files():
+    return {"files": await rpc_client.list_xml_files()}
+
+@app.post("/import-xml", dependencies=[Depends(limits.heavy.slot)])
+async def import_xml(
+    filename: str = Form(...),
+    collection: str = Form("Collection"),
+    include_ids: bool = Form(False),
+    typed: bool = Form(True),
+):
+    """Insert an XML file from the shared data dir into MongoDB and return an import summary."""
+    if not filename:
+        raise HTTPException(400, "Filename is required.")
+
+    try:
+        summary = await rpc_client.insert_xml_file(
+            filename, collection=collection, include_ids=include_ids, typed=typed
+        )
+    except Exception as exc:
+        raise HTTPException(400, f"Unable to import XML '{filename}': {exc}")
+    finally:
+        doc_cache.invalidate(collection)
+
+    return {"status": "ok", "Total Inserted Documents": summary["count"], **summary}
+
+@app.post("/import-csv", dependencies=[Depends(limits.heavy.slot)])
+async def import_csv(
     filename: str = Form(...),
     collection: str = Form("Collection"),
+    write_artifacts: bool = Form(False),
+    root_name: str = Form("root"),
+    row_name: str = Form("row"),
+    typed: bool = Form(True),
 ):
-    """Insert an XML file from the shared data dir into MongoDB."""
+    """Import a CSV from the shared data dir straight into MongoDB, without an intermediate XML file."""
     if not filename:
         raise HTTPException(400, "Filename is required.")
 
     try:
-        inserted_ids = rpc_client.insert_xml_file(filename, collection=collection)
+        summary = await rpc_client.import_csv(
+            filename, collection=collection, write_artifacts=write_artifacts,
+            root_name=root_name, row_name=row_name, typed=typed,
+        )
+    except Exception as exc:
+        raise HTTPException(400, f"Unable to import CSV '{filename}': {exc}")
+    finally:
+        doc_cache.invalidate(collection)
+
+    return {"status": "ok", "source": filename, **summary}
+
+@app.post("/import-xml-validated", dependencies=[Depends(limits.heavy.slot)])
+async def import_xml_validated(
+    filename: str = Form(...),
+    xsd_filename: str = Form(None),
+    collection: str = Form("Collection"),
+    on_error: str = Form("rollback"),
+    typed: bool = Form(True),
+):
+    """Validate and import an XML file in one pass; invalid files leave nothing behind in the collection."""
+    if not filename:
+        raise HTTPException(400, "Filename is required.")
+
+    try:
+        summary = await rpc_client.import_xml_validated(
+            filename, xsd_filename=xsd_filename, collection=collection, on_error=on_error, typed=typed
+        )
     except Exception as exc:
         raise HTTPException(400, f"Unable to import XML '{filename}': {exc}")
+    finally:
+        doc_cache.invalidate(collection)
+
+    return summary
 
-    return {"status": "ok","Total Inserted Documents": len(inserted_ids)}
+@app.get("/imports/ids", dependencies=[Depends(limits.reads.slot)])
+async def list_inserted_ids(
+    first_id: str, last_id: str, collection: str = "Collection", after: str = None, limit: int = 1000
+):
+    """Page through the ids of an import using the first_id/last_id from its summary."""
+    try:
+        return await rpc_client.list_inserted_ids(first_id, last_id, collection=collection, after=after, limit=limit)
+    except Exception as exc:
+        raise HTTPException(400, f"Unable to list inserted ids: {exc}")
 
-@app.post("/validate-xml")
-def validate_xml(
+@app.post("/validate-xml", dependencies=[Depends(limits.heavy.slot)])
+async def validate_xml(
     filename: str = Form(...),
     xsd_filename: str = Form(...),
+    max_errors: int = Form(1),
 ):
     if not filename or not xsd_filename:
         raise HTTPException(400, "Filename and XSD filename are required.")
 
     try:
-        ok, message = rpc_client.validate_xml(filename, xsd_filename)
+        ok, message = await rpc_client.validate_xml(filename, xsd_filename, max_errors=max_errors)
     except Exception as exc:
         raise HTTPException(400, f"Validation failed: {exc}")
 
     status = "ok" if ok else "invalid"
     return {"status": status, "message": message}
 
-@app.get("/documents")
-def list_docs(collection: str = "Collection"):
-    return {"documents": rpc_client.list_documents(collection=collection)}
+@app.post("/validate-many", dependencies=[Depends(limits.heavy.slot)])
+async def validate_many(
+    filenames: List[str] = Form(...),
+    xsd_filenames: List[str] = Form(None),
+    max_errors: int = Form(1),
+    fail_fast: bool = Form(False),
+):
+    """Validate several XML files concurrently; each XSD defaults to the XML name with .xsd (a.xml.gz -> a.xsd)."""
+    if xsd_filenames and len(xsd_filenames) != len(filenames):
+        raise HTTPException(400, "Provide one XSD filename per XML filename.")
+    xsd_filenames = xsd_filenames or [_xsd_name(name) for name in filenames]
 
-@app.get("/documents/{doc_id}")
-def get_doc(doc_id: str, collection: str = "Collection"):
-    doc = rpc_client.get_document(doc_id, collection=collection)
-    if not doc:
-        raise HTTPException(404, "Document not found")
-    return doc
+    try:
+        results = await rpc_client.validate_many(
+            zip(filenames, xsd_filenames), max_errors=max_errors, fail_fast=fail_fast
+        )
+    except Exception as exc:
+        raise HTTPException(400, f"Validation failed: {exc}")
 
-client = MongoClient(MONGO_URI, serverSelectionTimeoutMS=5000)
-db = client[DB_NAME]
+    status = "ok" if all(result["ok"] for result in results) else "invalid"
+    return {"status": status, "results": results}
+
+@app.get("/cache", dependencies=[Depends(limits.reads.slot)])
+async def cache_stats():
+    """Entries, bytes and hits of the rpc-server's convert/group result cache."""
+    return await rpc_client.cache_stats()
+
+@app.delete("/cache", dependencies=[Depends(limits.reads.slot)])
+async def clear_cache():
+    return {"status": "ok", "removed": await rpc_client.clear_cache()}
+
+# Job operations that write to a collection, and the collection of each such job not yet seen finished.
+# Jobs nobody polls to the end are forgotten oldest first; the cache TTL then bounds staleness.
+_WRITE_JOBS = {"insert_xml_file", "import_xml_validated", "import_csv"}
+_JOB_COLLECTIONS_MAX = 1024
+_job_collections = OrderedDict()
+
+@app.post("/jobs", dependencies=[Depends(limits.reads.slot)])
+async def submit_job(request: Request):
+    """Start a long-running operation in the background and return its job id.
+
+    Form fields: operation, filename, plus that operation's optional arguments by name.
+    Operations: convert_csv_to_file, convert_upload, group_xml_file, partition_xml_file,
+    aggregate_xml, export_collection, insert_xml_file, import_xml_validated, import_csv,
+    validate_xml and build_xml_index (the rpc-server's JOB_OPERATIONS).
+    """
+    form = dict(await request.form())
+    operation = form.pop("operation", None)
+    filename = form.pop("filename", None)
+    if not operation or not filename:
+        raise HTTPException(400, "operation and filename are required.")
+    kwargs = {key: value for key, value in form.items() if value != ""}
+
+    try:
+        job_id = await rpc_client.submit_job(operation, [filename], kwargs)
+    except Exception as exc:
+        raise HTTPException(400, f"Unable to start job '{operation}': {exc}")
+
+    if operation in _WRITE_JOBS:
+        _job_collections[job_id] = kwargs.get("collection", "Collection")
+        doc_cache.invalidate(_job_collections[job_id])
+        while len(_job_collections) > _JOB_COLLECTIONS_MAX:
+            _job_collections.popitem(last=False)
+    return {"status": "ok", "job_id": job_id}
+
+@app.get("/jobs/{job_id}", dependencies=[Depends(limits.reads.slot)])
+async def get_job(job_id: str):
+    job = await rpc_client.get_job(job_id)
+    if not job:
+        _job_collections.pop(job_id, None)
+        raise HTTPException(404, "Job not found")
+    if job["status"] in ("done", "failed", "cancelled") and job_id in _job_collections:
+        doc_cache.invalidate(_job_collections.pop(job_id))
+    return job
+
+@app.delete("/jobs/{job_id}", dependencies=[Depends(limits.reads.slot)])
+async def cancel_job(job_id: str):
+    if not await rpc_client.cancel_job(job_id):
+        raise HTTPException(404, "Job not found or already finished")
+    return {"status": "cancelling", "job_id": job_id}
+
+@app.get("/documents", dependencies=[Depends(limits.reads.slot)])
+async def list_docs(collection: str = "Collection", after: str = None, limit: int = 50, with_total: bool = False):
+    """One page of document ids (newest first); pass next_after back as after for the next page."""
+    try:
+        return await rpc_client.list_documents(collection=collection, after=after, limit=limit, with_total=with_total)
+    except Exception as exc:
+        raise HTTPException(400, f"Unable to list documents: {exc}")
+
+@app.get("/query", dependencies=[Depends(limits.reads.slot)])
+async def query_documents(
+    collection: str = "Collection",
+    filter: str = None,
+    fields: str = None,
+    sort: str = None,
+    after: str = None,
+    limit: int = 50,
+):
+    """Documents matching a Mongo filter (JSON, e.g. {"City": "Porto"}), keyset-paginated.
+
+    fields is a comma-separated projection; sort is a field name, "-" prefixed for descending.
+    """
+    try:
+        return await rpc_client.find_documents(
+            collection=collection,
+            filter=filter,
+            fields=fields.split(",") if fields else None,
+            sort=sort,
+            after=after,
+            limit=limit,
+        )
+    except Exception as exc:
+        raise HTTPException(400, f"Query failed: {exc}")
+
+@app.get("/query/group", dependencies=[Depends(limits.reads.slot)])
+async def group_documents(
+    collection: str = "Collection",
+    group_by: List[str] = Query(None),
+    metrics: List[str] = Query(None),
+    filter: str = None,
+    sort: str = None,
+    limit: int = 1000,
+):
+    """$group aggregation run in MongoDB, e.g. group_by=City&metrics=count&metrics=avg:AvgTemperature."""
+    try:
+        return await rpc_client.aggregate_documents(
+            collection=collection, group_by=group_by, metrics=metrics, filter=filter, sort=sort, limit=limit
+        )
+    except Exception as exc:
+        raise HTTPException(400, f"Aggregation failed: {exc}")
+
+@app.get("/indexes", dependencies=[Depends(limits.reads.slot)])
+async def list_indexes(collection: str = "Collection"):
+    try:
+        return {"indexes": await rpc_client.list_indexes(collection=collection)}
+    except Exception as exc:
+        raise HTTPException(400, f"Unable to list indexes: {exc}")
+
+@app.post("/indexes", dependencies=[Depends(limits.heavy.slot)])
+async def create_index(
+    fields: List[str] = Form(...),
+    collection: str = Form("Collection"),
+    unique: bool = Form(False),
+):
+    """Index the fields queries filter or sort by ("-" prefix for descending)."""
+    try:
+        name = await rpc_client.create_index(collection=collection, fields=fields, unique=unique)
+    except Exception as exc:
+        raise HTTPException(400, f"Unable to create index: {exc}")
+    return {"status": "ok", "name": name}
+
+@app.delete("/indexes/{name}", dependencies=[Depends(limits.reads.slot)])
+async def drop_index(name: str, collection: str = "Collection"):
+    try:
+        await rpc_client.drop_index(collection=collection, name=name)
+    except Exception as exc:
+        raise HTTPException(400, f"Unable to drop index: {exc}")
+    return {"status": "ok", "name": name}
+
+def _xsd_name(xml_name: str) -> str:
+    """Default XSD of an XML file, ignoring a compression suffix."""
+    if xml_name.lower().endswith((".gz", ".zst")):
+        xml_name = xml_name.rsplit(".", 1)[0]
+    return xml_name.rsplit(".", 1)[0] + ".xsd"
+
+def _conditional_json(request: Request, payload):
+    """JSON response with an ETag; 304 without a body if the client already has it."""
+    tag = doc_cache.etag(payload)
+    headers = {"ETag": tag, "Cache-Control": "no-cache"}
+    if doc_cache.not_modified(request.headers.get("if-none-match"), tag):
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(payload, headers=headers)
+
+@app.get("/documents/batch", dependencies=[Depends(limits.reads.slot)])
+async def get_docs(request: Request, ids: List[str] = Query(...), collection: str = "Collection", fields: str = None):
+    """Several documents in one call (ids repeated or comma-separated), in the order given.
+
+    Documents still in the hot-document cache are not fetched again; the rest come
+    from one $in query. Unknown ids are listed under missing.
+    """
+    ids = list(dict.fromkeys(i.strip() for value in ids for i in value.split(",") if i.strip()))
+    field_list = [f for f in fields.split(",") if f] if fields else []
+    shape = tuple(field_list)
+    found = {}
+    for doc_id in ids:
+        doc = doc_cache.documents.get((collection, doc_id, shape))
+        if doc is not None:
+            found[doc_id] = doc
+    missing = []
+    to_fetch = [doc_id for doc_id in ids if doc_id not in found]
+    if to_fetch:
+        try:
+            result = await rpc_client.get_documents(to_fetch, collection=collection, fields=field_list)
+        except Exception as exc:
+            raise HTTPException(400, f"Unable to fetch documents: {exc}")
+        for doc in result["documents"]:
+            found[doc["_id"]] = doc
+            doc_cache.documents.put((collection, doc["_id"], shape), doc)
+        missing = result["missing"]
+    payload = {"documents": [found[doc_id] for doc_id in ids if doc_id in found], "missing": missing}
+    return _conditional_json(request, payload)
+
+@app.get("/documents/{doc_id}", dependencies=[Depends(limits.reads.slot)])
+async def get_doc(doc_id: str, request: Request, collection: str = "Collection"):
+    key = (collection, doc_id, ())
+    doc = doc_cache.documents.get(key)
+    if doc is None:
+        doc = await rpc_client.get_document(doc_id, collection=collection)
+        if not doc:
+            raise HTTPException(404, "Document not found")
+        doc_cache.documents.put(key, doc)
+    return _conditional_json(request, doc)
+
+@app.get("/export")
+async def export_collection(
+    collection: str = "Collection",
+    format: str = "csv",
+    fields: str = None,
+    root_name: str = "root",
+    row_name: str = "row",
+    include_ids: bool = False,
+    gzip: bool = False,
+):
+    """Stream a whole collection as CSV or <root><row> XML straight from a Mongo cursor.
+
+    fields is a comma-separated projection (and the CSV column order); gzip sends a .gz file.
+    """
+    if format not in ("csv", "xml"):
+        raise HTTPException(400, "format must be csv or xml.")
+    try:
+        chunks = export.export_chunks(
+            db[collection],
+            fmt=format,
+            fields=fields.split(",") if fields else None,
+            root_name=root_name,
+            row_name=row_name,
+            include_ids=include_ids,
+            compress=gzip,
+        )
+    except ValueError as exc:
+        raise HTTPException(400, str(exc))
+    filename = f"{collection}.{format}" + (".gz" if gzip else "")
+    media_type = "application/gzip" if gzip else ("text/csv" if format == "csv" else "application/xml")
+    return await limits.exports.stream(
+        chunks,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+@app.post("/export", dependencies=[Depends(limits.heavy.slot)])
+async def export_collection_to_file(
+    filename: str = Form(...),
+    collection: str = Form("Collection"),
+    format: str = Form("csv"),
+    fields: List[str] = Form(None),
+    root_name: str = Form("root"),
+    row_name: str = Form("row"),
+    include_ids: bool = Form(False),
+    compress: str = Form(None),
+):
+    """Export a collection to a file in the shared data dir (use POST /jobs for large collections).
+
+    compress is true/"gzip" or "zstd"; a filename ending in .gz/.zst also picks it.
+    """
+    try:
+        result = await rpc_client.export_collection(
+            filename,
+            collection=collection,
+            format=format,
+            fields=fields,
+            root_name=root_name,
+            row_name=row_name,
+            include_ids=include_ids,
+            compress=compress,
+        )
+    except Exception as exc:
+        raise HTTPException(400, f"Unable to export '{collection}': {exc}")
+
+    return {"status": "ok", **result}
 
-@app.get("/collections")
-def getMongoCollections():
+@app.get("/collections", dependencies=[Depends(limits.reads.slot)])
+async def getMongoCollections():
     try:
-        collections = db.list_collection_names()
+        collections = await db.list_collection_names()
         return collections
     except Exception as exc:
         raise HTTPException(500, f"Unable to list collections: {exc}")
@@ -1,26 +1,201 @@
+import functools
+import os
+import threading
 from xmlrpc.client import ServerProxy
-from pymongo import MongoClient
 
+import anyio
+import httpx
 
-rpc = ServerProxy("http://rpc-server:8000/RPC2", allow_none=True)
+RPC_URL = os.getenv("RPC_URL", "http://rpc-server:8000")
+# "json" (pooled keep-alive HTTP/JSON) or "xmlrpc" (the compatibility endpoint).
+RPC_TRANSPORT = os.getenv("RPC_TRANSPORT", "json")
+# Keep-alive connections to the rpc-server; each one holds a server thread while open.
+# Heavy methods get their own pool so long conversions never take the connections reads need.
+RPC_POOL_SIZE = int(os.getenv("RPC_POOL_SIZE", "8"))
+RPC_HEAVY_POOL_SIZE = int(os.getenv("RPC_HEAVY_POOL_SIZE", "4"))
+# Idle connections are dropped before the server's RPC_KEEPALIVE_TIMEOUT closes them under us.
+RPC_KEEPALIVE_EXPIRY = float(os.getenv("RPC_KEEPALIVE_EXPIRY", "2"))
+RPC_TIMEOUT = float(os.getenv("RPC_TIMEOUT", "600"))
+RPC_FAST_TIMEOUT = float(os.getenv("RPC_FAST_TIMEOUT", "30"))
+# Calls that only look something up; they get RPC_FAST_TIMEOUT instead of RPC_TIMEOUT.
+FAST_METHODS = {
+    "list_xml_files", "list_documents", "get_document", "get_documents", "list_inserted_ids", "submit_job",
+    "get_job", "cancel_job", "cache_stats", "clear_cache", "list_indexes", "drop_index",
+}
+# Calls that read or write whole files or collections; they run on the heavy pool.
+HEAVY_METHODS = {
+    "convert_csv_to_file", "group_xml_file", "partition_xml_file", "aggregate_xml", "build_xml_index",
+    "insert_xml_file", "import_csv", "import_xml_validated", "validate_xml", "validate_many", "export_collection",
+    "create_index",
+}
 
-def convert_csv_to_file(filename, root_name="root", row_name="row"):
-    return rpc.convert_csv_to_file(filename, root_name, row_name)
 
-def list_xml_files():
-    return rpc.list_xml_files()
+class RPCError(Exception):
+    """A call failed on the rpc-server (type is the server-side exception name) or could not be made."""
 
-def insert_xml_file(xml_filename, collection=None):
-    return rpc.insert_xml_file(xml_filename, collection)
+    def __init__(self, message: str, type: str = None):
+        super().__init__(f"{type}: {message}" if type else message)
+        self.type = type
 
-def validate_xml(xml_filename, xsd_filename):
-    return rpc.validate_xml(xml_filename, xsd_filename)
 
-def list_documents(collection=None):
-    return rpc.list_documents(collection)
+class JSONClient:
+    """Async rpc-server client over HTTP/JSON with pools of keep-alive connections.
 
-def get_document(doc_id, collection=None):
-    return rpc.get_document(doc_id, collection)
+    Callers beyond a pool's size wait for a free connection. await rpc.<method>(*params)
+    calls a method with its default timeout; await rpc.call(method, *params, timeout=...)
+    overrides it for one call. Use from a single event loop.
+    """
 
-def group_xml_file(xml_filename, attr_tag, filter_value=None, row_tag="row", root_name="root", output_filename=None):
-    return rpc.group_xml_file(xml_filename, attr_tag, filter_value, row_tag, root_name, output_filename)
+    def __init__(self, url: str = RPC_URL, pool_size: int = RPC_POOL_SIZE,
+                 heavy_pool_size: int = RPC_HEAVY_POOL_SIZE):
+        self._http = httpx.AsyncClient(
+            base_url=url, limits=httpx.Limits(max_connections=pool_size, keepalive_expiry=RPC_KEEPALIVE_EXPIRY)
+        )
+        self._heavy = httpx.AsyncClient(
+            base_url=url, limits=httpx.Limits(max_connections=heavy_pool_size, keepalive_expiry=RPC_KEEPALIVE_EXPIRY)
+        )
+
+    async def call(self, method: str, *params, timeout: float = None):
+        if timeout is None:
+            timeout = RPC_FAST_TIMEOUT if method in FAST_METHODS else RPC_TIMEOUT
+        http = self._heavy if method in HEAVY_METHODS else self._http
+        try:
+            resp = await http.post(
+                f"/json/{method}",
+                json={"params": list(params)},
+                timeout=httpx.Timeout(timeout, connect=min(timeout, 10)),
+            )
+        except httpx.HTTPError as exc:
+            raise RPCError(f"rpc-server unreachable: {exc!r}") from exc
+        if resp.status_code == 503:
+            raise RPCError("RPC server is too busy")
+        try:
+            body = resp.json()
+        except ValueError:
+            raise RPCError(f"Unexpected rpc-server response ({resp.status_code})")
+        if "error" in body:
+            raise RPCError(body["error"]["message"], body["error"]["type"])
+        return body["result"]
+
+    async def aclose(self) -> None:
+        await self._http.aclose()
+        await self._heavy.aclose()
+
+    def __getattr__(self, method: str):
+        if method.startswith("_"):
+            raise AttributeError(method)
+        return functools.partial(self.call, method)
+
+
+class XMLRPCClient:
+    """The previous XML-RPC transport, run in worker threads with one ServerProxy each (it is not thread-safe)."""
+
+    def __init__(self, url: str = RPC_URL):
+        self._url = f"{url}/RPC2"
+        self._local = threading.local()
+
+    def _call(self, method: str, *params):
+        proxy = getattr(self._local, "proxy", None)
+        if proxy is None:
+            proxy = self._local.proxy = ServerProxy(self._url, allow_none=True)
+        return getattr(proxy, method)(*params)
+
+    async def call(self, method: str, *params, timeout: float = None):
+        return await anyio.to_thread.run_sync(functools.partial(self._call, method, *params))
+
+    async def aclose(self) -> None:
+        pass
+
+    def __getattr__(self, method: str):
+        if method.startswith("_"):
+            raise AttributeError(method)
+        return functools.partial(self.call, method)
+
+
+rpc = XMLRPCClient() if RPC_TRANSPORT == "xmlrpc" else JSONClient()
+
+async def convert_csv_to_file(filename, root_name="root", row_name="row", workers=None, compress=None):
+    return await rpc.convert_csv_to_file(filename, root_name, row_name, workers, compress)
+
+async def list_xml_files():
+    return await rpc.list_xml_files()
+
+async def insert_xml_file(xml_filename, collection=None, include_ids=False, typed=True):
+    return await rpc.insert_xml_file(xml_filename, collection, include_ids, typed)
+
+async def import_csv(filename, collection=None, write_artifacts=False, root_name="root", row_name="row", typed=True):
+    return await rpc.import_csv(filename, collection, write_artifacts, root_name, row_name, typed)
+
+async def import_xml_validated(xml_filename, xsd_filename=None, collection=None, on_error="rollback", typed=True):
+    return await rpc.import_xml_validated(xml_filename, xsd_filename, collection, on_error, typed)
+
+async def list_inserted_ids(first_id, last_id, collection=None, after=None, limit=1000):
+    return await rpc.list_inserted_ids(first_id, last_id, collection, after, limit)
+
+async def validate_xml(xml_filename, xsd_filename, max_errors=1):
+    return await rpc.validate_xml(xml_filename, xsd_filename, max_errors)
+
+async def validate_many(pairs, max_errors=1, fail_fast=False):
+    return await rpc.validate_many([list(pair) for pair in pairs], max_errors, fail_fast)
+
+async def list_documents(collection=None, after=None, limit=50, with_total=False):
+    return await rpc.list_documents(collection, after, limit, with_total)
+
+async def get_document(doc_id, collection=None):
+    return await rpc.get_document(doc_id, collection)
+
+async def get_documents(ids, collection=None, fields=None):
+    return await rpc.get_documents(list(ids), collection, list(fields or []))
+
+async def cache_stats():
+    return await rpc.cache_stats()
+
+async def clear_cache():
+    return await rpc.clear_cache()
+
+async def group_xml_file(xml_filename, attr_tag, filter_value=None, row_tag="row", root_name="root",
+                         output_filename=None, use_index=True, compress=None):
+    return await rpc.group_xml_file(xml_filename, attr_tag, filter_value, row_tag, root_name, output_filename,
+                                    use_index, compress)
+
+async def partition_xml_file(xml_filename, attr_tag, row_tag="row", root_name="root", output_dir=None,
+                             max_open_files=None, compress=None):
+    return await rpc.partition_xml_file(xml_filename, attr_tag, row_tag, root_name, output_dir, max_open_files,
+                                        compress)
+
+async def aggregate_xml(filename, group_by, columns=None, output_format="json", output_filename=None, row_tag="row",
+                        root_name="root", compress=None):
+    return await rpc.aggregate_xml(filename, list(group_by), list(columns or []), output_format, output_filename,
+                                   row_tag, root_name, compress)
+
+async def build_xml_index(xml_filename, columns, row_tag="row"):
+    return await rpc.build_xml_index(xml_filename, list(columns), row_tag)
+
+async def submit_job(operation, args=None, kwargs=None):
+    return await rpc.submit_job(operation, args or [], kwargs or {})
+
+async def get_job(job_id):
+    return await rpc.get_job(job_id)
+
+async def cancel_job(job_id):
+    return await rpc.cancel_job(job_id)
+
+async def find_documents(collection=None, filter=None, fields=None, sort=None, after=None, limit=50):
+    return await rpc.find_documents(collection, filter, list(fields or []), sort, after, limit)
+
+async def aggregate_documents(collection=None, group_by=None, metrics=None, filter=None, sort=None, limit=1000):
+    return await rpc.aggregate_documents(collection, list(group_by or []), list(metrics or []), filter, sort, limit)
+
+async def create_index(collection=None, fields=None, unique=False):
+    return await rpc.create_index(collection, list(fields or []), unique)
+
+async def list_indexes(collection=None):
+    return await rpc.list_indexes(collection)
+
+async def drop_index(collection=None, name=None):
+    return await rpc.drop_index(collection, name)
+
+async def export_collection(filename, collection=None, format="csv", fields=None, root_name="root", row_name="row",
+                            include_ids=False, compress=False):
+    return await rpc.export_collection(filename, collection, format, list(fields or []), root_name, row_name,
+                                       include_ids, compress)
@@ -0,0 +1,7 @@
+import sys
+from pathlib import Path
+
+here = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(here))
+# The image copies rpc-server/rows.py next to the app modules.
+sys.path.append(str(here.parent / "rpc-server"))
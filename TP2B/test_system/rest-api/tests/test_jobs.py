@@ -0,0 +1,19 @@
+from fastapi.testclient import TestClient
+
+import main
+
+
+def test_write_job_collections_are_capped(monkeypatch):
+    job_ids = iter(range(10))
+
+    async def submit_job(operation, args, kwargs):
+        return f"job-{next(job_ids)}"
+
+    monkeypatch.setattr(main.rpc_client, "submit_job", submit_job)
+    monkeypatch.setattr(main, "_JOB_COLLECTIONS_MAX", 3)
+    monkeypatch.setattr(main, "_job_collections", main.OrderedDict())
+    client = TestClient(main.app)
+    for _ in range(5):
+        resp = client.post("/jobs", data={"operation": "import_csv", "filename": "a.csv", "collection": "c"})
+        assert resp.status_code == 200
+    assert list(main._job_collections) == ["job-2", "job-3", "job-4"]
@@ -0,0 +1,27 @@
+import asyncio
+
+import limits
+
+
+def test_stream_slot_is_released_when_the_client_is_gone():
+    async def chunks():
+        yield b"row\n"
+
+    async def receive():
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        raise OSError("client went away")
+
+    async def run():
+        limit = limits.RouteLimit("export", 1, queue_timeout=0.1)
+        # With one slot, a leaked one makes the second stream() fail with 503.
+        for _ in range(3):
+            response = await limit.stream(chunks(), media_type="text/csv")
+            try:
+                await response({"type": "http", "asgi": {"spec_version": "2.4"}}, receive, send)
+            except Exception:
+                pass
+        return limit
+
+    assert asyncio.run(run())._slots._value == 1
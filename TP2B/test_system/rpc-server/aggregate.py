@@ -0,0 +1,295 @@
+import csv
+import io
+import math
+from array import array
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+from lxml import etree
+
+import compression
+from converter import ColumnType, XS
+from grouping import iter_rows
+from rows import check_xml_name
+
+# XSD types whose values are summed; the generator emits xs:int and xs:decimal.
+NUMERIC_TYPES = {
+    "xs:int", "xs:integer", "xs:long", "xs:short", "xs:decimal", "xs:double", "xs:float",
+    "xs:nonNegativeInteger", "xs:positiveInteger", "xs:negativeInteger", "xs:nonPositiveInteger",
+}
+# Rows between two progress callbacks.
+PROGRESS_EVERY = 10000
+# Rows sampled to pick numeric columns when there is no XSD.
+SAMPLE_ROWS = 200
+
+_INF = float("inf")
+_MAX_DOUBLE_INT = int(1.7976931348623157e308)
+
+
+class Aggregator:
+    """count/sum/min/max per group and column, kept in flat arrays.
+
+    Groups get an ordinal in first-seen order; column c of group g lives at slot
+    g * len(columns) + c of each array, so adding a row costs no per-group objects.
+    Integer cells are summed exactly in int_sum; only other numbers go to the float
+    sum, and a slot that never saw one reports an int sum, min and max (min and max
+    pass through the double arrays, so they are exact up to 2**53).
+    """
+
+    def __init__(self, columns: Sequence[str]):
+        self.columns = list(columns)
+        self.ordinals: Dict[Tuple[str, ...], int] = {}
+        self.keys: List[Tuple[str, ...]] = []
+        self.rows = array("q")
+        self.count = array("q")
+        self.int_sum: List[int] = []
+        self.sum = array("d")
+        self.inexact = array("b")
+        self.min = array("d")
+        self.max = array("d")
+
+    def add(self, key: Tuple[str, ...], values: Sequence[Optional[str]]) -> None:
+        ordinal = self.ordinals.get(key)
+        if ordinal is None:
+            ordinal = self.ordinals[key] = len(self.keys)
+            self.keys.append(key)
+            self.rows.append(0)
+            width = len(self.columns)
+            self.count.extend([0] * width)
+            self.int_sum.extend([0] * width)
+            self.sum.extend([0.0] * width)
+            self.inexact.extend([0] * width)
+            self.min.extend([_INF] * width)
+            self.max.extend([-_INF] * width)
+        self.rows[ordinal] += 1
+        slot = ordinal * len(self.columns)
+        for value in values:
+            if value:
+                number = _parse_number(value)
+                if number is not None:
+                    self.count[slot] += 1
+                    if type(number) is int:
+                        self.int_sum[slot] += number
+                    else:
+                        self.sum[slot] += number
+                        self.inexact[slot] = 1
+                    if number < self.min[slot]:
+                        self.min[slot] = number
+                    if number > self.max[slot]:
+                        self.max[slot] = number
+            slot += 1
+
+    def results(self, group_by: Sequence[str]) -> List[Dict]:
+        """One dict per group: the key columns, rows, and {count, sum, min, max, mean} per column."""
+        width = len(self.columns)
+        out = []
+        for ordinal, key in enumerate(self.keys):
+            group = dict(zip(group_by, key))
+            group["rows"] = self.rows[ordinal]
+            stats = {}
+            for c, column in enumerate(self.columns):
+                slot = ordinal * width + c
+                count = self.count[slot]
+                exact = not self.inexact[slot]
+                total = self.int_sum[slot] if exact else self.int_sum[slot] + self.sum[slot]
+                low, high = self.min[slot], self.max[slot]
+                stats[column] = {
+                    "count": count,
+                    "sum": total,
+                    "min": (int(low) if exact else low) if count else None,
+                    "max": (int(high) if exact else high) if count else None,
+                    "mean": total / count if count else None,
+                }
+            group["stats"] = stats
+            out.append(group)
+        return out
+
+
+def _parse_number(value: str):
+    """int for integer text (kept exact however large), float for other finite numbers, else None.
+
+    nan, inf and underscore-grouped digits, which int()/float() accept, are not numbers here.
+    """
+    if "_" in value:
+        return None
+    if value.lstrip("+-").isdigit():
+        try:
+            number = int(value)
+        except ValueError:
+            return None
+        # The min/max arrays hold doubles; integers past their range are not aggregated.
+        return number if abs(number) <= _MAX_DOUBLE_INT else None
+    try:
+        number = float(value)
+    except ValueError:
+        return None
+    return number if math.isfinite(number) else None
+
+
+def numeric_fields(xsd_path: Union[str, Path]) -> List[str]:
+    """Names of the leaf elements the XSD declares with a numeric type, in schema order."""
+    names = []
+    for element in etree.parse(str(xsd_path)).iter(f"{XS}element"):
+        if element.get("type") in NUMERIC_TYPES and element.get("name") not in names:
+            names.append(element.get("name"))
+    return names
+
+
+def _xml_rows(xml_path: Path, row_tag: str, fields: Sequence[str], progress=None) -> Iterator[Dict[str, str]]:
+    wanted = set(fields)
+    rows_scanned = 0
+    with compression.open_input(xml_path) as source:
+        # Same rows as grouping: a row nested in another row is part of that row.
+        for elem in iter_rows(source, row_tag):
+            values = {}
+            for child in elem:
+                if child.tag in wanted and child.tag not in values:
+                    values[child.tag] = (child.text or "").strip()
+            yield values
+
+            rows_scanned += 1
+            if progress and rows_scanned % PROGRESS_EVERY == 0:
+                progress(rows_scanned, compression.bytes_read(source))
+        if progress:
+            progress(rows_scanned, compression.bytes_read(source))
+
+
+def _csv_rows(csv_path: Path, progress=None) -> Iterator[Dict[str, str]]:
+    rows_scanned = 0
+    with compression.open_input(csv_path) as raw:
+        text = io.TextIOWrapper(raw, encoding="utf-8", newline="")
+        try:
+            for row in csv.DictReader(text):
+                yield {key: (value or "").strip() for key, value in row.items() if key is not None}
+                rows_scanned += 1
+                if progress and rows_scanned % PROGRESS_EVERY == 0:
+                    progress(rows_scanned, compression.bytes_read(raw))
+        except (csv.Error, UnicodeDecodeError) as exc:
+            raise ValueError(f"Invalid CSV file: {exc}") from exc
+        if progress:
+            progress(rows_scanned, compression.bytes_read(raw))
+
+
+def _sample_numeric(path: Path, row_tag: str) -> List[str]:
+    """Numeric columns inferred from the first SAMPLE_ROWS rows, for sources without an XSD."""
+    columns: Dict[str, ColumnType] = {}
+    if compression.base_name(path).suffix.lower() == ".csv":
+        rows = _csv_rows(path)
+    else:
+        rows = _xml_rows(path, row_tag, _all_fields(path, row_tag))
+    for n, row in enumerate(rows):
+        if n >= SAMPLE_ROWS:
+            break
+        for key, value in row.items():
+            # Blank cells would make the column a string; they are skipped when aggregating anyway.
+            if value:
+                columns.setdefault(key, ColumnType()).add(value)
+    rows.close()
+    return [name for name, column in columns.items() if column.xsd_type in ("xs:int", "xs:decimal")]
+
+
+def _all_fields(xml_path: Path, row_tag: str) -> List[str]:
+    """Child tags of the first row."""
+    with compression.open_input(xml_path) as source:
+        for _, elem in etree.iterparse(source, events=("end",), tag=row_tag, huge_tree=True):
+            return [child.tag for child in elem if isinstance(child.tag, str)]
+    return []
+
+
+def resolve_columns(path: Union[str, Path], group_by: Sequence[str], columns: Optional[Sequence[str]] = None,
+                    xsd_path: Union[str, Path, None] = None, row_tag: str = "row") -> List[str]:
+    """The columns aggregate_file aggregates.
+
+    Without columns, the numeric fields are taken from xsd_path (default: the
+    source's .xsd sibling), or inferred from sampled rows when there is none; key
+    columns are never aggregated.
+    """
+    path = Path(path)
+    if columns:
+        columns = list(columns)
+    else:
+        xsd_path = Path(xsd_path) if xsd_path else compression.xsd_path_for(path)
+        columns = numeric_fields(xsd_path) if xsd_path.is_file() else _sample_numeric(path, row_tag)
+        columns = [col for col in columns if col not in group_by]
+    if not columns:
+        raise ValueError("No numeric columns to aggregate.")
+    return columns
+
+
+def aggregate_file(
+    path: Union[str, Path],
+    group_by: Sequence[str],
+    columns: Optional[Sequence[str]] = None,
+    xsd_path: Union[str, Path, None] = None,
+    row_tag: str = "row",
+    progress=None,
+) -> Tuple[List[str], List[Dict]]:
+    """Stream an XML or CSV file once and aggregate columns per group_by key.
+
+    columns are picked by resolve_columns. Returns (columns, groups) with groups in
+    first-seen order, as produced by Aggregator.results. gzip/zstd sources are
+    read transparently (data.csv.gz is a CSV, data.xml.zst an XML).
+    """
+    path = Path(path)
+    group_by = list(group_by)
+    columns = resolve_columns(path, group_by, columns, xsd_path, row_tag)
+
+    aggregator = Aggregator(columns)
+    if compression.base_name(path).suffix.lower() == ".csv":
+        rows = _csv_rows(path, progress)
+    else:
+        rows = _xml_rows(path, row_tag, group_by + columns, progress)
+    for row in rows:
+        aggregator.add(tuple(row.get(key, "") for key in group_by), [row.get(col) for col in columns])
+    return columns, aggregator.results(group_by)
+
+
+def _number(value) -> str:
+    if value is None:
+        return ""
+    return str(int(value)) if isinstance(value, float) and value.is_integer() and abs(value) < 1e15 else repr(value)
+
+
+def write_csv(out_path: Union[str, Path], group_by: Sequence[str], columns: Sequence[str], groups: List[Dict]) -> None:
+    """One line per group: key columns, rows, then <col>_count/_sum/_min/_max/_mean per column."""
+    header = list(group_by) + ["rows"]
+    for col in columns:
+        header += [f"{col}_{stat}" for stat in ("count", "sum", "min", "max", "mean")]
+    with compression.open_output(out_path, "w", newline="") as out:
+        writer = csv.writer(out)
+        writer.writerow(header)
+        for group in groups:
+            line = [group[key] for key in group_by] + [group["rows"]]
+            for col in columns:
+                stats = group["stats"][col]
+                line += [stats["count"]] + [_number(stats[stat]) for stat in ("sum", "min", "max", "mean")]
+            writer.writerow(line)
+
+
+def check_xml_names(group_by: Sequence[str], columns: Sequence[str], root_name: str = "root") -> None:
+    """ValueError unless write_xml can use root_name, group_by (as attributes) and columns (as elements)."""
+    check_xml_name(root_name, "root")
+    for key in group_by:
+        check_xml_name(key, "group_by")
+        if key == "rows":
+            raise ValueError('group_by "rows" clashes with the rows attribute of each Group.')
+    for col in columns:
+        check_xml_name(col, "column")
+
+
+def write_xml(out_path: Union[str, Path], group_by: Sequence[str], columns: Sequence[str], groups: List[Dict],
+              root_name: str = "root") -> None:
+    """<root><Group key=.. rows=..><col count= sum= min= max= mean=/></Group></root>.
+
+    Call check_xml_names before aggregating, so invalid names fail before the pass.
+    """
+    check_xml_names(group_by, columns, root_name)
+    root = etree.Element(root_name)
+    for group in groups:
+        elem = etree.SubElement(root, "Group", {key: group[key] for key in group_by})
+        elem.set("rows", str(group["rows"]))
+        for col in columns:
+            stats = group["stats"][col]
+            etree.SubElement(elem, col, {stat: _number(stats[stat]) for stat in ("count", "sum", "min", "max", "mean")})
+    with compression.open_output(out_path, "wb") as out:
+        etree.ElementTree(root).write(out, encoding="utf-8", xml_declaration=True, pretty_print=True)
@@ -0,0 +1,170 @@
+import gzip
+import io
+import os
+from pathlib import Path
+from typing import Optional, Union
+
+try:
+    import zstandard
+except ImportError:  # zstd support is optional; gzip always works.
+    zstandard = None
+
+# Levels for outputs written compressed. Low levels keep writing close to disk speed
+# and still shrink row-oriented CSV/XML several times over.
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+ZSTD_LEVEL = int(os.getenv("ZSTD_LEVEL", "3"))
+# Bytes buffered between a (de)compressor and its file, so the shared mount sees large reads/writes.
+COMPRESSION_BUFFER_BYTES = int(os.getenv("COMPRESSION_BUFFER_BYTES", str(1024 * 1024)))
+
+GZIP, ZSTD = "gzip", "zstd"
+SUFFIXES = {GZIP: ".gz", ZSTD: ".zst"}
+_SUFFIX_COMPRESSION = {".gz": GZIP, ".gzip": GZIP, ".zst": ZSTD, ".zstd": ZSTD}
+_MAGIC = {GZIP: b"\x1f\x8b", ZSTD: b"\x28\xb5\x2f\xfd"}
+_ALIASES = {"gz": GZIP, "gzip": GZIP, "zst": ZSTD, "zstd": ZSTD}
+# What reading a corrupt or truncated compressed file raises (gzip.BadGzipFile is an OSError).
+ERRORS = (OSError, EOFError) + ((zstandard.ZstdError,) if zstandard else ())
+
+
+def normalize(compression: Union[str, bool, None]) -> Optional[str]:
+    """"gzip", "zstd" or None from a user-supplied value ("gz", "zst", True for gzip, "none", "" ...)."""
+    if not compression or str(compression).lower() in ("none", "false", "0", "no"):
+        return None
+    if compression is True or str(compression).lower() in ("true", "1", "yes"):
+        return GZIP
+    name = _ALIASES.get(str(compression).lower())
+    if name is None:
+        raise ValueError(f"Unknown compression: {compression}")
+    if name == ZSTD and zstandard is None:
+        raise ValueError("zstd compression needs the zstandard package.")
+    return name
+
+
+def from_suffix(path: Union[str, Path]) -> Optional[str]:
+    return _SUFFIX_COMPRESSION.get(Path(path).suffix.lower())
+
+
+def detect(path: Union[str, Path]) -> Optional[str]:
+    """Compression of an existing file from its magic bytes."""
+    with open(path, "rb") as f:
+        head = f.read(4)
+    for name, magic in _MAGIC.items():
+        if head.startswith(magic):
+            return name
+    return None
+
+
+def base_name(path: Union[str, Path]) -> Path:
+    """path without its compression suffix: data.csv.gz -> data.csv."""
+    path = Path(path)
+    return path.with_suffix("") if from_suffix(path) else path
+
+
+def xsd_path_for(xml_path: Union[str, Path]) -> Path:
+    """The XSD written next to an XML file: data.xml.gz -> data.xsd."""
+    return base_name(xml_path).with_suffix(".xsd")
+
+
+def with_compression(name: str, compression: Optional[str]) -> str:
+    """name with the suffix of compression appended (data.xml -> data.xml.gz)."""
+    compression = normalize(compression)
+    return name + SUFFIXES[compression] if compression else name
+
+
+def _zstd():
+    if zstandard is None:
+        raise ValueError("Reading or writing zstd files needs the zstandard package.")
+    return zstandard
+
+
+class _Decompressed(io.BufferedReader):
+    """Buffered reader over a decompressor; closing it also closes the compressed file."""
+
+    def __init__(self, decompressor, source):
+        super().__init__(decompressor, COMPRESSION_BUFFER_BYTES)
+        self.source = source
+
+    def close(self) -> None:
+        try:
+            super().close()
+        finally:
+            self.source.close()
+
+
+class _Compressed(io.BufferedWriter):
+    """Buffered writer over a compressor; closing it finishes the stream and closes the file."""
+
+    def __init__(self, compressor, target, buffer_size: int):
+        super().__init__(compressor, buffer_size)
+        self.target = target
+
+    def close(self) -> None:
+        try:
+            super().close()
+        finally:
+            self.target.close()
+
+
+def open_input(path: Union[str, Path], mode: str = "rb", encoding: str = "utf-8", newline: Optional[str] = None):
+    """Open a file for reading, decompressing gzip or zstd (detected by magic bytes) on the fly.
+
+    mode is "rb" or "rt". Use bytes_read() on the binary stream for progress, since
+    tell() of a decompressed stream counts uncompressed bytes.
+    """
+    compression = detect(path)
+    source = open(path, "rb", buffering=COMPRESSION_BUFFER_BYTES)
+    try:
+        if compression == GZIP:
+            stream = _Decompressed(gzip.GzipFile(fileobj=source, mode="rb"), source)
+        elif compression == ZSTD:
+            reader = _zstd().ZstdDecompressor().stream_reader(
+                source, read_size=COMPRESSION_BUFFER_BYTES, read_across_frames=True, closefd=False
+            )
+            stream = _Decompressed(reader, source)
+        else:
+            stream = source
+    except BaseException:
+        source.close()
+        raise
+    if mode == "rt":
+        return io.TextIOWrapper(stream, encoding=encoding, newline=newline)
+    return stream
+
+
+def bytes_read(stream) -> int:
+    """Bytes of the file on disk consumed so far by a stream from open_input."""
+    if isinstance(stream, io.TextIOWrapper):
+        stream = stream.buffer
+    return getattr(stream, "source", stream).tell()
+
+
+def open_output(path: Union[str, Path], mode: str = "wb", compression: Optional[str] = "auto",
+                encoding: str = "utf-8", newline: Optional[str] = None, buffer_size: int = None):
+    """Open a file for writing, compressing it with gzip or zstd.
+
+    compression "auto" picks it from the suffix of path (.gz, .zst); pass it explicitly
+    when writing to a temporary name. mode is "wb", "ab", "w" or "a"; appending to a
+    compressed file adds a new gzip member / zstd frame, which readers join transparently.
+    buffer_size (default COMPRESSION_BUFFER_BYTES) can be lowered when many outputs are open.
+    """
+    compression = from_suffix(path) if compression == "auto" else normalize(compression)
+    buffer_size = COMPRESSION_BUFFER_BYTES if buffer_size is None else buffer_size
+    binary_mode = mode.replace("t", "").rstrip("b") + "b"
+    target = open(path, binary_mode, buffering=buffer_size)
+    try:
+        if compression == GZIP:
+            # No file name or timestamp in the header, so equal input gives equal output.
+            compressor = gzip.GzipFile(filename="", fileobj=target, mode=binary_mode, compresslevel=GZIP_LEVEL, mtime=0)
+            stream = _Compressed(compressor, target, buffer_size)
+        elif compression == ZSTD:
+            compressor = _zstd().ZstdCompressor(level=ZSTD_LEVEL).stream_writer(
+                target, write_size=buffer_size, closefd=False
+            )
+            stream = _Compressed(compressor, target, buffer_size)
+        else:
+            stream = target
+    except BaseException:
+        target.close()
+        raise
+    if "b" not in mode:
+        return io.TextIOWrapper(stream, encoding=encoding, newline=newline)
+    return stream
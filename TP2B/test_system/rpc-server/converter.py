@@ -1,19 +1,44 @@
+import copy
 import csv
+import io
+import json
+import shutil
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Executor, ProcessPoolExecutor, as_completed
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, Tuple, Union
+from typing import Dict, List, NamedTuple, Optional, Tuple, Union
 from xml.sax.saxutils import escape
 import subprocess
 
 from lxml import etree
+import os
 import re
 
-DATA_DIR = Path("/data/shared")
+import compression
+from rows import csv_row_to_xml
+from grouping import group_rows, group_selected, partition_rows
+import xml_index
+
+DATA_DIR = Path(os.getenv("DATA_DIR", "/data/shared"))
+# "native" streams rows in-process; "basex" runs group_query.xq through the BaseX CLI.
+GROUP_ENGINE = os.getenv("GROUP_ENGINE", "native")
+# Parallel conversion never splits a CSV into chunks smaller than this.
+PARALLEL_MIN_CHUNK = int(os.getenv("PARALLEL_MIN_CHUNK", str(8 * 1024 * 1024)))
+# Rows between two progress callbacks.
+PROGRESS_EVERY = 10000
+# Compiled XSDs kept per process, keyed by path and invalidated on mtime/size change.
+SCHEMA_CACHE_SIZE = int(os.getenv("SCHEMA_CACHE_SIZE", "32"))
+
+XS = "{http://www.w3.org/2001/XMLSchema}"
 
 
 def is_valid_csv(path: str, delimiter: str = ",") -> bool:
     try:
-        with open(path, newline='', encoding="utf-8") as f:
+        with compression.open_input(path, "rt", newline='') as f:
             reader = csv.reader(f, delimiter=delimiter)
             for _ in reader:
                 pass  # Só tentar ler tudo
@@ -21,32 +46,266 @@ def is_valid_csv(path: str, delimiter: str = ",") -> bool:
     except Exception:
         return False
 
-def csv_file_to_xml(csv_path: Union[str, Path], xml_path: Union[str, Path], root_name="root", row_name="row") -> None:
+def csv_file_to_xml(
+    csv_path: Union[str, Path],
+    xml_path: Union[str, Path],
+    root_name="root",
+    row_name="row",
+    max_samples: int = 200,
+    workers: int = 1,
+    progress=None,
+) -> None:
+    """Convert CSV to XML and write the XSD, reading the CSV only once.
+
+    CSV structure is checked, rows are written and column types are inferred in the
+    same pass; the XML is written to a temporary sibling and only replaces
+    xml_path once the whole CSV parsed. With workers > 1 the CSV is split into
+    byte ranges converted in a process pool (see _convert_parallel).
+    A gzip/zstd CSV is decompressed on the fly (always with one worker, as it cannot
+    be split into byte ranges); xml_path ending in .gz/.zst is written compressed.
+    progress, if given, is called as progress(rows, bytes_read).
+    """
     csv_path = Path(csv_path)
     xml_path = Path(xml_path)
+    tmp_path = xml_path.with_name(f"{xml_path.name}.part")
+    output_compression = compression.from_suffix(xml_path)
 
-    if not is_valid_csv(str(csv_path)):
-        raise ValueError(f"Invalid CSV file: {csv_path}")
+    try:
+        if workers and workers > 1 and not compression.detect(csv_path):
+            columns = _convert_parallel(csv_path, tmp_path, root_name, row_name, max_samples, workers, progress,
+                                        output_compression)
+        else:
+            columns = {}
+            with compression.open_input(csv_path, "rt", newline="") as csv_file, \
+                 compression.open_output(tmp_path, "w", output_compression, newline="") as xml_file:
+                report = (lambda rows: progress(rows, compression.bytes_read(csv_file))) if progress else None
+                xml_file.write(f"<{root_name}>\n")
+                rows = _write_rows(csv.DictReader(csv_file), xml_file, row_name, columns, max_samples, report)
+                xml_file.write(f"</{root_name}>\n")
+                if progress:
+                    progress(rows, csv_path.stat().st_size)
+    except (csv.Error, UnicodeDecodeError) as exc:
+        tmp_path.unlink(missing_ok=True)
+        raise ValueError(f"Invalid CSV file: {csv_path}") from exc
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+
+    os.replace(tmp_path, xml_path)
 
-    with csv_path.open("r", encoding="utf-8", newline="") as csv_file, \
-         xml_path.open("w", encoding="utf-8", newline="") as xml_file:
+    # Write XSD alongside the XML
+    xsd_path = compression.xsd_path_for(xml_path)
+    write_text_atomic(xsd_path, xsd_for_columns(root_name, row_name, columns))
 
-        reader = csv.DictReader(csv_file)
-        row_indent, col_indent = "  ", "    "
-        xml_file.write(f"<{root_name}>\n")
-        for row in reader:
-            parts = [f"{row_indent}<{row_name}>\n"]
-            for col, val in row.items():
-                val = "" if val is None else escape(val)
-                parts.append(f"{col_indent}<{col}>{val}</{col}>\n")
-            parts.append(f"{row_indent}</{row_name}>\n")
-            xml_file.write("".join(parts))
-        xml_file.write(f"</{root_name}>\n")
 
-    # Write XSD alongside the XML
-    xsd_path = xml_path.with_suffix(".xsd")
-    xsd_content = generate_xsd_from_xml(xml_path, root_name=root_name, row_name=row_name)
-    xsd_path.write_text(xsd_content, encoding="utf-8")
+def write_text_atomic(path: Union[str, Path], text: str) -> None:
+    """Write text to a .part sibling and rename it over path, so readers never see a partial file."""
+    path = Path(path)
+    tmp_path = path.with_name(f"{path.name}.part")
+    try:
+        tmp_path.write_text(text, encoding="utf-8")
+        os.replace(tmp_path, path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+
+
+def csv_stream_to_xml(
+    stream,
+    xml_path: Union[str, Path],
+    root_name="root",
+    row_name="row",
+    max_samples: int = 200,
+    progress=None,
+) -> int:
+    """Convert CSV bytes read from a binary stream, e.g. an upload that is still arriving.
+
+    Writes the same XML and XSD as csv_file_to_xml with one worker, converting rows
+    as soon as the stream yields them; xml_path ending in .gz/.zst is written compressed.
+    progress is called as progress(rows, bytes_read), with bytes_read taken from
+    stream.position. Returns the row count.
+    """
+    xml_path = Path(xml_path)
+    tmp_path = xml_path.with_name(f"{xml_path.name}.part")
+    columns = {}
+    try:
+        with io.TextIOWrapper(io.BufferedReader(stream), encoding="utf-8", newline="") as csv_file, \
+             compression.open_output(tmp_path, "w", compression.from_suffix(xml_path), newline="") as xml_file:
+            report = (lambda rows: progress(rows, stream.position)) if progress else None
+            xml_file.write(f"<{root_name}>\n")
+            rows = _write_rows(csv.DictReader(csv_file), xml_file, row_name, columns, max_samples, report)
+            xml_file.write(f"</{root_name}>\n")
+            if progress:
+                progress(rows, stream.position)
+    except (csv.Error, UnicodeDecodeError) as exc:
+        tmp_path.unlink(missing_ok=True)
+        raise ValueError("Invalid CSV stream") from exc
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+
+    os.replace(tmp_path, xml_path)
+    write_text_atomic(compression.xsd_path_for(xml_path), xsd_for_columns(root_name, row_name, columns))
+    return rows
+
+
+def xsd_for_columns(root_name: str, row_name: str, columns: Dict[str, "ColumnType"]) -> str:
+    """XSD for a flat <root><row> document from per-column inferred types."""
+    return _build_xsd(root_name, row_name, {col: column.xsd_type for col, column in columns.items()})
+
+
+def _write_rows(reader, xml_file, row_name: str, columns: Dict[str, "ColumnType"], max_samples: int,
+                report=None) -> int:
+    rows_seen = 0
+    for row in reader:
+        xml_file.write(csv_row_to_xml(row, row_name))
+
+        if rows_seen < max_samples:
+            _accumulate_types(columns, row)
+        rows_seen += 1
+        if report and rows_seen % PROGRESS_EVERY == 0:
+            report(rows_seen)
+    return rows_seen
+
+
+class _RangeReader(io.RawIOBase):
+    """Raw reader over the byte range [start, end) of a file."""
+
+    def __init__(self, path, start: int, end: int):
+        self._file = open(path, "rb")
+        self._file.seek(start)
+        self._remaining = end - start
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        if self._remaining <= 0:
+            return 0
+        view = memoryview(buffer)[: min(len(buffer), self._remaining)]
+        size = self._file.readinto(view)
+        self._remaining -= size
+        return size
+
+    def close(self):
+        self._file.close()
+        super().close()
+
+
+def _record_boundaries(csv_path: Path, targets: List[int], block_size: int = 1 << 20) -> List[int]:
+    """Offset just past the first record-ending newline at or after each target.
+
+    A newline ends a record only when an even number of quote characters precede
+    it, so newlines inside quoted fields are never used as split points.
+    """
+    boundaries: List[int] = []
+    pending = list(targets)
+    quotes = 0
+    offset = 0
+    with csv_path.open("rb") as f:
+        while pending:
+            block = f.read(block_size)
+            if not block:
+                break
+            search_from = 0
+            while pending and pending[0] < offset + len(block):
+                pos = block.find(b"\n", max(pending[0] - offset, search_from))
+                counted_to, parity = 0, quotes
+                while pos != -1:
+                    parity += block.count(b'"', counted_to, pos)
+                    counted_to = pos
+                    if parity % 2 == 0:
+                        break
+                    pos = block.find(b"\n", pos + 1)
+                if pos == -1:
+                    break
+                boundary = offset + pos + 1
+                boundaries.append(boundary)
+                while pending and pending[0] < boundary:
+                    pending.pop(0)
+                search_from = pos + 1
+            if pending and pending[0] < offset + len(block):
+                # The record continues past this block; resume from the next one.
+                pending[0] = offset + len(block)
+            quotes += block.count(b'"')
+            offset += len(block)
+    return boundaries
+
+
+def _convert_chunk(csv_path: str, start: int, end: int, fieldnames: List[str], row_name: str,
+                   fragment_path: str) -> int:
+    """Process-pool worker: convert one byte range into an XML fragment of <row>s."""
+    with io.TextIOWrapper(io.BufferedReader(_RangeReader(csv_path, start, end)), encoding="utf-8", newline="") as text, \
+         open(fragment_path, "w", encoding="utf-8", newline="") as xml_file:
+        return _write_rows(csv.DictReader(text, fieldnames=fieldnames), xml_file, row_name, {}, 0)
+
+
+def _sample_types(csv_path: Path, max_samples: int) -> Dict[str, "ColumnType"]:
+    """Column types of the first max_samples rows, inferred exactly as the serial conversion does."""
+    columns: Dict[str, ColumnType] = {}
+    with csv_path.open("r", encoding="utf-8", newline="") as csv_file:
+        for rows_seen, row in enumerate(csv.DictReader(csv_file)):
+            if rows_seen >= max_samples:
+                break
+            _accumulate_types(columns, row)
+    return columns
+
+
+def _convert_parallel(csv_path: Path, xml_path: Path, root_name: str, row_name: str,
+                      max_samples: int, workers: int, progress=None,
+                      output_compression: Optional[str] = None) -> Dict[str, "ColumnType"]:
+    """Convert newline-aligned byte ranges in parallel and concatenate the fragments in order.
+
+    The XSD types come from the first max_samples rows of the file, sampled before
+    splitting, so the output is the same whatever the number of workers.
+    """
+    size = csv_path.stat().st_size
+    header_end = (_record_boundaries(csv_path, [0]) or [size])[0]
+    with csv_path.open("rb") as f:
+        header = f.read(header_end).decode("utf-8")
+    fieldnames = next(csv.reader(io.StringIO(header, newline="")), [])
+
+    parts = max(1, min(workers, (size - header_end) // PARALLEL_MIN_CHUNK))
+    step = (size - header_end) // parts
+    targets = [header_end + step * i for i in range(1, parts)]
+    bounds = [header_end] + [b for b in _record_boundaries(csv_path, targets) if b < size] + [size]
+    bounds = sorted(set(bounds))
+
+    columns = _sample_types(csv_path, max_samples)
+    with tempfile.TemporaryDirectory(prefix="csv2xml-", dir=xml_path.parent) as work_dir:
+        fragments = [os.path.join(work_dir, f"{i:05d}.xml") for i in range(len(bounds) - 1)]
+        with ProcessPoolExecutor(max_workers=min(workers, len(fragments) or 1)) as pool:
+            futures = {
+                pool.submit(_convert_chunk, str(csv_path), start, end, fieldnames, row_name, fragment): end - start
+                for start, end, fragment in zip(bounds, bounds[1:], fragments)
+            }
+            rows_done, bytes_done = 0, header_end
+            try:
+                for future in as_completed(futures):
+                    rows_done += future.result()
+                    bytes_done += futures[future]
+                    if progress:
+                        progress(rows_done, bytes_done)
+            except BaseException:
+                pool.shutdown(wait=True, cancel_futures=True)
+                raise
+
+        with compression.open_output(xml_path, "wb", output_compression) as xml_file:
+            xml_file.write(f"<{root_name}>\n".encode("utf-8"))
+            for fragment in fragments:
+                with open(fragment, "rb") as part:
+                    shutil.copyfileobj(part, xml_file, 1 << 20)
+            xml_file.write(f"</{root_name}>\n".encode("utf-8"))
+    return columns
+
+
+def _accumulate_types(columns: Dict[str, "ColumnType"], row: Dict[str, str]) -> None:
+    """Widen per-column types with one row, as _infer_fields_from_xml does per <row>."""
+    for col, val in row.items():
+        column = columns.get(col)
+        if column is None:
+            column = columns[col] = ColumnType()
+        column.add(val)
 
 
 def generate_xsd_from_xml(xml_path, root_name=None, row_name="row", attr_tag=None, max_samples: int = 200):
@@ -72,70 +331,190 @@ def generate_xsd_from_xml(xml_path, root_name=None, row_name="row", attr_tag=Non
     )
 
 
-def _simple_type(val: str) -> str:
-    if val is None:
-        return "xs:string"
-    v = val.strip()
-    if v == "":
-        return "xs:string"
-    if v.lower() in {"true", "false"}:
-        return "xs:boolean"
-    
-    for fmt in ("%Y-%m-%d", "%Y/%m/%d", "%d/%m/%Y", "%m/%d/%Y", "%Y-%m-%dT%H:%M:%S"):
-        try:
-            datetime.strptime(v, fmt)
-            return "xs:dateTime" if "T" in fmt else "xs:date"
-        except ValueError:
-            pass
+# Same sub-patterns datetime.strptime uses for these directives.
+_Y, _m = r"(\d\d\d\d)", r"(1[0-2]|0[1-9]|[1-9])"
+_d = r"(3[0-1]|[1-2]\d|0[1-9]|[1-9]| [1-9])"
+_H, _M, _S = r"(2[0-3]|[0-1]\d|\d)", r"([0-5]\d|\d)", r"(6[0-1]|[0-5]\d|\d)"
+
+# (strptime format, pattern, xsd type, positions of year/month/day[/hour/minute/second] groups)
+_DATE_FORMATS = (
+    ("%Y-%m-%d", re.compile(f"{_Y}-{_m}-{_d}", re.IGNORECASE), "xs:date", (1, 2, 3)),
+    ("%Y/%m/%d", re.compile(f"{_Y}/{_m}/{_d}", re.IGNORECASE), "xs:date", (1, 2, 3)),
+    ("%d/%m/%Y", re.compile(f"{_d}/{_m}/{_Y}", re.IGNORECASE), "xs:date", (3, 2, 1)),
+    ("%m/%d/%Y", re.compile(f"{_m}/{_d}/{_Y}", re.IGNORECASE), "xs:date", (3, 1, 2)),
+    ("%Y-%m-%dT%H:%M:%S", re.compile(f"{_Y}-{_m}-{_d}T{_H}:{_M}:{_S}", re.IGNORECASE), "xs:dateTime",
+     (1, 2, 3, 4, 5, 6)),
+)
+# The formats recognised as xs:date / xs:dateTime, for parsing such values back (db imports).
+DATE_FORMATS = tuple(entry[0] for entry in _DATE_FORMATS)
+_DEFAULT_DATE_ORDER = tuple(range(len(_DATE_FORMATS)))
+_INT_RE = re.compile(r"[+-]?\d+")
+_DECIMAL_RE = re.compile(r"[+-]?(?:\d+\.\d*|\.\d+|\d+(?=[eE]))(?:[eE][+-]?\d+)?")
+_DATE_CHARS = frozenset("-/")
+
+
+def _classify(v: str, date_order=_DEFAULT_DATE_ORDER) -> Tuple[str, int]:
+    """Classify a stripped, non-empty value; returns (xsd type, matched date format or -1)."""
+    if _INT_RE.fullmatch(v):
+        return "xs:int", -1
+    if _DECIMAL_RE.fullmatch(v):
+        return "xs:decimal", -1
+    lowered = v.lower()
+    if lowered in {"true", "false"}:
+        return "xs:boolean", -1
+
+    if len(v) >= 6 and not _DATE_CHARS.isdisjoint(v):
+        for index in date_order:
+            if _date_matches(v, index):
+                return _DATE_FORMATS[index][2], index
+
+    # Rare spellings (underscores, nan/inf, ...) that int()/float() accept.
     try:
         int(v)
-        return "xs:int"
+        return "xs:int", -1
     except ValueError:
         pass
     try:
         float(v)
-        return "xs:decimal"
+        return "xs:decimal", -1
     except ValueError:
+        return "xs:string", -1
+
+
+def _date_matches(v: str, index: int) -> bool:
+    """Whether v is a valid date in _DATE_FORMATS[index]."""
+    _, pattern, _, positions = _DATE_FORMATS[index]
+    match = pattern.fullmatch(v)
+    if match is None:
+        return False
+    try:
+        datetime(*(int(match.group(p)) for p in positions))
+    except ValueError:
+        return False
+    return True
+
+
+def _simple_type(val: str) -> str:
+    if val is None:
         return "xs:string"
+    v = val.strip()
+    if v == "":
+        return "xs:string"
+    return _classify(v)[0]
+
+
+class ColumnType:
+    """Running XSD type of one column.
+
+    The date format that matched last is tried first for the next value, and
+    values are no longer classified once the column has widened to xs:string.
+    date_format is the format every date value seen so far fits, so 12/25/2021
+    settles 03/04/2021 in the same column as March 4.
+    """
+
+    __slots__ = ("xsd_type", "_date_order", "_date_formats")
+
+    def __init__(self):
+        self.xsd_type = None
+        self._date_order = list(_DEFAULT_DATE_ORDER)
+        # Indexes of the _DATE_FORMATS every date value matched; None before the first one.
+        self._date_formats = None
+
+    @property
+    def date_format(self) -> Optional[str]:
+        """strptime format of the column's dates (the first in DATE_FORMATS if several fit), None if mixed."""
+        if self.xsd_type not in ("xs:date", "xs:dateTime") or not self._date_formats:
+            return None
+        return DATE_FORMATS[min(self._date_formats)]
+
+    def add(self, val: str) -> str:
+        if self.xsd_type == "xs:string":
+            return self.xsd_type
+        v = val.strip() if val else ""
+        if v == "":
+            inferred = "xs:string"
+        else:
+            inferred, date_index = _classify(v, self._date_order)
+            if date_index >= 0:
+                if self._date_order[0] != date_index:
+                    self._date_order.remove(date_index)
+                    self._date_order.insert(0, date_index)
+                candidates = _DEFAULT_DATE_ORDER if self._date_formats is None else self._date_formats
+                self._date_formats = {index for index in candidates if _date_matches(v, index)}
+        self.xsd_type = inferred if self.xsd_type is None else _widen_type(self.xsd_type, inferred)
+        return self.xsd_type
+
+    def add_many(self, values) -> str:
+        for val in values:
+            if self.add(val) == "xs:string":
+                break
+        return self.xsd_type
+
+    def merge(self, other: "ColumnType") -> None:
+        if other.xsd_type is not None:
+            self.xsd_type = other.xsd_type if self.xsd_type is None else _widen_type(self.xsd_type, other.xsd_type)
+        if other._date_formats is not None:
+            self._date_formats = (set(other._date_formats) if self._date_formats is None
+                                  else self._date_formats & other._date_formats)
+
+
+def classify_column(values) -> str:
+    """Widened XSD type of a whole column of values (None if the column is empty)."""
+    return ColumnType().add_many(values)
 
 
 def _detect_root_tag(xml_path: Path) -> str:
-    for _, elem in etree.iterparse(str(xml_path), events=("start",), huge_tree=True):
-        if isinstance(elem.tag, str):
-            return elem.tag
+    with compression.open_input(xml_path) as xml_file:
+        for _, elem in etree.iterparse(xml_file, events=("start",), huge_tree=True):
+            if isinstance(elem.tag, str):
+                return elem.tag
     return "root"
 
 
 def _infer_fields_from_xml(xml_path: Path, row_name="row", max_samples: int = 10000):
-    field_types: Dict[str, str] = {}
+    columns, group_tag, group_attributes = _sample_xml_columns(xml_path, row_name, max_samples)
+    field_types = {tag: column.xsd_type for tag, column in columns.items()}
+    return field_types, group_tag, group_attributes
+
+
+def xml_date_formats(xml_path, row_name="row", max_samples: int = 200) -> Dict[str, str]:
+    """strptime format of each date column, from the same rows generate_xsd_from_xml samples."""
+    columns = _sample_xml_columns(Path(xml_path), row_name, max_samples)[0]
+    return {tag: column.date_format for tag, column in columns.items() if column.date_format}
+
+
+def _sample_xml_columns(xml_path: Path, row_name: str, max_samples: int):
+    columns: Dict[str, ColumnType] = {}
     group_tag = None
     group_attributes = []
     rows_seen = 0
 
-    for _, elem in etree.iterparse(str(xml_path), events=("end",), tag=row_name, huge_tree=True):
-        if group_tag is None:
+    with compression.open_input(xml_path) as xml_file:
+        for _, elem in etree.iterparse(xml_file, events=("end",), tag=row_name, huge_tree=True):
+            if group_tag is None:
+                parent = elem.getparent()
+                if parent is not None and isinstance(parent.tag, str):
+                    group_tag = parent.tag
+                    group_attributes = list(parent.attrib.keys())
+
+            for child in elem:
+                if not isinstance(child.tag, str):
+                    continue
+                column = columns.get(child.tag)
+                if column is None:
+                    column = columns[child.tag] = ColumnType()
+                column.add(child.text)
+
+            rows_seen += 1
+            elem.clear()
             parent = elem.getparent()
-            if parent is not None and isinstance(parent.tag, str):
-                group_tag = parent.tag
-                group_attributes = list(parent.attrib.keys())
-
-        for child in elem:
-            if not isinstance(child.tag, str):
-                continue
-            inferred = _simple_type(child.text or "")
-            current = field_types.get(child.tag)
-            field_types[child.tag] = inferred if current is None else _widen_type(current, inferred)
-
-        rows_seen += 1
-        elem.clear()
-        parent = elem.getparent()
-        if parent is not None:
-            while parent.getprevious() is not None:
-                del parent.getparent()[0]
-        if rows_seen >= max_samples:
-            break
+            if parent is not None:
+                while parent.getprevious() is not None:
+                    del parent.getparent()[0]
+            if rows_seen >= max_samples:
+                break
 
-    return field_types, group_tag, group_attributes
+    return columns, group_tag, group_attributes
 
 
 def _widen_type(existing: str, new: str) -> str:
@@ -212,42 +591,316 @@ def _build_xsd(root_name: str, row_name: str, fields: Dict[str, str], group_tag=
     
 
 def validate_filename(filename: str) -> bool:
-    pattern = r"^(?!\.)([A-Za-z0-9_-]+)\.[A-Za-z0-9_-]+$"
+    # name.ext, optionally followed by a compression suffix (data.xml.gz).
+    pattern = r"^(?!\.)([A-Za-z0-9_-]+)\.[A-Za-z0-9_-]+(\.(gz|zst))?$"
     return bool(re.match(pattern, filename))
 
-def xml_xsd_validator(xml_filename: str, xsd_filename: str) -> Tuple[bool, str]:
-    """Stream-validate an XML file against XSD; returns (ok, message)."""
+class CompiledSchema(NamedTuple):
+    schema: etree.XMLSchema
+    root_tag: Optional[str]
+    row_tag: Optional[str]
+    # Schema whose top-level element is the row element, for per-row validation.
+    row_schema: Optional[etree.XMLSchema]
+
+
+_schema_cache: "OrderedDict[str, Tuple[Tuple[int, int], CompiledSchema]]" = OrderedDict()
+_schema_cache_lock = threading.Lock()
+
+
+def _compile_schema(xsd_path: str) -> CompiledSchema:
+    doc = etree.parse(xsd_path)
+    schema = etree.XMLSchema(doc)
+    schema_root = doc.getroot()
+    top = schema_root.find(f"{XS}element")
+    root_tag = top.get("name") if top is not None else None
+
+    # The row is the innermost element whose sequence holds only typed leaf fields.
+    row_tag = row_schema = None
+    for element in schema_root.iter(f"{XS}element"):
+        if element.getparent() is schema_root:
+            continue
+        fields = element.findall(f"{XS}complexType/{XS}sequence/{XS}element")
+        if fields and all(field.get("type") for field in fields):
+            row_def = copy.deepcopy(element)
+            for occurs in ("minOccurs", "maxOccurs"):
+                row_def.attrib.pop(occurs, None)
+            row_doc = etree.Element(f"{XS}schema", nsmap={"xs": XS[1:-1]})
+            row_doc.attrib.update(schema_root.attrib)
+            row_doc.append(row_def)
+            row_tag, row_schema = element.get("name"), etree.XMLSchema(row_doc)
+            break
+    return CompiledSchema(schema, root_tag, row_tag, row_schema)
+
+
+def load_schema(xsd_path: Union[str, Path]) -> CompiledSchema:
+    """Compiled schema for xsd_path from the process-wide LRU cache."""
+    path = str(Path(xsd_path).resolve())
+    stat = os.stat(path)
+    signature = (stat.st_mtime_ns, stat.st_size)
+    with _schema_cache_lock:
+        cached = _schema_cache.get(path)
+        if cached is not None and cached[0] == signature:
+            _schema_cache.move_to_end(path)
+            return cached[1]
+
+    compiled = _compile_schema(path)
+    with _schema_cache_lock:
+        _schema_cache[path] = (signature, compiled)
+        _schema_cache.move_to_end(path)
+        while len(_schema_cache) > SCHEMA_CACHE_SIZE:
+            _schema_cache.popitem(last=False)
+    return compiled
+
+
+def _validate_path(xml_path: Path, xsd_path: Path, progress=None, max_errors: int = 1) -> List[Tuple[int, str]]:
+    """Validate xml_path and return up to max_errors (line, message) pairs; empty means valid.
+
+    With max_errors == 1 the whole document is stream-validated and validation stops
+    at the first error. With more, each row is validated against the row schema so
+    scanning can go on past an invalid row; the whole-document schema stays attached
+    to the parse, so a document whose rows are all valid gets the same verdict as
+    with max_errors == 1 (root, attributes, element order).
+    """
+    errors: List[Tuple[int, str]] = []
+    try:
+        compiled = load_schema(xsd_path)
+        per_row = max_errors > 1 and compiled.row_schema is not None
+        tag = compiled.row_tag if per_row else None
+
+        with compression.open_input(xml_path) as xml_file:
+            elements = 0
+            context = etree.iterparse(xml_file, events=("end",), tag=tag, schema=compiled.schema, huge_tree=True)
+            try:
+                for _, elem in context:
+                    if per_row and not compiled.row_schema.validate(elem):
+                        for error in compiled.row_schema.error_log:
+                            errors.append((error.line, error.message))
+                        if len(errors) >= max_errors:
+                            return errors[:max_errors]
+                    elem.clear()
+                    parent = elem.getparent()
+                    if parent is not None:
+                        while parent.getprevious() is not None:
+                            del parent.getparent()[0]
+                    elements += 1
+                    if progress and elements % PROGRESS_EVERY == 0:
+                        progress(elements, compression.bytes_read(xml_file))
+            except etree.XMLSyntaxError:
+                # The document schema also reports the invalid rows already listed; its
+                # errors only count when the rows themselves were all valid.
+                schema_only = all(error.domain == etree.ErrorDomains.SCHEMASV for error in context.error_log)
+                if not (per_row and errors and schema_only):
+                    raise
+            if per_row and context.root is not None and context.root.tag != compiled.root_tag:
+                errors.append((context.root.sourceline or 0, f"Root element '{context.root.tag}' is not '{compiled.root_tag}'."))
+    # Only file and schema problems become validation errors; anything else (such as a
+    # cancelled job's progress callback raising) propagates.
+    except (etree.Error, ValueError) + compression.ERRORS as exc:
+        errors.append((getattr(exc, "lineno", None) or 0, f"{type(exc).__name__}: {exc}"))
+    return errors[:max_errors]
+
+
+def _error_message(errors: List[Tuple[int, str]]) -> str:
+    if not errors:
+        return "OK"
+    if len(errors) == 1:
+        return errors[0][1]
+    return "; ".join(f"line {line}: {message}" for line, message in errors)
+
+
+def xml_xsd_validator(xml_filename: str, xsd_filename: str, progress=None, max_errors: int = 1) -> Tuple[bool, str]:
+    """Stream-validate an XML file against XSD; returns (ok, message).
+
+    max_errors > 1 keeps scanning past invalid rows and reports up to that many
+    errors with their line numbers.
+    """
     if not (validate_filename(xml_filename) and validate_filename(xsd_filename)):
         return False, "Invalid filename(s)"
-    
-    xml_path = DATA_DIR / xml_filename
-    xsd_path = DATA_DIR / xsd_filename
 
-    try:
-        schema = etree.XMLSchema(etree.parse(str(xsd_path)))
-
-        for _, elem in etree.iterparse(str(xml_path), events=("end",), schema=schema, huge_tree=True):
-            elem.clear()
-            parent = elem.getparent()
-            if parent is not None:
-                while parent.getprevious() is not None:
-                    del parent.getparent()[0]
-        return True, "OK"
-    except Exception as exc:
-        return False, f"{type(exc).__name__}: {exc}"
+    errors = _validate_path(DATA_DIR / xml_filename, DATA_DIR / xsd_filename, progress, max(1, int(max_errors or 1)))
+    return not errors, _error_message(errors)
 
 
-def group_and_write(xml_path, row_tag="row", attr_tag="City", filter_value=None, output_path=None, root_name="root"):
+def _validate_pair(xml_filename: str, xsd_filename: str, max_errors: int) -> Dict:
+    """Process-pool worker for validate_many."""
+    started = time.perf_counter()
+    if validate_filename(xml_filename) and validate_filename(xsd_filename):
+        errors = _validate_path(DATA_DIR / xml_filename, DATA_DIR / xsd_filename, max_errors=max_errors)
+    else:
+        errors = [(0, "Invalid filename(s)")]
+    return {
+        "xml_file": xml_filename,
+        "xsd_file": xsd_filename,
+        "ok": not errors,
+        "message": _error_message(errors),
+        "errors": [[line, message] for line, message in errors],
+        "elapsed": round(time.perf_counter() - started, 3),
+    }
+
+
+def validate_many(pairs, max_errors: int = 1, fail_fast: bool = False, workers: int = None,
+                  executor: Executor = None) -> List[Dict]:
+    """Validate (xml, xsd) filename pairs concurrently across processes.
+
+    Results come back in input order with per-file timings. With fail_fast, files
+    not yet started when the first invalid one is found are skipped. executor is a
+    long-lived process pool to run on (the rpc-server passes its own, so the
+    workers' compiled-schema caches are reused); without one a pool of workers
+    processes is started for this call.
+    """
+    pairs = [(xml, xsd) for xml, xsd in pairs]
+    max_errors = max(1, int(max_errors or 1))
+    results: List[Optional[Dict]] = [None] * len(pairs)
+    if not pairs:
+        return []
+
+    own_pool = executor is None
+    pool = ProcessPoolExecutor(max_workers=min(workers or os.cpu_count() or 1, len(pairs))) if own_pool else executor
+    futures = {pool.submit(_validate_pair, xml, xsd, max_errors): i for i, (xml, xsd) in enumerate(pairs)}
+    try:
+        for future in as_completed(futures):
+            if future.cancelled():
+                continue
+            result = results[futures[future]] = future.result()
+            if fail_fast and not result["ok"]:
+                for pending in futures:
+                    pending.cancel()
+    finally:
+        for pending in futures:
+            pending.cancel()
+        if own_pool:
+            pool.shutdown(wait=True)
+
+    for i, (xml, xsd) in enumerate(pairs):
+        if results[i] is None:
+            results[i] = {
+                "xml_file": xml,
+                "xsd_file": xsd,
+                "ok": False,
+                "skipped": True,
+                "message": "Skipped after an earlier file failed validation.",
+                "errors": [],
+                "elapsed": 0.0,
+            }
+    return results
+
+
+def group_and_write(xml_path, row_tag="row", attr_tag="City", filter_value=None, output_path=None, root_name="root", engine=None,
+                    progress=None, use_index=True):
     xml_path = Path(xml_path).resolve()
-    xquery_file = Path("group_query.xq").resolve()
 
     out_path = (
         Path(output_path)
         if output_path
         else xml_path.with_name(
-            f"{xml_path.stem}_groupBy_{attr_tag.lower()}_{filter_value or 'all'}.xml"
+            f"{compression.base_name(xml_path).stem}_groupBy_{attr_tag.lower()}_{filter_value or 'all'}.xml"
         )
     )
+
+    engine = engine or GROUP_ENGINE
+    # A filter only needs the matching rows; the sidecar index seeks straight to them.
+    # Byte offsets mean nothing inside a compressed file, so those are always streamed.
+    use_index = use_index and filter_value and not compression.detect(xml_path)
+    index = xml_index.load_index(xml_path, row_tag, attr_tag, progress=progress) if use_index else None
+    if index is not None:
+        ranges = index.row_ranges(attr_tag, filter_value)
+        group_selected(xml_index.read_rows(xml_path, ranges), out_path, attr_tag, filter_value, root_name,
+                       namespaces=index.header["namespaces"], encoding=index.header["encoding"])
+    elif engine == "basex":
+        _group_with_basex(xml_path, out_path, row_tag, attr_tag, filter_value, root_name)
+    elif engine == "native":
+        group_rows(
+            xml_path,
+            out_path,
+            row_tag=row_tag,
+            attr_tag=attr_tag,
+            filter_value=filter_value,
+            root_name=root_name,
+            progress=progress,
+        )
+    else:
+        raise ValueError(f"Unknown grouping engine: {engine}")
+
+    xsd_content = generate_xsd_from_xml(out_path, root_name=root_name, row_name=row_tag, attr_tag=None)
+    write_text_atomic(compression.xsd_path_for(out_path), xsd_content)
+    return out_path
+
+
+def partition_xml_file(xml_path, out_dir, row_tag="row", attr_tag="City", root_name="root", max_open_files=None,
+                       progress=None, compress: Optional[str] = None) -> Dict:
+    """Split xml_path into one grouped XML + XSD per attr_tag value in a single pass.
+
+    Each output equals what group_and_write produces for that filter_value; the XSDs
+    are built from types collected while partitioning rather than by re-reading the
+    outputs. out_dir is replaced as a whole once every file is written, and gets a
+    manifest.json listing the files with their row counts, which is also returned.
+    An existing out_dir is only replaced when it is empty or an earlier partition
+    output (it holds a manifest.json). compress ("gzip"/"zstd") writes the XMLs
+    compressed; XSDs stay plain.
+    """
+    xml_path = Path(xml_path).resolve()
+    out_dir = Path(out_dir)
+    if out_dir.exists() and not (
+        out_dir.is_dir() and ((out_dir / "manifest.json").is_file() or not any(out_dir.iterdir()))
+    ):
+        raise ValueError(f"{out_dir.name} exists and is not a partition output; choose another output_dir.")
+    out_dir.parent.mkdir(parents=True, exist_ok=True)
+    tmp_dir = Path(tempfile.mkdtemp(prefix=f".{out_dir.name}-", suffix=".part", dir=out_dir.parent))
+    tmp_dir.chmod(0o755)  # mkdtemp creates it private; the outputs are shared.
+    types: Dict[str, Dict[str, ColumnType]] = {}
+
+    def sample(partition, row):
+        columns = types.setdefault(partition.value, {})
+        for child in row:
+            if not isinstance(child.tag, str):
+                continue
+            column = columns.get(child.tag)
+            if column is None:
+                column = columns[child.tag] = ColumnType()
+            # Fields with element children are written without their text.
+            nested = any(isinstance(c.tag, str) for c in child)
+            column.add(None if nested else child.text)
+
+    try:
+        partitions = partition_rows(
+            xml_path, tmp_dir, row_tag=row_tag, attr_tag=attr_tag, root_name=root_name,
+            max_open_files=max_open_files, sample=sample, progress=progress, compress=compress,
+        )
+        # Same group handling as generate_xsd_from_xml on a group_and_write output.
+        group_tag = None if "group" in (row_tag.lower(), root_name.lower()) else "Group"
+        files = []
+        for partition in partitions:
+            fields = {tag: column.xsd_type for tag, column in types.get(partition.value, {}).items()}
+            xsd_content = _build_xsd(root_name, row_tag, fields, group_tag=group_tag,
+                                     group_attr_names=[attr_tag] if group_tag else [])
+            xsd_path = compression.xsd_path_for(partition.path)
+            xsd_path.write_text(xsd_content, encoding="utf-8")
+            files.append({
+                "value": partition.value,
+                "xml_file": partition.path.name,
+                "xsd_file": xsd_path.name,
+                "rows": partition.rows,
+            })
+        manifest = {
+            "source": xml_path.name,
+            "attr_tag": attr_tag,
+            "row_tag": row_tag,
+            "rows": sum(entry["rows"] for entry in files),
+            "files": files,
+        }
+        (tmp_dir / "manifest.json").write_text(json.dumps(manifest, indent=2, ensure_ascii=False), encoding="utf-8")
+        shutil.rmtree(out_dir, ignore_errors=True)
+        os.replace(tmp_dir, out_dir)
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    return manifest
+
+
+def _group_with_basex(xml_path: Path, out_path: Path, row_tag, attr_tag, filter_value, root_name) -> None:
+    if compression.detect(xml_path):
+        raise ValueError("The basex engine cannot read compressed XML; use the native engine.")
+    xquery_file = Path("group_query.xq").resolve()
     cmd = [
         "basex",
         f"-bfile={xml_path}",
@@ -266,8 +919,5 @@ def group_and_write(xml_path, row_tag="row", attr_tag="City", filter_value=None,
     if result.returncode != 0:
         raise RuntimeError(f"XQuery failed (exit {result.returncode}): {result.stderr or result.stdout}")
 
-    out_path.write_text(result.stdout, encoding="utf-8")
-
-    xsd_content = generate_xsd_from_xml(out_path, root_name=root_name, row_name=row_tag, attr_tag=None)
-    out_path.with_suffix(".xsd").write_text(xsd_content, encoding="utf-8")
-    return out_path
+    with compression.open_output(out_path, "w") as out_file:
+        out_file.write(result.stdout)
@@ -1,17 +1,50 @@
+import csv
 import os
+import queue
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from decimal import Decimal, DecimalException
 from pathlib import Path
-from typing import List, Dict, Union
-from bson import ObjectId
+from typing import Callable, List, Dict, Optional, Union
+from bson import Decimal128, ObjectId, json_util
 from bson.errors import InvalidId
-from pymongo import MongoClient
+from pymongo import ASCENDING, DESCENDING, MongoClient
 from lxml import etree
 
+import compression
+from converter import DATE_FORMATS, ColumnType, load_schema, write_text_atomic, xml_date_formats, xsd_for_columns
+from rows import RowWriter, csv_row_to_xml, export_projection
+
 MONGO_URI = os.getenv("MONGO_URI", "mongodb://mongo:27017")
 DB_NAME = "testdb"
 DEFAULT_COLLECTION = "Collection"
 BATCH_SIZE = 25000
+# Batches are also closed once their estimated BSON size reaches this many bytes.
+IMPORT_BATCH_BYTES = int(os.getenv("IMPORT_BATCH_BYTES", str(8 * 1024 * 1024)))
+# Concurrent insert_many writers, and parsed batches allowed to wait for them.
+IMPORT_WRITERS = int(os.getenv("IMPORT_WRITERS", "4"))
+IMPORT_QUEUE_DEPTH = int(os.getenv("IMPORT_QUEUE_DEPTH", str(IMPORT_WRITERS * 2)))
+DOCUMENTS_PAGE_SIZE = 50
+MAX_DOCUMENTS_PAGE_SIZE = 1000
+# How xs:decimal fields are stored: "double" (float) or "decimal128" (exact).
+IMPORT_DECIMAL = os.getenv("IMPORT_DECIMAL", "double")
+
+XS = "{http://www.w3.org/2001/XMLSchema}"
+# BSON stores signed 64-bit integers; larger xs:int values are kept as strings.
+_INT64_MIN, _INT64_MAX = -2**63, 2**63 - 1
+# Server-side time limit for find/aggregate queries.
+QUERY_TIMEOUT_MS = int(os.getenv("QUERY_TIMEOUT_MS", "30000"))
+# Operators that run server-side JavaScript or write elsewhere are refused in user queries.
+FORBIDDEN_OPERATORS = {"$where", "$function", "$accumulator", "$out", "$merge"}
+GROUP_OPERATORS = {"count", "sum", "avg", "min", "max"}
+# Documents fetched per cursor round trip when exporting.
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "5000"))
+# Shared by every RPC worker thread; keep it at least as large as RPC_THREADS.
+MONGO_POOL_SIZE = int(os.getenv("MONGO_POOL_SIZE", "32"))
 
-client = MongoClient(MONGO_URI)
+client = MongoClient(MONGO_URI, maxPoolSize=MONGO_POOL_SIZE)
 db = client[DB_NAME]
 
 
@@ -21,59 +54,444 @@ def _collection(name: str = None):
 
 def _detect_row_tag(source) -> str:
     """Detect the row tag; if wrapped in <Group>, return the child row tag instead."""
-    source_path = str(source)
     row_tag = None
 
     # Might be a subXML
-    for _, elem in etree.iterparse(source_path, events=("start",), huge_tree=True):
-        if elem.getparent() is not None and isinstance(elem.tag, str):
-            row_tag = elem.tag
-            break
+    with compression.open_input(source) as source_file:
+        for _, elem in etree.iterparse(source_file, events=("start",), huge_tree=True):
+            if elem.getparent() is not None and isinstance(elem.tag, str):
+                row_tag = elem.tag
+                break
 
     # If it is Grouped
     if row_tag == "Group":
-        for _, group in etree.iterparse(source_path, events=("end",), tag="Group", huge_tree=True):
-            for child in group.iterchildren():
-                if isinstance(child.tag, str):
-                    row_tag = child.tag
-                    break
-            break
+        with compression.open_input(source) as source_file:
+            for _, group in etree.iterparse(source_file, events=("end",), tag="Group", huge_tree=True):
+                for child in group.iterchildren():
+                    if isinstance(child.tag, str):
+                        row_tag = child.tag
+                        break
+                break
 
     if not row_tag:
         raise ValueError("Unable to detect row tag in XML.")
     return row_tag
 
 
-def insert_xml_file(xml_path: Union[str, Path], collection: str = None) -> List[str]:
+def _bson_size(doc: Dict) -> int:
+    """Rough BSON size of a flat document (header, _id, per-field overhead)."""
+    return 22 + sum(
+        len(key) + (len(value) if isinstance(value, str) else 8) + 7
+        for key, value in doc.items()
+        if key != "_id"
+    )
+
+
+def _text(value: Optional[str]):
+    return value or ""
+
+
+def _typed(parse: Callable) -> Callable:
+    """Wrap a parser so empty values become None and unparsable ones stay strings."""
+    def convert(value: Optional[str]):
+        if value is None:
+            return None
+        stripped = value.strip()
+        if not stripped:
+            return None
+        try:
+            return parse(stripped)
+        except (ValueError, DecimalException):
+            return value
+    return convert
+
+
+def _parse_datetime(value: str) -> datetime:
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        pass
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+    raise ValueError(f"Unrecognised date: {value}")
+
+
+def _date_converter(fmt: Optional[str]) -> Callable:
+    """Converter for a date column: only fmt, the format detected for it, or every known one if None."""
+    if fmt is None:
+        return _XSD_CONVERTERS["xs:date"]
+    return _typed(lambda value: datetime.strptime(value, fmt))
+
+
+def _parse_int64(value: str) -> int:
+    number = int(value)
+    if not _INT64_MIN <= number <= _INT64_MAX:
+        raise ValueError(f"Integer out of the 64-bit range: {value}")
+    return number
+
+
+def _parse_bool(value: str) -> bool:
+    lowered = value.lower()
+    if lowered in ("true", "1"):
+        return True
+    if lowered in ("false", "0"):
+        return False
+    raise ValueError(f"Not a boolean: {value}")
+
+
+_XSD_CONVERTERS = {
+    "xs:int": _typed(_parse_int64),
+    "xs:integer": _typed(_parse_int64),
+    "xs:long": _typed(_parse_int64),
+    "xs:decimal": _typed(lambda v: Decimal128(Decimal(v)) if IMPORT_DECIMAL == "decimal128" else float(v)),
+    "xs:double": _typed(float),
+    "xs:float": _typed(float),
+    "xs:date": _typed(_parse_datetime),
+    "xs:dateTime": _typed(_parse_datetime),
+    "xs:boolean": _typed(_parse_bool),
+}
+
+
+def field_converters(xsd_path: Union[str, Path], date_formats: Dict[str, str] = None) -> Dict[str, Callable]:
+    """Map each typed leaf element declared in the XSD to its BSON value converter.
+
+    Date fields listed in date_formats (see converter.xml_date_formats) are parsed
+    with that format only. Returns an empty table (everything stored as strings)
+    if the XSD is missing.
+    """
+    date_formats = date_formats or {}
+    xsd_path = Path(xsd_path)
+    if not xsd_path.is_file():
+        return {}
+    converters: Dict[str, Callable] = {}
+    for element in etree.parse(str(xsd_path)).iter(f"{XS}element"):
+        name, xsd_type = element.get("name"), element.get("type")
+        convert = _XSD_CONVERTERS.get(xsd_type)
+        if xsd_type in ("xs:date", "xs:dateTime") and name in date_formats:
+            convert = _date_converter(date_formats[name])
+        if name and convert is not None:
+            converters[name] = convert
+    return converters
+
+
+class _InsertPipeline:
+    """Writer threads running unordered insert_many on batches taken from a bounded queue.
+
+    submit() blocks while the queue is full, so parsing slows down to Mongo's pace.
+    """
+
+    def __init__(self, coll, writers: int = IMPORT_WRITERS, depth: int = IMPORT_QUEUE_DEPTH):
+        self._coll = coll
+        self._queue = queue.Queue(maxsize=max(1, depth))
+        self._lock = threading.Lock()
+        self.inserted = 0
+        self.batches = 0
+        self.error = None
+        self._threads = [
+            threading.Thread(target=self._write, name=f"import-writer-{i}", daemon=True)
+            for i in range(max(1, writers))
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def _write(self):
+        while True:
+            batch = self._queue.get()
+            if batch is None:
+                return
+            if self.error is not None:
+                continue
+            try:
+                self._coll.insert_many(batch, ordered=False)
+            except Exception as exc:
+                self.error = exc
+                continue
+            with self._lock:
+                self.inserted += len(batch)
+                self.batches += 1
+
+    def submit(self, batch: List[Dict]) -> None:
+        if self.error is not None:
+            raise self.error
+        self._queue.put(batch)
+
+    def close(self, raise_errors: bool = True) -> None:
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+        if raise_errors and self.error is not None:
+            raise self.error
+
+
+def insert_xml_file(xml_path: Union[str, Path], collection: str = None, progress=None, include_ids: bool = False,
+                    typed: bool = True) -> Dict:
+    """Insert XML rows through the writer pipeline and return an import summary.
+
+    With typed, fields declared in the sibling .xsd are stored as native ints,
+    doubles (or Decimal128), dates and booleans instead of strings.
+
+    The summary carries count, batches, elapsed seconds, rows/sec and the first and
+    last inserted id; every id is only included with include_ids (otherwise page
+    through them with list_inserted_ids). progress, if given, is called as
+    progress(rows, bytes_read) per batch.
+    """
     xml_path = str(xml_path)
     row_tag = _detect_row_tag(xml_path)
+    converters = field_converters(compression.xsd_path_for(xml_path), xml_date_formats(xml_path, row_tag)) if typed else {}
+    return _import_rows(xml_path, _collection(collection), row_tag, converters, progress, include_ids)
+
 
+def import_xml_validated(xml_path: Union[str, Path], xsd_path: Union[str, Path] = None, collection: str = None,
+                         progress=None, on_error: str = "rollback", typed: bool = True) -> Dict:
+    """Validate and import an XML file in one streaming pass.
+
+    The schema is attached to the parse that builds the insert batches, and the row
+    tag comes from the XSD. Every document is tagged with the import's _import_id
+    while it runs; if validation fails, the documents already inserted are deleted
+    (on_error="rollback") or moved, still tagged, to "<collection>_quarantine"
+    (on_error="quarantine"). A successful import removes the tag again. Those
+    clean-ups select by _id from the import's start onwards, so they walk the _id
+    index instead of scanning the collection.
+    """
+    if on_error not in ("rollback", "quarantine"):
+        raise ValueError(f"Unknown on_error mode: {on_error}")
+    xml_path = str(xml_path)
+    xsd_path = Path(xsd_path) if xsd_path else compression.xsd_path_for(xml_path)
+    compiled = load_schema(xsd_path)
+    row_tag = compiled.row_tag or _detect_row_tag(xml_path)
+    converters = field_converters(xsd_path, xml_date_formats(xml_path, row_tag)) if typed else {}
     coll = _collection(collection)
+    import_id = uuid.uuid4().hex
+    # Every id _import_rows assigns is at least this one (ObjectIds start with their creation time).
+    imported = {"_id": {"$gte": ObjectId.from_datetime(datetime.now(timezone.utc))}, "_import_id": import_id}
+
+    try:
+        summary = _import_rows(xml_path, coll, row_tag, converters, progress, schema=compiled.schema, import_id=import_id)
+    except _SchemaViolation as exc:
+        summary = {"status": "invalid", "import_id": import_id, "message": str(exc)}
+        if on_error == "quarantine":
+            quarantine = coll.database[f"{coll.name}_quarantine"]
+            coll.aggregate([{"$match": imported}, {"$merge": {"into": quarantine.name}}])
+            summary["quarantine_collection"] = quarantine.name
+        summary[f"{on_error}_count"] = coll.delete_many(imported).deleted_count
+        return summary
+    except BaseException:
+        # Cancelled or failed midway: don't leave a partial import behind.
+        coll.delete_many(imported)
+        raise
+
+    coll.update_many(imported, {"$unset": {"_import_id": ""}})
+    summary.update({"status": "ok", "import_id": import_id})
+    return summary
+
+
+class _SchemaViolation(Exception):
+    """The XML being imported does not match its XSD."""
+
+
+def _import_rows(xml_path: str, coll, row_tag: str, converters: Dict[str, Callable], progress=None,
+                 include_ids: bool = False, schema=None, import_id: str = None) -> Dict:
+    convert_field = converters.get
+    pipeline = _InsertPipeline(coll)
     batch: List[Dict] = []
+    batch_bytes = 0
+    first_id = last_id = None
     inserted_ids: List[str] = []
+    started = time.perf_counter()
+
+    try:
+        with compression.open_input(xml_path) as source:
+            context = etree.iterparse(source, events=("end",), tag=row_tag, schema=schema, huge_tree=True)
+            try:
+                for _, elem in context:
+                    # libxml2 logs schema errors as soon as it reaches them; stop there.
+                    if schema is not None and context.error_log:
+                        raise _SchemaViolation(context.error_log[0].message)
+                    doc = {child.tag: convert_field(child.tag, _text)(child.text) for child in elem.iterchildren()}
+                    # Ids are assigned here so they follow document order whatever batch lands first.
+                    doc["_id"] = last_id = ObjectId()
+                    if import_id:
+                        doc["_import_id"] = import_id
+                    if first_id is None:
+                        first_id = last_id
+                    if include_ids:
+                        inserted_ids.append(str(last_id))
+                    batch.append(doc)
+                    batch_bytes += _bson_size(doc)
+
+                    if len(batch) >= BATCH_SIZE or batch_bytes >= IMPORT_BATCH_BYTES:
+                        pipeline.submit(batch)
+                        batch, batch_bytes = [], 0
+                        if progress:
+                            progress(pipeline.inserted, compression.bytes_read(source))
+
+                    elem.clear()
+                    parent = elem.getparent()
+                    if parent is not None:
+                        while parent.getprevious() is not None: # Need for multiple Group
+                            del parent.getparent()[0]
+            except etree.XMLSyntaxError as exc:
+                if schema is None:
+                    raise
+                raise _SchemaViolation(f"{type(exc).__name__}: {exc}") from exc
+
+        if batch:
+            pipeline.submit(batch)
+    except BaseException:
+        pipeline.close(raise_errors=False)
+        raise
+    pipeline.close()
+    if progress:
+        progress(pipeline.inserted, os.path.getsize(xml_path))
+    return _summary(pipeline, started, first_id, last_id, inserted_ids if include_ids else None)
+
+
+def _summary(pipeline: _InsertPipeline, started: float, first_id, last_id, ids: List[str] = None) -> Dict:
+    elapsed = time.perf_counter() - started
+    summary = {
+        "count": pipeline.inserted,
+        "batches": pipeline.batches,
+        "elapsed": round(elapsed, 3),
+        "rows_per_sec": round(pipeline.inserted / elapsed, 1) if elapsed > 0 else 0.0,
+        "first_id": str(first_id) if first_id else None,
+        "last_id": str(last_id) if last_id else None,
+    }
+    if ids is not None:
+        summary["ids"] = ids
+    return summary
+
+
+def import_csv_file(csv_path: Union[str, Path], collection: str = None, progress=None, typed: bool = True,
+                    xml_path: Union[str, Path] = None, root_name: str = "root", row_name: str = "row",
+                    max_samples: int = 200) -> Dict:
+    """Stream CSV rows straight into Mongo without an intermediate XML file.
 
-    context = etree.iterparse(xml_path, events=("end",), tag=row_tag)
-    for _, elem in context:
-        doc = {child.tag: (child.text or "") for child in elem.iterchildren()}
+    Column types are inferred from the first max_samples rows exactly as for the
+    generated XSD (those rows are held back until the types are known) and values
+    are stored natively. With xml_path, the XML and XSD artifacts are written in
+    the same pass.
+    """
+    csv_path = Path(csv_path)
+    columns: Dict[str, ColumnType] = {}
+    converters = None
+    held: List[Dict] = []
+    rows_seen = 0
+
+    pipeline = _InsertPipeline(_collection(collection))
+    batch: List[Dict] = []
+    batch_bytes = 0
+    first_id = last_id = None
+    started = time.perf_counter()
+
+    def add(row: Dict, source) -> None:
+        nonlocal batch, batch_bytes, first_id, last_id
+        doc = {col: converters.get(col, _text)(val) for col, val in row.items()}
+        doc["_id"] = last_id = ObjectId()
+        if first_id is None:
+            first_id = last_id
         batch.append(doc)
+        batch_bytes += _bson_size(doc)
+        if len(batch) >= BATCH_SIZE or batch_bytes >= IMPORT_BATCH_BYTES:
+            pipeline.submit(batch)
+            batch, batch_bytes = [], 0
+            if progress:
+                progress(pipeline.inserted, compression.bytes_read(source))
 
-        if len(batch) >= BATCH_SIZE:
-            result = coll.insert_many(batch, ordered=False)
-            inserted_ids.extend(str(_id) for _id in result.inserted_ids)
-            batch.clear()
+    def build_converters() -> Dict[str, Callable]:
+        if not typed:
+            return {}
+        return {
+            col: _date_converter(column.date_format) if column.xsd_type in ("xs:date", "xs:dateTime")
+            else _XSD_CONVERTERS[column.xsd_type]
+            for col, column in columns.items() if column.xsd_type in _XSD_CONVERTERS
+        }
 
-        elem.clear()
-        parent = elem.getparent()
-        if parent is not None:
-            while parent.getprevious() is not None: # Need for multiple Group
-                del parent.getparent()[0]
+    tmp_path = Path(f"{xml_path}.part") if xml_path else None
+    try:
+        with compression.open_input(csv_path, "rt", newline="") as csv_file:
+            xml_file = None
+            if tmp_path:
+                xml_file = compression.open_output(tmp_path, "w", compression.from_suffix(xml_path), newline="")
+            try:
+                if xml_file:
+                    xml_file.write(f"<{root_name}>\n")
+                reader = csv.DictReader(csv_file)
+                for row in reader:
+                    if None in row:
+                        raise ValueError(f"Invalid CSV file: {csv_path}: line {reader.line_num} has more fields "
+                                         "than the header")
+                    if xml_file:
+                        xml_file.write(csv_row_to_xml(row, row_name))
+                    if rows_seen < max_samples:
+                        for col, val in row.items():
+                            columns.setdefault(col, ColumnType()).add(val)
+                    rows_seen += 1
 
-    if batch:
-        result = coll.insert_many(batch, ordered=False)
-        inserted_ids.extend(str(_id) for _id in result.inserted_ids)
+                    if converters is None:
+                        held.append(row)
+                        if len(held) < max_samples:
+                            continue
+                        converters = build_converters()
+                        for held_row in held:
+                            add(held_row, csv_file.buffer)
+                        held = []
+                        continue
+                    add(row, csv_file.buffer)
 
-    return inserted_ids
+                if converters is None:
+                    converters = build_converters()
+                    for held_row in held:
+                        add(held_row, csv_file.buffer)
+                if xml_file:
+                    xml_file.write(f"</{root_name}>\n")
+            finally:
+                if xml_file:
+                    xml_file.close()
+        if batch:
+            pipeline.submit(batch)
+    except (csv.Error, UnicodeDecodeError) as exc:
+        pipeline.close(raise_errors=False)
+        if tmp_path:
+            tmp_path.unlink(missing_ok=True)
+        raise ValueError(f"Invalid CSV file: {csv_path}") from exc
+    except BaseException:
+        pipeline.close(raise_errors=False)
+        if tmp_path:
+            tmp_path.unlink(missing_ok=True)
+        raise
+    pipeline.close()
+    if progress:
+        progress(pipeline.inserted, csv_path.stat().st_size)
 
+    summary = _summary(pipeline, started, first_id, last_id)
+    if xml_path:
+        xml_path = Path(xml_path)
+        os.replace(tmp_path, xml_path)
+        xsd_path = compression.xsd_path_for(xml_path)
+        write_text_atomic(xsd_path, xsd_for_columns(root_name, row_name, columns))
+        summary.update({"xml_file": xml_path.name, "xsd_file": xsd_path.name})
+    return summary
+
+
+def list_inserted_ids(first_id: str, last_id: str, collection: str = None, after: str = None, limit: int = 1000) -> Dict:
+    """Page through the ids of one import, between its summary's first_id and last_id.
+
+    insert_xml_file assigns increasing ObjectIds in document order, so the range holds
+    the import's documents (plus any inserted concurrently into the same collection).
+    """
+    coll = _collection(collection)
+    try:
+        query = {"_id": {"$gte": ObjectId(first_id), "$lte": ObjectId(last_id)}}
+        if after:
+            query["_id"]["$gt"] = ObjectId(after)
+    except InvalidId:
+        raise ValueError("Invalid document id.")
+    ids = [str(doc["_id"]) for doc in coll.find(query, {"_id": 1}).sort("_id", 1).limit(limit)]
+    return {"ids": ids, "next_after": ids[-1] if len(ids) == limit else None}
 
 
 def get_document(doc_id: str, collection: str = None):
@@ -84,10 +502,259 @@ def get_document(doc_id: str, collection: str = None):
         return None
     if not doc:
         return None
-    doc["_id"] = str(doc["_id"])
-    return doc
+    return _plain(doc)
+
+
+def get_documents(ids: List[str], collection: str = None, fields: List[str] = None) -> Dict:
+    """Fetch many documents with one $in query, in the order of ids.
+
+    Unknown or malformed ids are reported under missing instead of failing the batch.
+    """
+    ids = list(dict.fromkeys(ids or []))
+    if len(ids) > MAX_DOCUMENTS_PAGE_SIZE:
+        raise ValueError(f"At most {MAX_DOCUMENTS_PAGE_SIZE} ids per call.")
+    object_ids = []
+    for doc_id in ids:
+        try:
+            object_ids.append(ObjectId(doc_id))
+        except (InvalidId, TypeError):
+            pass
+    projection = {field: 1 for field in fields} if fields else None
+    found = {}
+    if object_ids:
+        for doc in _collection(collection).find({"_id": {"$in": object_ids}}, projection):
+            found[str(doc["_id"])] = _plain(doc)
+    return {
+        "documents": [found[doc_id] for doc_id in ids if doc_id in found],
+        "missing": [doc_id for doc_id in ids if doc_id not in found],
+    }
+
+
+def _plain(value):
+    """BSON values as XML-RPC/JSON friendly ones: ids and decimals as strings, dates in ISO format."""
+    if isinstance(value, dict):
+        return {key: _plain(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_plain(item) for item in value]
+    if isinstance(value, (ObjectId, Decimal128)):
+        return str(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    # XML-RPC ints are limited to 32 bits.
+    if isinstance(value, int) and not isinstance(value, bool) and not -2**31 <= value < 2**31:
+        return float(value)
+    return value
+
+
+def _parse_query(value, what: str = "filter") -> Dict:
+    """A filter given as a dict or as (extended) JSON text, e.g. {"Year": {"$gte": 2000}}."""
+    if not value:
+        return {}
+    if isinstance(value, str):
+        try:
+            value = json_util.loads(value)
+        except ValueError as exc:
+            raise ValueError(f"Invalid {what} JSON: {exc}")
+    if not isinstance(value, dict):
+        raise ValueError(f"The {what} must be a JSON object.")
+    _check_operators(value)
+    return value
+
+
+def _check_operators(value) -> None:
+    if isinstance(value, dict):
+        for key, item in value.items():
+            if key in FORBIDDEN_OPERATORS:
+                raise ValueError(f"Operator {key} is not allowed.")
+            _check_operators(item)
+    elif isinstance(value, list):
+        for item in value:
+            _check_operators(item)
+
+
+def _page_size(limit) -> int:
+    return max(1, min(int(limit or DOCUMENTS_PAGE_SIZE), MAX_DOCUMENTS_PAGE_SIZE))
+
+
+def find_documents(collection: str = None, filter=None, fields: List[str] = None, sort: str = None,
+                   after: str = None, limit: int = DOCUMENTS_PAGE_SIZE) -> Dict:
+    """One page of documents matching filter, keyset-paginated.
+
+    fields limits the returned fields (_id is always included). sort is a field
+    name, prefixed with "-" for descending; pages follow (sort field, _id) so they
+    stay stable and can use an index on the sort field. Pass the returned
+    next_after back as after for the following page.
+    """
+    coll = _collection(collection)
+    query = _parse_query(filter)
+    limit = _page_size(limit)
+    sort_field, direction = (sort[1:], DESCENDING) if sort and sort.startswith("-") else (sort, ASCENDING)
+
+    if after:
+        try:
+            last_value, last_id = json_util.loads(after)
+            last_id = ObjectId(last_id)
+        except (ValueError, TypeError, InvalidId):
+            raise ValueError("Invalid after token.")
+        op = "$gt" if direction == ASCENDING else "$lt"
+        if sort_field:
+            position = {"$or": _after_position(sort_field, direction, op, last_value, last_id)}
+        else:
+            position = {"_id": {op: last_id}}
+        query = {"$and": [query, position]} if query else position
+
+    order = [(sort_field, direction), ("_id", direction)] if sort_field else [("_id", direction)]
+    projection = None
+    if fields:
+        # The sort field is needed for the next page's token even when it is not asked for.
+        projection = {field: 1 for field in fields + ([sort_field] if sort_field else [])}
+    cursor = coll.find(query, projection).sort(order).limit(limit).max_time_ms(QUERY_TIMEOUT_MS)
+    docs = list(cursor)
+
+    next_after = None
+    if len(docs) == limit:
+        last = docs[-1]
+        next_after = json_util.dumps([last.get(sort_field) if sort_field else None, str(last["_id"])])
+    if fields and sort_field and sort_field not in fields:
+        for doc in docs:
+            doc.pop(sort_field, None)
+    return {"documents": [_plain(doc) for doc in docs], "next_after": next_after}
+
+
+def _after_position(sort_field: str, direction: int, op: str, last_value, last_id: ObjectId) -> List[Dict]:
+    """$or branches selecting what sorts after (last_value, last_id).
+
+    Mongo sorts null and missing fields before every other value, but $gt/$lt never
+    match them, so they get explicit branches: with {field: null} they are next
+    ascending after a null, and the tail of every descending listing.
+    """
+    if last_value is None:
+        branches = [{sort_field: None, "_id": {op: last_id}}]
+        if direction == ASCENDING:
+            branches.append({sort_field: {"$ne": None}})
+        return branches
+    branches = [
+        {sort_field: {op: last_value}},
+        {sort_field: last_value, "_id": {op: last_id}},
+    ]
+    if direction == DESCENDING:
+        branches.append({sort_field: None})
+    return branches
+
+
+def aggregate_documents(collection: str = None, group_by: List[str] = None, metrics: List[str] = None, filter=None,
+                        sort: str = None, limit: int = MAX_DOCUMENTS_PAGE_SIZE) -> Dict:
+    """Run a $match + $group pipeline in MongoDB.
+
+    metrics are "count" or "<op>:<field>" with op one of sum/avg/min/max, e.g.
+    ["count", "avg:AvgTemperature"]; each becomes a result column named count or
+    <op>_<field>. sort is a result column, "-" prefixed for descending.
+    """
+    group_by = list(group_by or [])
+    metrics = list(metrics or ["count"])
+    group: Dict = {"_id": {key: f"${key}" for key in group_by} if group_by else None}
+    for metric in metrics:
+        op, _, field = metric.partition(":")
+        if op not in GROUP_OPERATORS or (op == "count") == bool(field):
+            raise ValueError(f"Invalid metric: {metric}")
+        if op == "count":
+            group["count"] = {"$sum": 1}
+        else:
+            group[f"{op}_{field}"] = {f"${op}": f"${field}"}
+
+    pipeline = []
+    query = _parse_query(filter)
+    if query:
+        pipeline.append({"$match": query})
+    pipeline.append({"$group": group})
+    if sort:
+        name, direction = (sort[1:], DESCENDING) if sort.startswith("-") else (sort, ASCENDING)
+        pipeline.append({"$sort": {name if name in group else f"_id.{name}": direction}})
+    pipeline.append({"$limit": _page_size(limit)})
+
+    coll = _collection(collection)
+    rows = []
+    for doc in coll.aggregate(pipeline, allowDiskUse=True, maxTimeMS=QUERY_TIMEOUT_MS):
+        key = doc.pop("_id") or {}
+        rows.append(_plain({**key, **doc}))
+    return {"group_by": group_by, "rows": rows}
+
+
+def export_collection(out_path: Union[str, Path], collection: str = None, fmt: str = "csv", fields: List[str] = None,
+                      root_name: str = "root", row_name: str = "row", include_ids: bool = False,
+                      compress: Union[bool, str] = False, progress=None) -> Dict:
+    """Write a collection to a CSV or <root><row> XML file in _id order, streaming from a cursor.
+
+    Rows are formatted by rows.RowWriter, as for the REST API's streaming export, which
+    rejects invalid XML names. compress writes gzip (True or "gzip") or "zstd"; without
+    it, an out_path ending in .gz/.zst picks the compression. The file is written to a
+    temporary sibling and only replaces out_path once complete.
+    """
+    out_path = Path(out_path)
+    projection = export_projection(fields, include_ids)
+    cursor = _collection(collection).find({}, projection, batch_size=EXPORT_BATCH_SIZE).sort("_id", 1)
+
+    tmp_path = out_path.with_name(f"{out_path.name}.part")
+    codec = compression.normalize(compress) or compression.from_suffix(out_path)
+    try:
+        with compression.open_output(tmp_path, "w", codec, newline="") as out:
+            writer = RowWriter(out, fmt, fields, root_name, row_name, include_ids)
+            writer.begin()
+            for doc in cursor:
+                writer.write(doc)
+                if progress and writer.rows % BATCH_SIZE == 0:
+                    progress(writer.rows, 0)
+            writer.end()
+        os.replace(tmp_path, out_path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+    finally:
+        cursor.close()
+    if progress:
+        progress(writer.rows, 0)
+    return {"file": out_path.name, "rows": writer.rows, "bytes": float(out_path.stat().st_size)}
+
+
+def create_index(collection: str = None, fields: List[str] = None, unique: bool = False) -> str:
+    """Create an index on fields ("-" prefix for descending); returns its name."""
+    if not fields:
+        raise ValueError("At least one field is required.")
+    keys = [(field[1:], DESCENDING) if field.startswith("-") else (field, ASCENDING) for field in fields]
+    return _collection(collection).create_index(keys, unique=bool(unique))
+
+
+def list_indexes(collection: str = None) -> List[Dict]:
+    return [
+        {"name": index["name"], "keys": [[field, direction] for field, direction in index["key"].items()],
+         "unique": bool(index.get("unique", False))}
+        for index in _collection(collection).list_indexes()
+    ]
+
+
+def drop_index(collection: str = None, name: str = None) -> None:
+    if not name or name == "_id_":
+        raise ValueError("A secondary index name is required.")
+    _collection(collection).drop_index(name)
+
 
+def list_documents(collection: str = None, after: str = None, limit: int = DOCUMENTS_PAGE_SIZE, with_total: bool = False):
+    """One page of document ids, newest first, keyset-paginated on _id.
 
-def list_documents(collection: str = None):
+    Pass the returned next_after as after to get the following page; total is
+    the collection's estimated_document_count when with_total is set.
+    """
     coll = _collection(collection)
-    return [str(doc["_id"]) for doc in coll.find().sort("_id", -1)]
+    limit = _page_size(limit)
+    query = {}
+    if after:
+        try:
+            query["_id"] = {"$lt": ObjectId(after)}
+        except InvalidId:
+            raise ValueError("Invalid document id.")
+    ids = [str(doc["_id"]) for doc in coll.find(query, {"_id": 1}).sort("_id", -1).limit(limit)]
+    return {
+        "documents": ids,
+        "next_after": ids[-1] if len(ids) == limit else None,
+        "total": coll.estimated_document_count() if with_total else None,
+    }
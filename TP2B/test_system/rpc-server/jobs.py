@@ -0,0 +1,122 @@
+import os
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+# Seconds a finished job (and its result) is kept before it is purged.
+JOB_RESULT_TTL = int(os.getenv("JOB_RESULT_TTL", "3600"))
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+
+
+class JobCancelled(Exception):
+    """Raised from a progress callback once cancellation was requested."""
+
+
+class Job:
+    def __init__(self, job_id: str, operation: str, total_bytes: int = 0):
+        self.id = job_id
+        self.operation = operation
+        self.status = QUEUED
+        self.total_bytes = total_bytes
+        self.rows = 0
+        self.bytes_read = 0
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.cancel_requested = False
+        self.future = None
+
+    def report(self, rows: int, bytes_read: int = 0) -> None:
+        """Progress callback handed to the running operation."""
+        if self.cancel_requested:
+            raise JobCancelled(f"Job {self.id} cancelled")
+        self.rows = rows
+        self.bytes_read = bytes_read
+
+    def to_dict(self) -> Dict:
+        end = self.finished_at or time.time()
+        elapsed = end - self.started_at if self.started_at else 0.0
+        rows_per_sec = self.rows / elapsed if elapsed > 0 else 0.0
+        eta = None
+        if self.status == RUNNING and self.bytes_read and self.total_bytes:
+            eta = (self.total_bytes - self.bytes_read) * elapsed / self.bytes_read
+        # Byte counts go out as floats: XML-RPC ints are limited to 32 bits.
+        return {
+            "id": self.id,
+            "operation": self.operation,
+            "status": self.status,
+            "rows": self.rows,
+            "bytes_read": float(self.bytes_read),
+            "total_bytes": float(self.total_bytes),
+            "rows_per_sec": round(rows_per_sec, 1),
+            "elapsed": round(elapsed, 3),
+            "eta": None if eta is None else round(eta, 1),
+            "result": self.result,
+            "error": self.error,
+        }
+
+
+class JobManager:
+    """Runs operations in a worker pool and keeps their state until the TTL expires."""
+
+    def __init__(self, workers: int = JOB_WORKERS, ttl: int = JOB_RESULT_TTL):
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job")
+        self._ttl = ttl
+        self._jobs: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, operation: str, func: Callable[[Callable], object], total_bytes: int = 0) -> str:
+        """Queue func(progress) and return the job id."""
+        self._purge()
+        job = Job(uuid.uuid4().hex, operation, total_bytes)
+        with self._lock:
+            self._jobs[job.id] = job
+        job.future = self._pool.submit(self._run, job, func)
+        return job.id
+
+    def _run(self, job: Job, func: Callable) -> None:
+        if job.cancel_requested:
+            job.status, job.finished_at = CANCELLED, time.time()
+            return
+        job.status, job.started_at = RUNNING, time.time()
+        try:
+            job.result = func(job.report)
+            job.status = DONE
+        except JobCancelled:
+            job.status = CANCELLED
+        except Exception as exc:
+            traceback.print_exc()
+            job.status, job.error = FAILED, f"{type(exc).__name__}: {exc}"
+        finally:
+            job.finished_at = time.time()
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        self._purge()
+        job = self._jobs.get(job_id)
+        return job.to_dict() if job else None
+
+    def cancel(self, job_id: str) -> bool:
+        job = self._jobs.get(job_id)
+        if job is None or job.status in (DONE, FAILED, CANCELLED):
+            return False
+        job.cancel_requested = True
+        if job.future is not None and job.future.cancel():
+            job.status, job.finished_at = CANCELLED, time.time()
+        return True
+
+    def _purge(self) -> None:
+        cutoff = time.time() - self._ttl
+        with self._lock:
+            expired = [jid for jid, job in self._jobs.items() if job.finished_at and job.finished_at < cutoff]
+            for jid in expired:
+                del self._jobs[jid]
+
+
+jobs = JobManager()
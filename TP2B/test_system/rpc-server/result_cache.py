@@ -0,0 +1,219 @@
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Union
+
+DATA_DIR = Path(os.getenv("DATA_DIR", "/data/shared"))
+# Cached outputs and the manifest live on the shared volume so they survive restarts.
+RESULT_CACHE_DIR = Path(os.getenv("RESULT_CACHE_DIR") or DATA_DIR / ".result-cache")
+# Total bytes of cached outputs (0 disables the cache) and maximum number of entries.
+RESULT_CACHE_MAX_BYTES = int(os.getenv("RESULT_CACHE_MAX_BYTES", str(2 * 1024 * 1024 * 1024)))
+RESULT_CACHE_MAX_ENTRIES = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "256"))
+
+# Bump when an operation's output format changes so old entries stop matching.
+CACHE_VERSION = 2
+MANIFEST_NAME = "manifest.json"
+
+
+class ResultCache:
+    """Content-addressed store for conversion and grouping outputs.
+
+    Entries are keyed on the SHA-256 of the input file plus the operation parameters.
+    The digest of an input is remembered per path together with its size and mtime,
+    so an unchanged file is only hashed once. A fresh output is hard-linked into the
+    cache (copied only across filesystems), and the size and mtime of each stored
+    file are recorded: an entry whose file was since rewritten in place through
+    DATA_DIR is dropped instead of served. Hits are copied out, so two outputs in
+    DATA_DIR never share a file. The least recently used entries are evicted once
+    the byte or entry budget is exceeded.
+    """
+
+    def __init__(self, root: Union[str, Path] = RESULT_CACHE_DIR, max_bytes: int = RESULT_CACHE_MAX_BYTES,
+                 max_entries: int = RESULT_CACHE_MAX_ENTRIES):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0 and self.max_entries > 0
+
+    @contextmanager
+    def _manifest(self):
+        """Load the manifest under an exclusive lock and write it back on exit.
+
+        flock() also serialises the process-pool workers of the rpc-server.
+        """
+        self.root.mkdir(parents=True, exist_ok=True)
+        with open(self.root / "manifest.lock", "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            path = self.root / MANIFEST_NAME
+            try:
+                manifest = json.loads(path.read_text(encoding="utf-8"))
+                if manifest.get("version") != CACHE_VERSION:
+                    raise ValueError("stale manifest")
+            except (OSError, ValueError):
+                manifest = {"version": CACHE_VERSION, "inputs": {}, "entries": {}}
+            yield manifest
+            tmp_path = path.with_name(f"{MANIFEST_NAME}.part")
+            tmp_path.write_text(json.dumps(manifest, indent=1), encoding="utf-8")
+            os.replace(tmp_path, path)
+
+    def input_digest(self, path: Union[str, Path]) -> str:
+        """SHA-256 of path, reused while its size and mtime are unchanged."""
+        path = Path(path).resolve()
+        stat = path.stat()
+        with self._manifest() as manifest:
+            known = manifest["inputs"].get(str(path))
+            if known and known["size"] == stat.st_size and known["mtime_ns"] == stat.st_mtime_ns:
+                return known["sha256"]
+        with path.open("rb") as f:
+            digest = hashlib.file_digest(f, "sha256").hexdigest()
+        with self._manifest() as manifest:
+            manifest["inputs"][str(path)] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": digest}
+        return digest
+
+    def key(self, operation: str, input_path: Union[str, Path], params: Dict) -> str:
+        payload = json.dumps(
+            [CACHE_VERSION, operation, self.input_digest(input_path), params], sort_keys=True, default=str
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def fetch(self, key: str, outputs: List[Path]) -> bool:
+        """Materialise a cached entry at outputs; False on a miss.
+
+        The entry's files are pinned (hard-linked into a private directory) under the
+        manifest lock, so an eviction running during the copy cannot remove them.
+        """
+        self.root.mkdir(parents=True, exist_ok=True)
+        pin_dir = Path(tempfile.mkdtemp(prefix=".pin-", dir=self.root))
+        try:
+            with self._manifest() as manifest:
+                entry = manifest["entries"].get(key)
+                if entry is None:
+                    return False
+                stored = [self.root / key / name for name in entry["files"]]
+                if len(stored) != len(outputs) or not all(map(_unchanged, stored, entry["stats"])):
+                    self._drop(manifest, key)
+                    return False
+                pinned = [pin_dir / path.name for path in stored]
+                for source, pin in zip(stored, pinned):
+                    _link_or_copy(source, pin)
+                entry["last_used"] = time.time()
+                entry["hits"] = entry.get("hits", 0) + 1
+            for pin, target in zip(pinned, outputs):
+                _place(pin, target, link=False)
+            return True
+        finally:
+            shutil.rmtree(pin_dir, ignore_errors=True)
+
+    def store(self, key: str, operation: str, outputs: List[Path]) -> None:
+        """Add freshly produced outputs under key and evict down to the budget."""
+        entry_dir = self.root / key
+        shutil.rmtree(entry_dir, ignore_errors=True)
+        entry_dir.mkdir(parents=True)
+        names = []
+        for i, output in enumerate(outputs):
+            name = f"{i}{output.suffix}"
+            _place(output, entry_dir / name)
+            names.append(name)
+        stats = [(entry_dir / name).stat() for name in names]
+        now = time.time()
+        with self._manifest() as manifest:
+            manifest["entries"][key] = {
+                "operation": operation,
+                "files": names,
+                "stats": [[st.st_size, st.st_mtime_ns] for st in stats],
+                "bytes": sum(st.st_size for st in stats),
+                "created": now,
+                "last_used": now,
+                "hits": 0,
+            }
+            self._evict(manifest)
+
+    def get_or_create(self, operation: str, input_path: Union[str, Path], params: Dict, outputs: List[Path],
+                      produce: Callable[[], object]) -> bool:
+        """Place the cached outputs for (input, params), running produce() on a miss.
+
+        Returns True when the result came from the cache.
+        """
+        if not self.enabled:
+            produce()
+            return False
+        key = self.key(operation, input_path, params)
+        if self.fetch(key, outputs):
+            return True
+        produce()
+        self.store(key, operation, outputs)
+        return False
+
+    def stats(self) -> Dict:
+        with self._manifest() as manifest:
+            entries = manifest["entries"]
+            return {
+                "entries": len(entries),
+                "bytes": float(sum(e["bytes"] for e in entries.values())),
+                "hits": sum(e.get("hits", 0) for e in entries.values()),
+                "max_bytes": float(self.max_bytes),
+                "max_entries": self.max_entries,
+            }
+
+    def clear(self) -> int:
+        with self._manifest() as manifest:
+            keys = list(manifest["entries"])
+            for key in keys:
+                self._drop(manifest, key)
+            manifest["inputs"] = {}
+        return len(keys)
+
+    def _drop(self, manifest: Dict, key: str) -> None:
+        manifest["entries"].pop(key, None)
+        shutil.rmtree(self.root / key, ignore_errors=True)
+
+    def _evict(self, manifest: Dict) -> None:
+        entries = manifest["entries"]
+        total = sum(e["bytes"] for e in entries.values())
+        for key in sorted(entries, key=lambda k: entries[k]["last_used"]):
+            if total <= self.max_bytes and len(entries) <= self.max_entries:
+                break
+            total -= entries[key]["bytes"]
+            self._drop(manifest, key)
+        # Forget digests of inputs that no longer exist.
+        manifest["inputs"] = {p: v for p, v in manifest["inputs"].items() if os.path.exists(p)}
+
+
+def _unchanged(path: Path, stat: List[int]) -> bool:
+    """Whether path still has the size and mtime recorded when it was stored."""
+    try:
+        current = path.stat()
+    except OSError:
+        return False
+    return [current.st_size, current.st_mtime_ns] == stat
+
+
+def _link_or_copy(source: Path, target: Path) -> None:
+    try:
+        os.link(source, target)
+    except OSError:
+        # Different filesystems (or no hard links there): fall back to a copy.
+        shutil.copyfile(source, target)
+
+
+def _place(source: Path, target: Path, link: bool = True) -> None:
+    """Atomically replace target with source's content, hard-linked when link allows it, else copied."""
+    tmp_path = target.with_name(f"{target.name}.part")
+    tmp_path.unlink(missing_ok=True)
+    if link:
+        _link_or_copy(source, tmp_path)
+    else:
+        shutil.copyfile(source, tmp_path)
+    os.replace(tmp_path, target)
+
+
+results = ResultCache()
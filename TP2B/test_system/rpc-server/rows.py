@@ -0,0 +1,114 @@
+"""Formatting of <root><row> XML and of exported documents.
+
+Shared by the converter, the rpc-server's export_collection and the REST API's
+streaming /export (the rest-api image copies this file), so it must stay free of
+third-party imports.
+"""
+import csv
+import re
+from datetime import datetime, time
+from typing import Dict, List, Optional
+from xml.sax.saxutils import escape
+
+# Bookkeeping fields added on import; not part of the original rows.
+SKIP_FIELDS = ("_id", "_import_id")
+
+_NAME_START = (
+    "A-Z_a-z\u00c0-\u00d6\u00d8-\u00f6\u00f8-\u02ff\u0370-\u037d\u037f-\u1fff\u200c-\u200d"
+    "\u2070-\u218f\u2c00-\u2fef\u3001-\ud7ff\uf900-\ufdcf\ufdf0-\ufffd\U00010000-\U000effff"
+)
+# XML 1.0 element names, without ":" since no namespaces are ever declared.
+_NAME_RE = re.compile(f"[{_NAME_START}][{_NAME_START}\\-.0-9\u00b7\u0300-\u036f\u203f-\u2040]*")
+
+
+def check_xml_name(name: str, what: str = "element") -> str:
+    """name if it can be used as an XML element name, else ValueError."""
+    if not isinstance(name, str) or not _NAME_RE.fullmatch(name):
+        raise ValueError(f"Invalid XML {what} name: {name!r}")
+    return name
+
+
+def csv_row_to_xml(row: Dict[str, str], row_name: str = "row") -> str:
+    """One CSV row as the indented <row> block csv_file_to_xml writes."""
+    row_indent, col_indent = "  ", "    "
+    parts = [f"{row_indent}<{row_name}>\n"]
+    for col, val in row.items():
+        val = "" if val is None else escape(val)
+        parts.append(f"{col_indent}<{col}>{val}</{col}>\n")
+    parts.append(f"{row_indent}</{row_name}>\n")
+    return "".join(parts)
+
+
+def cell(value) -> str:
+    """A stored value back as the text an XML/CSV cell would hold."""
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, datetime):
+        return value.date().isoformat() if value.time() == time() else value.isoformat()
+    return str(value)
+
+
+def export_projection(fields: Optional[List[str]], include_ids: bool) -> Dict:
+    """Mongo projection for exporting fields (all but the bookkeeping ones when empty)."""
+    result = {field: 1 for field in fields} if fields else {"_import_id": 0}
+    if fields and not include_ids:
+        result["_id"] = 0
+    return result
+
+
+class RowWriter:
+    """Writes exported documents to a text stream as CSV or as <root><row> XML.
+
+    The CSV header is fields, or the first document's fields; fields that only appear
+    later are dropped. For XML, root_name, row_name and every field name must be valid
+    XML names; ValueError is raised before anything is written for the names known up
+    front, and from write() for a document bringing a new invalid field.
+    """
+
+    def __init__(self, out, fmt: str = "csv", fields: Optional[List[str]] = None, root_name: str = "root",
+                 row_name: str = "row", include_ids: bool = False):
+        if fmt not in ("csv", "xml"):
+            raise ValueError(f"Unknown export format: {fmt}")
+        self.out = out
+        self.fmt = fmt
+        self.fields = fields
+        self.root_name = root_name
+        self.row_name = row_name
+        self.skip = () if include_ids else SKIP_FIELDS
+        self.rows = 0
+        self._csv = None
+        self._names = set()
+        if fmt == "xml":
+            check_xml_name(root_name, "root")
+            check_xml_name(row_name, "row")
+            for field in fields or ():
+                self._check_field(field)
+
+    def _check_field(self, name: str) -> None:
+        if name not in self._names:
+            self._names.add(check_xml_name(name, "field"))
+
+    def begin(self) -> None:
+        if self.fmt == "xml":
+            self.out.write(f"<{self.root_name}>\n")
+
+    def write(self, doc: Dict) -> None:
+        row = {key: cell(value) for key, value in doc.items() if key not in self.skip}
+        if self.fmt == "xml":
+            for key in row:
+                self._check_field(key)
+            self.out.write(csv_row_to_xml(row, self.row_name))
+        else:
+            if self._csv is None:
+                self._csv = csv.DictWriter(self.out, fieldnames=self.fields or list(row), extrasaction="ignore")
+                self._csv.writeheader()
+            self._csv.writerow(row)
+        self.rows += 1
+
+    def end(self) -> None:
+        if self.fmt == "xml":
+            self.out.write(f"</{self.root_name}>\n")
+        elif self._csv is None and self.fields:
+            csv.writer(self.out).writerow(self.fields)
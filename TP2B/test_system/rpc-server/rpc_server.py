@@ -1,15 +1,172 @@
+import json
+import multiprocessing
 import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import date
 from pathlib import Path
 from xmlrpc.server import SimpleXMLRPCServer, SimpleXMLRPCRequestHandler
 
-from converter import csv_file_to_xml, xml_xsd_validator, group_and_write
+from converter import (
+    csv_file_to_xml, csv_stream_to_xml, xml_xsd_validator, group_and_write, partition_xml_file, validate_many,
+)
 import db
+import aggregate
+import compression
+from jobs import jobs
+from result_cache import results
+import uploads
+import xml_index
 
 DATA_DIR = Path(os.environ.get("DATA_DIR", "/data/shared")).resolve()
 DATA_DIR.mkdir(parents=True, exist_ok=True)
 
+# Threads serving requests (I/O-bound methods run here), processes for CPU-bound methods,
+# and how many accepted requests may wait for a thread before callers get a 503.
+RPC_THREADS = int(os.getenv("RPC_THREADS", "16"))
+RPC_PROCESSES = int(os.getenv("RPC_PROCESSES", str(os.cpu_count() or 1)))
+RPC_QUEUE_LIMIT = int(os.getenv("RPC_QUEUE_LIMIT", "64"))
+# Seconds an idle keep-alive connection may hold a thread while waiting for its next request.
+RPC_KEEPALIVE_TIMEOUT = float(os.getenv("RPC_KEEPALIVE_TIMEOUT", "5"))
+
+_BUSY_RESPONSE = (
+    b"HTTP/1.1 503 Service Unavailable\r\n"
+    b"Content-Type: text/plain\r\n"
+    b"Content-Length: 22\r\n"
+    b"Connection: close\r\n\r\n"
+    b"RPC server is too busy"
+)
+
+# JSON transport: POST /json/<method> with {"params": [...]}, answered with a chunked
+# {"result": ...} or {"error": {"type", "message"}}. /RPC2 stays XML-RPC for compatibility.
+JSON_PATH = "/json/"
+JSON_CHUNK_BYTES = 64 * 1024
+
+def _json_default(value):
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, (set, tuple)):
+        return list(value)
+    return str(value)
+
+_json_encoder = json.JSONEncoder(default=_json_default, ensure_ascii=False)
+
 class Handler(SimpleXMLRPCRequestHandler):
     rpc_paths = ("/RPC2",)
+    # HTTP/1.1 lets clients keep their connections alive between calls.
+    protocol_version = "HTTP/1.1"
+    # Idle or stalled connections must not hold a pool thread forever.
+    timeout = int(os.getenv("RPC_SOCKET_TIMEOUT", "60"))
+
+    def handle_one_request(self):
+        # A kept-alive connection holds its thread while idle, so only wait briefly for the next request.
+        self.connection.settimeout(RPC_KEEPALIVE_TIMEOUT)
+        super().handle_one_request()
+
+    def parse_request(self):
+        self.connection.settimeout(self.timeout)
+        return super().parse_request()
+
+    def end_headers(self):
+        # XML-RPC clients open one connection per thread and rarely reuse it; close it after the call.
+        if not self.path.startswith(JSON_PATH):
+            self.send_header("Connection", "close")
+        super().end_headers()
+
+    def do_POST(self):
+        if not self.path.startswith(JSON_PATH):
+            return super().do_POST()
+        method = self.path[len(JSON_PATH):]
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+            params = json.loads(self.rfile.read(length) or b"{}").get("params") or []
+            if not isinstance(params, list):
+                raise ValueError("params must be a list")
+        except (ValueError, AttributeError) as exc:
+            return self._send_json(400, {"error": {"type": "ValueError", "message": f"Malformed request: {exc}"}})
+        if method not in self.server.funcs:
+            return self._send_json(404, {"error": {"type": "LookupError", "message": f'method "{method}" is not supported'}})
+        try:
+            status, body = 200, {"result": self.server._dispatch(method, params)}
+        except Exception as exc:
+            status, body = 500, {"error": {"type": type(exc).__name__, "message": str(exc)}}
+        self._send_json(status, body)
+
+    def _send_json(self, status, body):
+        """Send body with chunked encoding, so large results are never held as one string."""
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        pending, size = [], 0
+        for piece in _json_encoder.iterencode(body):
+            pending.append(piece)
+            size += len(piece)
+            if size >= JSON_CHUNK_BYTES:
+                self._write_chunk("".join(pending).encode("utf-8"))
+                pending, size = [], 0
+        if pending:
+            self._write_chunk("".join(pending).encode("utf-8"))
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _write_chunk(self, data: bytes):
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+
+_process_pool = None
+_process_pool_lock = threading.Lock()
+
+def _processes():
+    """Process pool for CPU-bound work, started on first use and kept for the server's lifetime."""
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is None:
+            # fork: the RPC functions live in __main__, which children must inherit rather than re-import.
+            _process_pool = ProcessPoolExecutor(max_workers=RPC_PROCESSES, mp_context=multiprocessing.get_context("fork"))
+        return _process_pool
+
+class PooledXMLRPCServer(SimpleXMLRPCServer):
+    """XML-RPC server that serves requests from a bounded thread pool.
+
+    Requests beyond the pool size plus RPC_QUEUE_LIMIT are answered with 503 straight
+    away. Methods listed in cpu_bound are executed in a process pool so they don't
+    hold the GIL against the I/O-bound ones.
+    """
+
+    def __init__(self, *args, cpu_bound=(), **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cpu_bound = set(cpu_bound)
+        self._threads = ThreadPoolExecutor(max_workers=RPC_THREADS, thread_name_prefix="rpc")
+        self._processes = _processes()
+        self._admission = threading.BoundedSemaphore(RPC_THREADS + RPC_QUEUE_LIMIT)
+
+    def process_request(self, request, client_address):
+        if not self._admission.acquire(blocking=False):
+            try:
+                request.sendall(_BUSY_RESPONSE)
+            except OSError:
+                pass
+            self.shutdown_request(request)
+            return
+        self._threads.submit(self._process_request_thread, request, client_address)
+
+    def _process_request_thread(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            self._admission.release()
+
+    def _dispatch(self, method, params):
+        if method in self.cpu_bound:
+            return self._processes.submit(self.funcs[method], *params).result()
+        return super()._dispatch(method, params)
+
+    def server_close(self):
+        super().server_close()
+        self._threads.shutdown(wait=False, cancel_futures=True)
+        self._processes.shutdown(wait=False, cancel_futures=True)
 
 # Helpers
 def _resolve_in_data(filename: str) -> Path:
@@ -20,21 +177,83 @@ def _resolve_in_data(filename: str) -> Path:
         raise ValueError("File path is outside the shared data directory.")
     return target
 
+def _as_list(value):
+    """Accept a list or a comma-separated string (job kwargs arrive as form strings)."""
+    if not value:
+        return []
+    if isinstance(value, str):
+        value = value.split(",")
+    return [item.strip() for item in value if item and item.strip()]
+
+_TRUE = ("1", "true", "on", "yes", "y", "t")
+_FALSE = ("0", "false", "off", "no", "n", "f", "")
+
+def _as_bool(value):
+    """Accept a bool or a form string, with the spellings FastAPI's bool Form fields accept."""
+    if isinstance(value, str):
+        if value.strip().lower() in _TRUE:
+            return True
+        if value.strip().lower() in _FALSE:
+            return False
+        raise ValueError(f"Not a boolean: {value!r}")
+    return bool(value)
+
+def _output_params(params, out_path):
+    """Cache params plus the output's compression, left out when plain so existing entries still match."""
+    codec = compression.from_suffix(out_path)
+    return {**params, "compress": codec} if codec else params
+
 # RPC methods
-def rpc_convert_csv_to_file(filename, root_name="root", row_name="row"):
-    """Convert a CSV stored in DATA_DIR into an XML file in the same directory."""
+def rpc_convert_csv_to_file(filename, root_name="root", row_name="row", workers=None, compress=None, *, progress=None):
+    """Convert a CSV (plain, gzip or zstd) stored in DATA_DIR into an XML file in the same directory.
+
+    workers > 1 converts byte-range chunks in a process pool (capped at the CPU count).
+    compress ("gzip"/"zstd") writes <stem>.xml.gz / .xml.zst.
+    """
     csv_path = _resolve_in_data(filename)
     if not csv_path.is_file():
         raise FileNotFoundError(f"CSV file not found: {filename}")
 
-    xml_filename = f"{csv_path.stem}.xml"
+    xml_filename = compression.with_compression(f"{compression.base_name(csv_path).stem}.xml", compress)
+    xml_path = _resolve_in_data(xml_filename)
+
+    workers = max(1, min(int(workers or 1), os.cpu_count() or 1))
+    # workers is not part of the key: parallel output is byte-identical to serial output,
+    # since the XSD types always come from the first rows of the file (tests/test_converter.py).
+    cached = results.get_or_create(
+        "convert", csv_path, _output_params({"root_name": root_name, "row_name": row_name}, xml_path),
+        [xml_path, compression.xsd_path_for(xml_path)],
+        lambda: csv_file_to_xml(csv_path, xml_path, root_name=root_name, row_name=row_name, workers=workers,
+                                progress=progress),
+    )
+    return {"xml_file": xml_filename, "cached": cached}
+
+
+def rpc_convert_upload(upload_id, root_name="root", row_name="row", compress=None, *, progress=None):
+    """Convert a chunked upload to XML while its chunks are still arriving (a job operation).
+
+    The XML is named after the upload's CSV and is done shortly after the last chunk.
+    """
+    state = uploads.read_state(upload_id)
+    if state is None:
+        raise FileNotFoundError(f"Upload not found: {upload_id}")
+    xml_filename = compression.with_compression(f"{compression.base_name(state['filename']).stem}.xml", compress)
     xml_path = _resolve_in_data(xml_filename)
 
-    csv_file_to_xml(csv_path, xml_path, root_name=root_name, row_name=row_name)
-    return {"xml_file": xml_filename}
+    rows_done = [0]
+
+    def report(rows, bytes_read):
+        rows_done[0] = rows
+        if progress:
+            progress(rows, bytes_read)
+
+    stream = uploads.UploadStream(upload_id, waiting=lambda: report(rows_done[0], stream.position))
+    rows = csv_stream_to_xml(stream, xml_path, root_name=root_name, row_name=row_name, progress=report)
+    return {"xml_file": xml_filename, "source": state["filename"], "rows": rows}
 
 
-def rpc_group_xml_file(xml_filename, attr_tag, filter_value=None, row_tag="row", root_name="root", output_filename=None):
+def rpc_group_xml_file(xml_filename, attr_tag, filter_value=None, row_tag="row", root_name="root", output_filename=None,
+                       use_index=True, compress=None, *, progress=None):
     source_path = _resolve_in_data(xml_filename)
     if not source_path.is_file():
         raise FileNotFoundError(f"XML file not found: {xml_filename}")
@@ -43,52 +262,282 @@ def rpc_group_xml_file(xml_filename, attr_tag, filter_value=None, row_tag="row",
         out_path = _resolve_in_data(output_filename)
     else:
         suffix = filter_value or "all"
-        out_name = f"{source_path.stem}_grouped_by_{attr_tag.lower()}_{suffix}.xml"
-        out_path = _resolve_in_data(out_name)
-
-    group_and_write(
-        source_path,
-        row_tag=row_tag,
-        attr_tag=attr_tag,
-        filter_value=filter_value,
-        output_path=out_path,
-        root_name=root_name,
+        out_name = f"{compression.base_name(source_path).stem}_grouped_by_{attr_tag.lower()}_{suffix}.xml"
+        out_path = _resolve_in_data(compression.with_compression(out_name, compress))
+
+    params = {"attr_tag": attr_tag, "filter_value": filter_value or None, "row_tag": row_tag, "root_name": root_name}
+    cached = results.get_or_create(
+        "group", source_path, _output_params(params, out_path), [out_path, compression.xsd_path_for(out_path)],
+        lambda: group_and_write(
+            source_path,
+            row_tag=row_tag,
+            attr_tag=attr_tag,
+            filter_value=filter_value,
+            output_path=out_path,
+            root_name=root_name,
+            progress=progress,
+            use_index=bool(use_index),
+        ),
+    )
+    return {"xml_file": out_path.name, "xsd_file": compression.xsd_path_for(out_path).name, "cached": cached}
+
+
+def rpc_partition_xml_file(xml_filename, attr_tag, row_tag="row", root_name="root", output_dir=None,
+                           max_open_files=None, compress=None, *, progress=None):
+    """Split an XML file into one grouped XML + XSD per attr_tag value, in one pass.
+
+    Files go to output_dir (default <stem>_by_<attr_tag>/) inside DATA_DIR; returns the manifest.
+    compress ("gzip"/"zstd") writes the XMLs as <value>.xml.gz / .xml.zst.
+    """
+    source_path = _resolve_in_data(xml_filename)
+    if not source_path.is_file():
+        raise FileNotFoundError(f"XML file not found: {xml_filename}")
+    out_dir = _resolve_in_data(output_dir or f"{compression.base_name(source_path).stem}_by_{attr_tag.lower()}")
+    if out_dir == DATA_DIR:
+        raise ValueError("output_dir must be a subdirectory of the shared data directory.")
+    # Dot-directories hold the result cache and uploads in progress.
+    if any(part.startswith(".") for part in out_dir.relative_to(DATA_DIR).parts):
+        raise ValueError("output_dir must not be a hidden directory.")
+
+    manifest = partition_xml_file(
+        source_path, out_dir, row_tag=row_tag, attr_tag=attr_tag, root_name=root_name,
+        max_open_files=int(max_open_files) if max_open_files else None, progress=progress,
+        compress=compression.normalize(compress),
     )
-    return {"xml_file": out_path.name, "xsd_file": out_path.with_suffix(".xsd").name}
+    return {"directory": out_dir.relative_to(DATA_DIR).as_posix(), **manifest}
+
+def _rpc_stats(group):
+    """group with int sums/min/max that XML-RPC cannot marshal (beyond 32 bits) sent as floats."""
+    for stats in group["stats"].values():
+        for stat in ("sum", "min", "max"):
+            if isinstance(stats[stat], int) and not -2**31 <= stats[stat] < 2**31:
+                stats[stat] = float(stats[stat])
+    return group
+
+def rpc_aggregate_xml(filename, group_by, columns=None, output_format="json", output_filename=None, row_tag="row",
+                      root_name="root", compress=None, *, progress=None):
+    """count/sum/min/max/mean of numeric columns per group_by key, from one pass over an XML or CSV file.
+
+    Without columns the numeric fields of the file's XSD are used. output_format json
+    returns the groups; xml or csv writes them to output_filename in DATA_DIR instead
+    (compressed with compress, or when output_filename ends in .gz/.zst).
+    """
+    source_path = _resolve_in_data(filename)
+    if not source_path.is_file():
+        raise FileNotFoundError(f"File not found: {filename}")
+    if output_format not in ("json", "xml", "csv"):
+        raise ValueError(f"Unknown output format: {output_format}")
+    group_by = _as_list(group_by)
+    columns = aggregate.resolve_columns(source_path, group_by, _as_list(columns), row_tag=row_tag)
+    if output_format == "xml":
+        aggregate.check_xml_names(group_by, columns, root_name)
+
+    columns, groups = aggregate.aggregate_file(source_path, group_by, columns=columns, row_tag=row_tag, progress=progress)
+    result = {"source": filename, "group_by": group_by, "columns": columns, "group_count": len(groups)}
+    if output_format == "json":
+        result["groups"] = [_rpc_stats(group) for group in groups]
+        return result
 
+    keys = "_".join(key.lower() for key in group_by) or "all"
+    default_name = f"{compression.base_name(source_path).stem}_agg_by_{keys}.{output_format}"
+    out_path = _resolve_in_data(output_filename or compression.with_compression(default_name, compress))
+    if output_format == "csv":
+        aggregate.write_csv(out_path, group_by, columns, groups)
+    else:
+        aggregate.write_xml(out_path, group_by, columns, groups, root_name=root_name)
+    result["output_file"] = out_path.name
+    return result
+
+def rpc_build_xml_index(xml_filename, columns, row_tag="row", *, progress=None):
+    """(Re)build the sidecar row/value index of an XML file for the given columns."""
+    xml_path = _resolve_in_data(xml_filename)
+    if not xml_path.is_file():
+        raise FileNotFoundError(f"XML file not found: {xml_filename}")
+    columns = _as_list(columns)
+    if not columns:
+        raise ValueError("At least one column is required.")
+    header = xml_index.build_index(xml_path, columns, row_tag=row_tag, progress=progress)
+    return {
+        "index_file": xml_index.index_path(xml_path).name,
+        "rows": header["rows"],
+        "columns": {col: section["values"] for col, section in header["columns"].items()},
+    }
 
 def rpc_list_xml_files():
-    """List XML files available in the shared data directory."""
-    files = sorted([p.name for p in DATA_DIR.glob("*.xml") if p.is_file()])
+    """List XML files (plain, .xml.gz or .xml.zst) available in the shared data directory."""
+    patterns = ["*.xml"] + [f"*.xml{suffix}" for suffix in compression.SUFFIXES.values()]
+    files = sorted([p.name for pattern in patterns for p in DATA_DIR.glob(pattern) if p.is_file()])
     return files
 
-def rpc_insert_xml_file(xml_filename, collection=None):
-    """Read an XML file from DATA_DIR and insert rows into MongoDB."""
+def rpc_insert_xml_file(xml_filename, collection=None, include_ids=False, typed=True, *, progress=None):
+    """Read an XML file from DATA_DIR and insert rows into MongoDB; returns an import summary."""
+    xml_path = _resolve_in_data(xml_filename)
+    if not xml_path.is_file():
+        raise FileNotFoundError(f"XML file not found: {xml_filename}")
+    return db.insert_xml_file(
+        str(xml_path), collection=collection, progress=progress, include_ids=bool(include_ids), typed=bool(typed)
+    )
+
+def rpc_import_csv(filename, collection=None, write_artifacts=False, root_name="root", row_name="row", typed=True,
+                   compress=None, *, progress=None):
+    """Import a CSV from DATA_DIR straight into MongoDB; optionally also write its XML + XSD."""
+    csv_path = _resolve_in_data(filename)
+    if not csv_path.is_file():
+        raise FileNotFoundError(f"CSV file not found: {filename}")
+    xml_name = compression.with_compression(f"{compression.base_name(csv_path).stem}.xml", compress)
+    xml_path = _resolve_in_data(xml_name) if write_artifacts else None
+    return db.import_csv_file(
+        csv_path, collection=collection, progress=progress, typed=bool(typed),
+        xml_path=xml_path, root_name=root_name or "root", row_name=row_name or "row",
+    )
+
+def rpc_import_xml_validated(xml_filename, xsd_filename=None, collection=None, on_error="rollback", typed=True,
+                             *, progress=None):
+    """Validate and import an XML file in one pass; on a schema error the import is rolled back or quarantined."""
     xml_path = _resolve_in_data(xml_filename)
     if not xml_path.is_file():
         raise FileNotFoundError(f"XML file not found: {xml_filename}")
-    return db.insert_xml_file(str(xml_path), collection=collection)
+    xsd_path = _resolve_in_data(xsd_filename) if xsd_filename else compression.xsd_path_for(xml_path)
+    if not xsd_path.is_file():
+        raise FileNotFoundError(f"XSD file not found: {xsd_path.name}")
+    return db.import_xml_validated(
+        str(xml_path), xsd_path, collection=collection, progress=progress, on_error=on_error or "rollback", typed=bool(typed)
+    )
 
-def rpc_validate_xml(xml_filename, xsd_filename):
+def rpc_validate_xml(xml_filename, xsd_filename, max_errors=1, *, progress=None):
     """Validate an XML file against an XSD in the shared data directory."""
-    return xml_xsd_validator(xml_filename, xsd_filename)
+    return xml_xsd_validator(xml_filename, xsd_filename, progress=progress, max_errors=max_errors)
+
+def rpc_validate_many(pairs, max_errors=1, fail_fast=False):
+    """Validate [xml, xsd] filename pairs concurrently; returns per-file results with timings."""
+    return validate_many(pairs, max_errors=max_errors, fail_fast=bool(fail_fast), executor=_processes())
 
 def rpc_get_document(doc_id, collection=None):
     return db.get_document(doc_id, collection=collection)
 
-def rpc_list_documents(collection=None):
-    return db.list_documents(collection=collection)
+def rpc_get_documents(ids, collection=None, fields=None):
+    return db.get_documents(_as_list(ids), collection=collection, fields=_as_list(fields))
+
+def rpc_list_documents(collection=None, after=None, limit=db.DOCUMENTS_PAGE_SIZE, with_total=False):
+    return db.list_documents(collection=collection, after=after, limit=limit, with_total=bool(with_total))
+
+def rpc_find_documents(collection=None, filter=None, fields=None, sort=None, after=None, limit=db.DOCUMENTS_PAGE_SIZE):
+    return db.find_documents(collection=collection, filter=filter, fields=_as_list(fields), sort=sort or None,
+                             after=after, limit=limit)
+
+def rpc_aggregate_documents(collection=None, group_by=None, metrics=None, filter=None, sort=None,
+                            limit=db.MAX_DOCUMENTS_PAGE_SIZE):
+    return db.aggregate_documents(collection=collection, group_by=_as_list(group_by), metrics=_as_list(metrics),
+                                  filter=filter, sort=sort or None, limit=limit)
+
+def rpc_export_collection(filename, collection=None, format="csv", fields=None, root_name="root", row_name="row",
+                          include_ids=False, compress=False, *, progress=None):
+    """Export a collection to DATA_DIR/filename as CSV or <root><row> XML (compress: true/"gzip" or "zstd")."""
+    out_path = _resolve_in_data(filename)
+    return db.export_collection(
+        out_path, collection=collection, fmt=format, fields=_as_list(fields), root_name=root_name or "root",
+        row_name=row_name or "row", include_ids=bool(include_ids), compress=compress, progress=progress,
+    )
+
+def rpc_create_index(collection=None, fields=None, unique=False):
+    return db.create_index(collection=collection, fields=_as_list(fields), unique=bool(unique))
+
+def rpc_list_indexes(collection=None):
+    return db.list_indexes(collection=collection)
+
+def rpc_drop_index(collection=None, name=None):
+    db.drop_index(collection=collection, name=name)
+    return True
+
+def rpc_list_inserted_ids(first_id, last_id, collection=None, after=None, limit=1000):
+    return db.list_inserted_ids(first_id, last_id, collection=collection, after=after, limit=int(limit))
+
+def rpc_cache_stats():
+    """Size and hit counts of the convert/group result cache."""
+    return results.stats()
+
+def rpc_clear_cache():
+    """Drop every cached convert/group result; returns the number of entries removed."""
+    return results.clear()
+
+# Long-running operations that can run as background jobs
+JOB_OPERATIONS = {
+    "convert_csv_to_file": rpc_convert_csv_to_file,
+    "convert_upload": rpc_convert_upload,
+    "group_xml_file": rpc_group_xml_file,
+    "partition_xml_file": rpc_partition_xml_file,
+    "aggregate_xml": rpc_aggregate_xml,
+    "export_collection": rpc_export_collection,
+    "insert_xml_file": rpc_insert_xml_file,
+    "import_xml_validated": rpc_import_xml_validated,
+    "import_csv": rpc_import_csv,
+    "validate_xml": rpc_validate_xml,
+    "build_xml_index": rpc_build_xml_index,
+}
+
+# Boolean arguments of each job operation; job kwargs arrive as form strings, where bool("false") is True.
+_JOB_FLAGS = {
+    "group_xml_file": ("use_index",),
+    "export_collection": ("include_ids",),
+    "insert_xml_file": ("include_ids", "typed"),
+    "import_xml_validated": ("typed",),
+    "import_csv": ("write_artifacts", "typed"),
+}
+
+def rpc_submit_job(operation, args=None, kwargs=None):
+    """Run a long operation in the job pool; returns the job id to poll with get_job."""
+    func = JOB_OPERATIONS.get(operation)
+    if func is None:
+        raise ValueError(f"Unknown job operation: {operation}")
+    args = list(args or [])
+    kwargs = dict(kwargs or {})
+    for flag in _JOB_FLAGS.get(operation, ()):
+        if flag in kwargs:
+            kwargs[flag] = _as_bool(kwargs[flag])
+    if not args:
+        raise ValueError("A source filename is required.")
+    source = _resolve_in_data(args[0])
+    total_bytes = source.stat().st_size if source.is_file() else 0
+    return jobs.submit(operation, lambda progress: func(*args, progress=progress, **kwargs), total_bytes)
+
+def rpc_get_job(job_id):
+    return jobs.get(job_id)
+
+def rpc_cancel_job(job_id):
+    return jobs.cancel(job_id)
 
-with SimpleXMLRPCServer(("0.0.0.0", 8000), requestHandler=Handler, allow_none=True) as server:
-    print("RPC server running on port 8000")
+if __name__ == "__main__":
+    cpu_bound = ("convert_csv_to_file", "validate_xml", "group_xml_file", "partition_xml_file", "build_xml_index",
+                 "aggregate_xml")
+    with PooledXMLRPCServer(("0.0.0.0", 8000), requestHandler=Handler, allow_none=True, cpu_bound=cpu_bound) as server:
+        print(f"RPC server running on port 8000 ({RPC_THREADS} threads, {RPC_PROCESSES} processes)")
 
-    server.register_function(rpc_convert_csv_to_file, "convert_csv_to_file")
-    server.register_function(rpc_list_xml_files, "list_xml_files")
-    server.register_function(rpc_insert_xml_file, "insert_xml_file")
-    server.register_function(rpc_validate_xml, "validate_xml")
-    server.register_function(rpc_group_xml_file, "group_xml_file")
-    server.register_function(rpc_get_document, "get_document")
-    server.register_function(rpc_list_documents, "list_documents")
-    print("registered functions." + ", ".join(server.system_listMethods()))
+        server.register_function(rpc_convert_csv_to_file, "convert_csv_to_file")
+        server.register_function(rpc_list_xml_files, "list_xml_files")
+        server.register_function(rpc_insert_xml_file, "insert_xml_file")
+        server.register_function(rpc_import_xml_validated, "import_xml_validated")
+        server.register_function(rpc_import_csv, "import_csv")
+        server.register_function(rpc_validate_xml, "validate_xml")
+        server.register_function(rpc_validate_many, "validate_many")
+        server.register_function(rpc_group_xml_file, "group_xml_file")
+        server.register_function(rpc_partition_xml_file, "partition_xml_file")
+        server.register_function(rpc_build_xml_index, "build_xml_index")
+        server.register_function(rpc_aggregate_xml, "aggregate_xml")
+        server.register_function(rpc_get_document, "get_document")
+        server.register_function(rpc_get_documents, "get_documents")
+        server.register_function(rpc_list_documents, "list_documents")
+        server.register_function(rpc_list_inserted_ids, "list_inserted_ids")
+        server.register_function(rpc_find_documents, "find_documents")
+        server.register_function(rpc_aggregate_documents, "aggregate_documents")
+        server.register_function(rpc_export_collection, "export_collection")
+        server.register_function(rpc_create_index, "create_index")
+        server.register_function(rpc_list_indexes, "list_indexes")
+        server.register_function(rpc_drop_index, "drop_index")
+        server.register_function(rpc_cache_stats, "cache_stats")
+        server.register_function(rpc_clear_cache, "clear_cache")
+        server.register_function(rpc_submit_job, "submit_job")
+        server.register_function(rpc_get_job, "get_job")
+        server.register_function(rpc_cancel_job, "cancel_job")
+        print("registered functions." + ", ".join(server.system_listMethods()))
 
-    server.serve_forever()
+        server.serve_forever()
@@ -0,0 +1,8 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# The modules read DATA_DIR and friends at import time; point them at a scratch dir first.
+os.environ.setdefault("DATA_DIR", tempfile.mkdtemp(prefix="rpc-tests-"))
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
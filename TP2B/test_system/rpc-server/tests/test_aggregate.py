@@ -0,0 +1,21 @@
+import aggregate
+
+
+def test_parse_number_rejects_non_finite_and_grouped_digits():
+    for text in ("nan", "inf", "-Infinity", "1_000", "1_0.5"):
+        assert aggregate._parse_number(text) is None
+    assert aggregate._parse_number("12") == 12
+    assert aggregate._parse_number("1.5e3") == 1500.0
+
+
+def test_nested_rows_are_not_aggregated(tmp_path):
+    source = tmp_path / "temps.xml"
+    source.write_text(
+        "<root>"
+        "<row><City>Porto</City><Temp>20</Temp><row><City>Porto</City><Temp>99</Temp></row></row>"
+        "<row><City>Porto</City><Temp>22</Temp></row>"
+        "</root>"
+    )
+    columns, groups = aggregate.aggregate_file(source, ["City"], ["Temp"])
+    assert groups == [{"City": "Porto", "rows": 2, "stats": {"Temp": {
+        "count": 2, "sum": 42, "min": 20, "max": 22, "mean": 21.0}}}]
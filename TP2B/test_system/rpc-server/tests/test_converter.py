@@ -0,0 +1,48 @@
+import csv
+
+import converter
+
+
+def _write_csv(path, rows):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["City", "Temp"])
+        writer.writerows(rows)
+
+
+def test_parallel_conversion_matches_serial(tmp_path, monkeypatch):
+    # Integers in the sampled head, decimals further down: only the head may decide the type.
+    rows = [[f"C{i}", str(i)] for i in range(250)] + [[f"C{i}", f"{i}.5"] for i in range(250, 400)]
+    source = tmp_path / "temps.csv"
+    _write_csv(source, rows)
+    monkeypatch.setattr(converter, "PARALLEL_MIN_CHUNK", 1)
+
+    converter.csv_file_to_xml(source, tmp_path / "serial.xml", workers=1)
+    converter.csv_file_to_xml(source, tmp_path / "parallel.xml", workers=4)
+
+    assert (tmp_path / "parallel.xml").read_bytes() == (tmp_path / "serial.xml").read_bytes()
+    serial_xsd = (tmp_path / "serial.xsd").read_text()
+    assert (tmp_path / "parallel.xsd").read_text() == serial_xsd
+    assert 'name="Temp" type="xs:int"' in serial_xsd
+
+
+def _validate(tmp_path, document, max_errors):
+    xml_path = tmp_path / "doc.xml"
+    xml_path.write_text(document)
+    xsd_path = tmp_path / "doc.xsd"
+    if not xsd_path.exists():
+        xsd_path.write_text(converter._build_xsd("root", "row", {"City": "xs:string", "Temp": "xs:int"}))
+    return converter._validate_path(xml_path, xsd_path, max_errors=max_errors)
+
+
+def test_row_validation_keeps_the_document_verdict(tmp_path):
+    rows = "<row><City>Porto</City><Temp>20</Temp></row>"
+    # Valid rows, but an attribute the root does not declare.
+    document = f'<root extra="1">{rows}{rows}</root>'
+    assert _validate(tmp_path, document, 1)
+    assert _validate(tmp_path, document, 10)
+
+    bad = "<row><City>Lisbon</City><Temp>warm</Temp></row>"
+    errors = _validate(tmp_path, f"<root>{bad}{rows}{bad}</root>", 10)
+    assert len(errors) == 2 and all("warm" in message for _, message in errors)
+    assert _validate(tmp_path, f"<root>{rows}</root>", 10) == []
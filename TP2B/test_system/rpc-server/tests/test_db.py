@@ -0,0 +1,88 @@
+from datetime import datetime
+
+import pytest
+
+import converter
+import db
+
+
+def test_dates_parse_with_the_detected_column_format(tmp_path):
+    # 12/25/2021 only fits month/day, so 03/04/2021 in the same column is March 4.
+    values = ["12/25/2021", "03/04/2021"]
+    column = converter.ColumnType()
+    column.add_many(values)
+    assert column.date_format == "%m/%d/%Y"
+
+    xml_path = tmp_path / "dates.xml"
+    rows = "".join(f"<row><Day>{v}</Day></row>" for v in values)
+    xml_path.write_text(f"<root>{rows}</root>")
+    xsd_path = tmp_path / "dates.xsd"
+    xsd_path.write_text(converter.generate_xsd_from_xml(xml_path))
+
+    convert = db.field_converters(xsd_path, converter.xml_date_formats(xml_path))["Day"]
+    assert convert("03/04/2021") == datetime(2021, 3, 4)
+
+
+def test_mixed_date_formats_fall_back_to_every_format():
+    column = converter.ColumnType()
+    column.add_many(["2021-03-04", "25/12/2021"])
+    assert column.xsd_type == "xs:date"
+    assert column.date_format is None
+
+
+class _FakeCollection:
+    """Just enough of a pymongo collection for import_xml_validated."""
+
+    name = "rows"
+
+    def __init__(self):
+        self.docs = []
+        self.filters = []
+
+    def insert_many(self, docs, ordered=True):
+        self.docs.extend(docs)
+
+    def _select(self, query):
+        self.filters.append(query)
+        floor = query["_id"]["$gte"]
+        return [doc for doc in self.docs if doc["_id"] >= floor and doc.get("_import_id") == query["_import_id"]]
+
+    def update_many(self, query, update):
+        for doc in self._select(query):
+            doc.pop("_import_id")
+
+    def delete_many(self, query):
+        selected = self._select(query)
+        self.docs = [doc for doc in self.docs if doc not in selected]
+        return type("DeleteResult", (), {"deleted_count": len(selected)})()
+
+
+def _import(tmp_path, monkeypatch, rows):
+    xml_path = tmp_path / "rows.xml"
+    xml_path.write_text("<root>" + "".join(f"<row><n>{n}</n></row>" for n in rows) + "</root>")
+    xsd_path = tmp_path / "rows.xsd"
+    xsd_path.write_text(converter.generate_xsd_from_xml(xml_path, max_samples=1))
+    coll = _FakeCollection()
+    coll.docs.append({"_id": db.ObjectId.from_datetime(datetime(2020, 1, 1)), "_import_id": "older"})
+    monkeypatch.setattr(db, "_collection", lambda name=None: coll)
+    return coll, db.import_xml_validated(xml_path, xsd_path)
+
+
+def test_validated_import_clean_up_selects_by_id_range(tmp_path, monkeypatch):
+    coll, summary = _import(tmp_path, monkeypatch, ["1", "2"])
+    assert summary["status"] == "ok"
+    assert all("_id" in query for query in coll.filters)
+    assert [doc.get("_import_id") for doc in coll.docs] == ["older", None, None]
+
+    coll, summary = _import(tmp_path, monkeypatch, ["1", "x"])
+    assert summary["status"] == "invalid"
+    assert [doc["_import_id"] for doc in coll.docs] == ["older"]
+
+
+def test_csv_import_reports_rows_with_extra_fields(tmp_path, monkeypatch):
+    source = tmp_path / "extra.csv"
+    source.write_text("City,Temp\nPorto,20\nLisbon,22,oops\n")
+    monkeypatch.setattr(db, "_collection", lambda name=None: _FakeCollection())
+    with pytest.raises(ValueError, match="line 3 has more fields"):
+        db.import_csv_file(source, xml_path=tmp_path / "extra.xml")
+    assert not (tmp_path / "extra.xml.part").exists()
@@ -0,0 +1,51 @@
+import converter
+import grouping
+
+
+def _write_rows(path, values):
+    rows = "".join(f"<row><City>{v}</City><n>{i}</n></row>" for i, v in enumerate(values))
+    path.write_text(f"<root>{rows}</root>")
+
+
+def test_many_spill_runs_merge_in_bounded_passes(tmp_path, monkeypatch):
+    # High-cardinality keys with a tiny group budget spill a run every few rows.
+    values = [f"v{i % 97}" for i in range(1000)]
+    source = tmp_path / "in.xml"
+    _write_rows(source, values)
+    grouping.group_rows(source, tmp_path / "expected.xml")
+
+    opened = []
+    real_reduce = grouping._reduce_runs
+
+    def reduce(spill_dir, runs, fan_in):
+        opened.append(len(runs))
+        reduced = real_reduce(spill_dir, runs, fan_in)
+        opened.append(len(reduced))
+        return reduced
+
+    monkeypatch.setattr(grouping, "GROUP_MERGE_FAN_IN", 4)
+    monkeypatch.setattr(grouping, "_reduce_runs", reduce)
+    groups = grouping.group_rows(source, tmp_path / "spilled.xml", max_groups=5, memory_budget=2_000_000)
+
+    assert groups == 97
+    assert opened[0] > 4 and opened[1] <= 3
+    assert (tmp_path / "spilled.xml").read_bytes() == (tmp_path / "expected.xml").read_bytes()
+
+
+def test_index_path_matches_full_scan_with_namespaces_and_encoding(tmp_path):
+    rows = "".join(
+        f"<row><City>{city}</City><p:note>n{i}</p:note><row><City>Inner</City></row></row>"
+        for i, city in enumerate(["Köln", "Porto", "Köln"])
+    )
+    document = f'<?xml version="1.0" encoding="ISO-8859-1"?>\n<root xmlns:p="urn:p">{rows}</root>'
+    source = tmp_path / "cities.xml"
+    source.write_bytes(document.encode("iso-8859-1"))
+
+    converter.group_and_write(source, filter_value="Köln", output_path=tmp_path / "scan.xml", engine="native",
+                              use_index=False)
+    converter.group_and_write(source, filter_value="Köln", output_path=tmp_path / "index.xml", engine="native")
+
+    assert (tmp_path / "cities.xml.idx").exists()
+    scanned = (tmp_path / "scan.xml").read_text(encoding="utf-8")
+    assert "<p:note>n2</p:note>" in scanned and scanned.count("<Group") == 1
+    assert (tmp_path / "index.xml").read_text(encoding="utf-8") == scanned
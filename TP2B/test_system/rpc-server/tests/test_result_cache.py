@@ -0,0 +1,95 @@
+import os
+
+import pytest
+
+import converter
+import result_cache
+import rpc_server
+from result_cache import ResultCache
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ResultCache(tmp_path / "cache")
+
+
+def _produce(path, text):
+    def produce():
+        path.write_text(text)
+    return produce
+
+
+def test_store_links_and_hits_are_copies(tmp_path, cache):
+    source = tmp_path / "in.csv"
+    source.write_text("a\n1\n")
+    out = tmp_path / "out.xml"
+    assert not cache.get_or_create("convert", source, {}, [out], _produce(out, "<root/>"))
+    stored = cache.root / cache.key("convert", source, {}) / "0.xml"
+    assert os.stat(stored).st_ino == os.stat(out).st_ino
+
+    other = tmp_path / "other.xml"
+    assert cache.get_or_create("convert", source, {}, [other], _produce(other, "wrong"))
+    assert other.read_text() == "<root/>"
+    assert os.stat(other).st_ino != os.stat(stored).st_ino
+
+
+def test_entry_rewritten_in_place_is_not_served(tmp_path, cache):
+    source = tmp_path / "in.csv"
+    source.write_text("a\n1\n")
+    out = tmp_path / "out.xml"
+    cache.get_or_create("convert", source, {}, [out], _produce(out, "<root/>"))
+    with open(out, "w") as f:  # truncates the inode the cache entry shares
+        f.write("clobbered!")
+
+    again = tmp_path / "again.xml"
+    assert not cache.get_or_create("convert", source, {}, [again], _produce(again, "<root/>"))
+    assert again.read_text() == "<root/>"
+
+
+def test_eviction_during_fetch_does_not_break_the_copy(tmp_path, cache, monkeypatch):
+    source = tmp_path / "in.csv"
+    source.write_text("a\n1\n")
+    out = tmp_path / "out.xml"
+    cache.get_or_create("convert", source, {}, [out], _produce(out, "<root/>"))
+
+    place = result_cache._place
+
+    def evict_then_place(pin, target, link=True):
+        cache.clear()
+        place(pin, target, link)
+
+    monkeypatch.setattr(result_cache, "_place", evict_then_place)
+    target = tmp_path / "target.xml"
+    assert cache.fetch(cache.key("convert", source, {}), [target])
+    assert target.read_text() == "<root/>"
+
+
+def test_convert_cache_hit_matches_a_fresh_parallel_run(tmp_path, monkeypatch):
+    monkeypatch.setattr(rpc_server, "DATA_DIR", tmp_path)
+    monkeypatch.setattr(rpc_server, "results", ResultCache(tmp_path / ".cache"))
+    monkeypatch.setattr(converter, "PARALLEL_MIN_CHUNK", 1)
+    monkeypatch.setattr(os, "cpu_count", lambda: 4)  # workers are capped at the CPU count
+    lines = ["City,Temp"] + [f"C{i},{i}" for i in range(250)] + [f"C{i},{i}.5" for i in range(250, 400)]
+    (tmp_path / "t.csv").write_text("\n".join(lines) + "\n")
+
+    assert not rpc_server.rpc_convert_csv_to_file("t.csv", workers=1)["cached"]
+    serial_xsd = (tmp_path / "t.xsd").read_text()
+    assert rpc_server.rpc_convert_csv_to_file("t.csv", workers=4)["cached"]
+    assert (tmp_path / "t.xsd").read_text() == serial_xsd
+
+    rpc_server.results.clear()
+    assert not rpc_server.rpc_convert_csv_to_file("t.csv", workers=4)["cached"]
+    assert (tmp_path / "t.xsd").read_text() == serial_xsd
+
+
+def test_keys_follow_input_content_and_params(tmp_path, cache):
+    source = tmp_path / "in.csv"
+    source.write_text("City\nPorto\n")
+    key = cache.key("convert", source, {"row_name": "row"})
+    assert cache.key("convert", source, {"row_name": "row"}) == key
+    assert cache.key("convert", source, {"row_name": "item"}) != key
+    assert cache.key("group", source, {"row_name": "row"}) != key
+
+    source.write_text("City\nLisbon\n")
+    os.utime(source, ns=(1, 1))
+    assert cache.key("convert", source, {"row_name": "row"}) != key
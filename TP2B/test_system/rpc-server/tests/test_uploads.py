@@ -0,0 +1,32 @@
+import json
+
+import pytest
+
+import uploads
+
+
+class _Stop(Exception):
+    pass
+
+
+def _stop():
+    raise _Stop()
+
+
+def test_reader_stops_at_the_committed_offset(tmp_path, monkeypatch):
+    monkeypatch.setattr(uploads, "UPLOADS_DIR", tmp_path)
+    upload_id = "a" * 32
+    # The last chunk is on disk but its offset was not committed yet.
+    (tmp_path / f"{upload_id}.part").write_bytes(b"abcdef")
+    state = {"filename": "up.csv", "offset": 3, "size": None, "complete": False}
+    (tmp_path / f"{upload_id}.json").write_text(json.dumps(state))
+
+    reader = uploads.UploadStream(upload_id, waiting=_stop, poll_interval=0)
+    assert reader.read(10) == b"abc"
+    with pytest.raises(_Stop):
+        reader.read(10)
+
+    state.update(offset=6, size=6, complete=True)
+    (tmp_path / f"{upload_id}.json").write_text(json.dumps(state))
+    assert reader.read(10) == b"def"
+    assert reader.read(10) == b""
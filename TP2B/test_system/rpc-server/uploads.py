@@ -0,0 +1,97 @@
+import io
+import json
+import os
+import re
+import time
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+DATA_DIR = Path(os.getenv("DATA_DIR", "/data/shared"))
+# Where the Flask app keeps chunked uploads while they arrive (same volume as DATA_DIR).
+UPLOADS_DIR = Path(os.getenv("UPLOADS_DIR", str(DATA_DIR / ".uploads")))
+# Seconds between looks for new chunks once a reader has caught up with the upload.
+UPLOAD_POLL_INTERVAL = float(os.getenv("UPLOAD_POLL_INTERVAL", "0.2"))
+# A reader gives up on an upload that gets no new bytes for this many seconds.
+UPLOAD_STALL_TIMEOUT = float(os.getenv("UPLOAD_STALL_TIMEOUT", "3600"))
+
+_UPLOAD_ID = re.compile(r"[0-9a-f]{32}")
+
+
+def _check_id(upload_id: str) -> str:
+    if not _UPLOAD_ID.fullmatch(upload_id or ""):
+        raise ValueError(f"Invalid upload id: {upload_id}")
+    return upload_id
+
+
+def read_state(upload_id: str) -> Optional[Dict]:
+    """The upload's state file as written by the Flask app, or None once the upload was deleted."""
+    try:
+        with (UPLOADS_DIR / f"{_check_id(upload_id)}.json").open("r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+class UploadStream(io.RawIOBase):
+    """Binary reader over a chunked upload that may still be arriving.
+
+    Reads return the bytes committed so far and wait at the current end for more;
+    end of stream is reported only once the upload is complete and fully read.
+    waiting() is called on every poll (a job's progress callback raises there when
+    the job is cancelled). Deleting the upload, or a stall longer than stall_timeout,
+    makes the reader fail.
+    """
+
+    def __init__(self, upload_id: str, waiting: Callable[[], None] = None, poll_interval: float = UPLOAD_POLL_INTERVAL,
+                 stall_timeout: float = UPLOAD_STALL_TIMEOUT):
+        super().__init__()
+        self.upload_id = _check_id(upload_id)
+        self.waiting = waiting
+        self.poll_interval = poll_interval
+        self.stall_timeout = stall_timeout
+        self.position = 0
+        self._committed = 0
+        self._file = self._open()
+
+    def _open(self):
+        try:
+            return (UPLOADS_DIR / f"{self.upload_id}.part").open("rb")
+        except FileNotFoundError:
+            # Completed uploads are moved into DATA_DIR; the state file says where.
+            state = read_state(self.upload_id)
+            if state and state.get("complete"):
+                return (DATA_DIR / state["filename"]).open("rb")
+            raise FileNotFoundError(f"Upload not found: {self.upload_id}")
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        idle_since = time.monotonic()
+        while True:
+            # Only bytes the state file has committed: a chunk being written (or one
+            # rejected and rewritten) can be on disk past the offset.
+            if self._committed > self.position:
+                n = self._file.readinto(memoryview(buffer)[:self._committed - self.position])
+                if n:
+                    self.position += n
+                    return n
+            state = read_state(self.upload_id)
+            if state is None:
+                raise ValueError(f"Upload {self.upload_id} was cancelled")
+            if state.get("complete") and self.position >= state["size"]:
+                return 0
+            committed = state["size"] if state.get("complete") else state["offset"]
+            if committed > self._committed:
+                self._committed = committed
+                continue
+            if time.monotonic() - idle_since > self.stall_timeout:
+                raise TimeoutError(f"Upload {self.upload_id} stalled at {self.position} bytes")
+            if self.waiting:
+                self.waiting()
+            time.sleep(self.poll_interval)
+
+    def close(self) -> None:
+        if not self.closed:
+            self._file.close()
+        super().close()
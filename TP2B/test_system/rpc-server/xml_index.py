@@ -0,0 +1,253 @@
+import json
+import mmap
+import os
+import struct
+import tempfile
+import xml.parsers.expat
+from array import array
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+import compression
+
+# Build (or extend) the index of a column the first time it is used as a filter.
+XML_INDEX_AUTO = os.getenv("XML_INDEX_AUTO", "1").lower() not in ("0", "false", "no", "off")
+# Rows between two progress callbacks.
+PROGRESS_EVERY = 10000
+
+_MAGIC = b"XIDX3\n"
+_HEADER_SIZE = struct.Struct("<Q")
+# Value directory entry: key offset, key length, posting list offset, posting count.
+_ENTRY = struct.Struct("<QQQQ")
+_READ_CHUNK = 1024 * 1024
+
+
+def index_path(xml_path: Union[str, Path]) -> Path:
+    """Sidecar file holding the index of xml_path."""
+    xml_path = Path(xml_path)
+    return xml_path.with_name(f"{xml_path.name}.idx")
+
+
+def build_index(xml_path: Union[str, Path], columns: Iterable[str], row_tag: str = "row", progress=None) -> Dict:
+    """Scan xml_path once and write its sidecar index; returns the index header.
+
+    The index stores the byte range of every row element that is not nested in
+    another row (rows nested in a row are part of its markup, as for grouping),
+    and for each of columns a value -> row ordinals posting list. A row's value
+    for a column is the text of its first child with that tag, the same value
+    grouping uses. Blank values are not posted. The header also keeps the declared
+    encoding and the namespace declarations made outside rows, which row markup
+    needs to be parsed on its own. Compressed files cannot be indexed, since rows
+    are located by their byte offsets in the file.
+    """
+    xml_path = Path(xml_path)
+    if compression.detect(xml_path):
+        raise ValueError(f"Cannot index a compressed XML file: {xml_path.name}")
+    columns = sorted(set(columns))
+    stat = xml_path.stat()
+    # Pairs of (row start, row end) as flat uint64s.
+    rows = array("Q")
+    postings: Dict[str, Dict[str, array]] = {col: {} for col in columns}
+    state = {"depth": 0, "row_depth": None, "column": None, "seen": set(), "text": [], "row_ended": False}
+    declared = {"encoding": None}
+    namespaces: Dict[str, str] = {}
+
+    parser = xml.parsers.expat.ParserCreate()
+    parser.buffer_text = True
+
+    def close_row():
+        # expat reports a row's end event at its end tag (or at the start of a <row/>),
+        # so the row's markup ends where the next event begins.
+        if state["row_ended"]:
+            rows.append(parser.CurrentByteIndex)
+            state["row_ended"] = False
+
+    def start(tag, attrs):
+        close_row()
+        state["depth"] += 1
+        if state["row_depth"] is None:
+            if tag == row_tag:
+                state["row_depth"] = state["depth"]
+                state["seen"] = set()
+                rows.append(parser.CurrentByteIndex)
+            else:
+                for name, uri in attrs.items():
+                    if name == "xmlns" or name.startswith("xmlns:"):
+                        namespaces.setdefault(name, uri)
+        elif state["depth"] == state["row_depth"] + 1 and tag in postings and tag not in state["seen"]:
+            state["column"] = tag
+            state["text"] = []
+
+    def end(tag):
+        close_row()
+        depth = state["depth"]
+        state["depth"] -= 1
+        row_depth = state["row_depth"]
+        if row_depth is None:
+            return
+        if depth == row_depth:
+            state["row_ended"] = True
+            state["row_depth"] = None
+            ordinal = len(rows) // 2
+            if progress and (ordinal + 1) % PROGRESS_EVERY == 0:
+                progress(ordinal + 1, parser.CurrentByteIndex)
+        elif depth == row_depth + 1 and state["column"] == tag:
+            state["column"] = None
+            state["seen"].add(tag)
+            value = "".join(state["text"])
+            if value.strip():
+                postings[tag].setdefault(value, array("Q")).append(len(rows) // 2)
+
+    def text(data):
+        close_row()
+        if state["column"] is not None:
+            state["text"].append(data)
+
+    parser.StartElementHandler = start
+    parser.EndElementHandler = end
+    parser.CharacterDataHandler = text
+    parser.CommentHandler = lambda data: close_row()
+    parser.ProcessingInstructionHandler = lambda target, data: close_row()
+    parser.XmlDeclHandler = lambda version, encoding, standalone: declared.update(encoding=encoding)
+
+    with xml_path.open("rb") as source:
+        try:
+            while True:
+                chunk = source.read(_READ_CHUNK)
+                parser.Parse(chunk, not chunk)
+                if not chunk:
+                    break
+        except xml.parsers.expat.ExpatError as exc:
+            raise ValueError(f"Cannot index {xml_path.name}: {exc}") from exc
+    if state["row_ended"]:
+        # The row was the document element: it runs to the end of the file.
+        rows.append(stat.st_size)
+    row_count = len(rows) // 2
+    if progress:
+        progress(row_count, stat.st_size)
+
+    # Layout: magic, header length, JSON header, row ranges, then per column its posting
+    # lists, the values (UTF-8, sorted) and a directory of _ENTRY records in value order,
+    # so a lookup binary-searches the directory instead of loading every value.
+    header = {
+        "source_size": stat.st_size,
+        "source_mtime_ns": stat.st_mtime_ns,
+        "row_tag": row_tag,
+        "rows": row_count,
+        "encoding": declared["encoding"] or "utf-8",
+        "namespaces": namespaces,
+        "columns": {},
+    }
+    offset = rows.itemsize * len(rows)
+    sections = []
+    for col in columns:
+        values = sorted((value.encode("utf-8"), ordinals) for value, ordinals in postings[col].items())
+        keys_offset = offset + sum(ordinals.itemsize * len(ordinals) for _, ordinals in values)
+        directory = bytearray()
+        posting_offset, key_offset = offset, keys_offset
+        for key, ordinals in values:
+            directory += _ENTRY.pack(key_offset, len(key), posting_offset, len(ordinals))
+            posting_offset += ordinals.itemsize * len(ordinals)
+            key_offset += len(key)
+        header["columns"][col] = {"values": len(values), "directory": key_offset}
+        sections.append((values, directory))
+        offset = key_offset + len(directory)
+    header_bytes = json.dumps(header, ensure_ascii=False).encode("utf-8")
+
+    fd, tmp_path = tempfile.mkstemp(suffix=".part", dir=xml_path.parent)
+    try:
+        with os.fdopen(fd, "wb") as out:
+            out.write(_MAGIC)
+            out.write(_HEADER_SIZE.pack(len(header_bytes)))
+            out.write(header_bytes)
+            rows.tofile(out)
+            for values, directory in sections:
+                for _, ordinals in values:
+                    ordinals.tofile(out)
+                for key, _ in values:
+                    out.write(key)
+                out.write(directory)
+        os.replace(tmp_path, index_path(xml_path))
+    except BaseException:
+        Path(tmp_path).unlink(missing_ok=True)
+        raise
+    return header
+
+
+class XMLIndex:
+    """Read side of a sidecar index; value directories and row ranges are read through mmap on demand."""
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        with self.path.open("rb") as f:
+            if f.read(len(_MAGIC)) != _MAGIC:
+                raise ValueError(f"Not an XML index: {self.path.name}")
+            (size,) = _HEADER_SIZE.unpack(f.read(_HEADER_SIZE.size))
+            self.header = json.loads(f.read(size).decode("utf-8"))
+        self.data_offset = len(_MAGIC) + _HEADER_SIZE.size + size
+
+    def covers(self, xml_path: Union[str, Path], row_tag: str, column: str) -> bool:
+        stat = Path(xml_path).stat()
+        header = self.header
+        return (
+            header["source_size"] == stat.st_size
+            and header["source_mtime_ns"] == stat.st_mtime_ns
+            and header["row_tag"] == row_tag
+            and column in header["columns"]
+        )
+
+    def row_ranges(self, column: str, value: str) -> List[Tuple[int, int]]:
+        """(start, end) of every row whose column equals value, in document order."""
+        section = self.header["columns"][column]
+        target = value.encode("utf-8")
+        base = self.data_offset
+        with self.path.open("rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            directory = base + section["directory"]
+            low, high = 0, section["values"]
+            while low < high:
+                middle = (low + high) // 2
+                key_offset, key_size, offset, count = _ENTRY.unpack_from(data, directory + middle * _ENTRY.size)
+                key = data[base + key_offset:base + key_offset + key_size]
+                if key < target:
+                    low = middle + 1
+                elif key > target:
+                    high = middle
+                else:
+                    break
+            else:
+                return []
+            ordinals = array("Q")
+            ordinals.frombytes(data[base + offset:base + offset + count * ordinals.itemsize])
+            return [struct.unpack_from("<QQ", data, base + ordinal * 16) for ordinal in ordinals]
+
+
+def load_index(xml_path: Union[str, Path], row_tag: str, column: str, build: Optional[bool] = None,
+               progress=None) -> Optional[XMLIndex]:
+    """Index of xml_path covering column, or None.
+
+    With build (default XML_INDEX_AUTO) a missing or stale index is (re)built, keeping
+    the columns the previous index had.
+    """
+    build = XML_INDEX_AUTO if build is None else build
+    path = index_path(xml_path)
+    columns = {column}
+    try:
+        index = XMLIndex(path)
+        if index.covers(xml_path, row_tag, column):
+            return index
+        if index.header["row_tag"] == row_tag:
+            columns.update(index.header["columns"])
+    except (OSError, ValueError):
+        pass
+    if not build:
+        return None
+    build_index(xml_path, columns, row_tag=row_tag, progress=progress)
+    return XMLIndex(path)
+
+
+def read_rows(xml_path: Union[str, Path], ranges: List[Tuple[int, int]]) -> Iterator[bytes]:
+    """Yield the complete markup of each row range."""
+    with open(xml_path, "rb") as source:
+        for start, end in ranges:
+            source.seek(start)
+            yield source.read(end - start)